@@ -20,8 +20,12 @@ filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
 sys.path.append(filepath)
 
 import argparse
+import json
 
 from top import Top
+from dphy_model import dphy_model
+from build_cache import manifest_up_to_date, sources_manifest, write_manifest
+from link_budget import link_budget, print_budget, served_formats
 from migen.fhdl.verilog import convert
 
 supported_formats_hd = ["720p25", "720p30", "720p50", "720p60", "1080p25", "1080p30"]
@@ -29,13 +33,37 @@ supported_formats_3g = ["1080p50", "1080p60"]
 supported_formats = supported_formats_hd + supported_formats_3g
 supported_data_rates = ["720p_hd", "1080p_hd", "1080p_3g"]
 
-def prepare_top_sources(output_dir, video_format, four_lanes, sim, pattern_gen):
-    top = Top(video_format, four_lanes, sim, pattern_gen)
+def prepare_top_sources(output_dir, *, video_format, four_lanes=False, sim=False, gear=8,
+                        cont_clk=False, line_burst=False, pack_sync=False, hs_watermark=0,
+                        auto_format=False, **options):
+    # Options are keyword arguments of Top, those needed for the link budget are
+    # named here
+    top = Top(video_format=video_format, four_lanes=four_lanes, sim=sim, gear=gear,
+              cont_clk=cont_clk, line_burst=line_burst, pack_sync=pack_sync,
+              hs_watermark=hs_watermark, auto_format=auto_format, **options)
+
+    # Check that the link sustains the input rate of all formats served by the bitstream
+    budgets = []
+    for fmt in served_formats(video_format, auto_format):
+        budgets.append(link_budget(fmt, top.timings, four_lanes, gear, cont_clk, line_burst,
+                                   pack_sync, hs_watermark, top.buffer_depth))
+    print_budget(budgets)
+    with open(os.path.join(output_dir, "link_budget.json"), "w") as fd:
+        json.dump(budgets, fd, indent=4)
+    failed = [b["video_format"] for b in budgets if not b["sustainable"]]
+    if failed:
+        sys.exit("Link budget exceeded for %s" % ", ".join(failed))
+
     top_path = os.path.join(output_dir, "top.v")
 
     with open(top_path, "w") as fd:
         fd.write(str(convert(top, top.ios, name="top")))
 
+    if sim:
+        # Models of the hardened primitives, for simulators without the vendor library
+        with open(os.path.join(output_dir, "dphy_model.v"), "w") as fd:
+            fd.write(dphy_model())
+
 
 if __name__ == "__main__":
     # parse arguments
@@ -50,6 +78,87 @@ if __name__ == "__main__":
     parser.add_argument(
         "--lanes", type=int, default=2, help='Number of lanes ("2", or "4")'
     )
+    parser.add_argument(
+        "--gear", type=int, default=8, help='D-PHY HS data width per lane ("8", or "16")'
+    )
+    parser.add_argument(
+        "--cont-clk",
+        action="store_true",
+        help="Keep D-PHY clock lane in HS mode continuously",
+    )
+    parser.add_argument(
+        "--line-burst",
+        action="store_true",
+        help="Keep D-PHY data lanes in HS mode across short horizontal blanking",
+    )
+    parser.add_argument(
+        "--pack-sync",
+        action="store_true",
+        help="Send Frame Start/End short packets in the same HS burst as the adjacent line",
+    )
+    parser.add_argument(
+        "--hs-watermark",
+        type=int,
+        default=0,
+        help="Number of buffered words required to request HS mode for a line",
+    )
+    parser.add_argument(
+        "--predict-hs",
+        action="store_true",
+        help="Request HS mode ahead of the next line start based on the learned line period",
+    )
+    parser.add_argument(
+        "--overflow-drop",
+        choices=["line", "frame"],
+        help="Drop the rest of the line or the frame on line buffer overflow",
+    )
+    parser.add_argument(
+        "--lock-frames",
+        type=int,
+        default=0,
+        help="Number of subsequent frames with stable timings required to start sending, "
+        "before the first few frames are rejected",
+    )
+    parser.add_argument(
+        "--lock-lines",
+        type=int,
+        default=16,
+        help="Minimum number of lines with matching period in a stable frame",
+    )
+    parser.add_argument(
+        "--reset-delay-us",
+        type=int,
+        help="Release reset the given time after the deserializer PLL lock, "
+        "instead of a second after configuration",
+    )
+    parser.add_argument(
+        "--tinit-us",
+        type=int,
+        help="D-PHY initialization time, overrides the default number of byte clock cycles",
+    )
+    parser.add_argument(
+        "--timing-margin",
+        type=int,
+        default=0,
+        help="Margin above the minimal D-PHY timings in percent",
+    )
+    parser.add_argument(
+        "--fast-relock",
+        action="store_true",
+        help="Keep D-PHY running through deserializer PLL lock losses and resume at the next "
+        "frame, implies frame overflow drop policy",
+    )
+    parser.add_argument(
+        "--auto-format",
+        action="store_true",
+        help="Measure the input video format at run time, a single bitstream serves all "
+        "formats of a data rate",
+    )
+    parser.add_argument(
+        "--perf-counters",
+        action="store_true",
+        help="Add performance counters readable over UART",
+    )
     parser.add_argument(
         "--sim",
         action="store_true",
@@ -60,6 +169,11 @@ if __name__ == "__main__":
         action="store_true",
         help="Generate fixed pattern based on artificially generated frame timings",
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Generate sources even if the configuration and Python sources didn't change",
+    )
     args = parser.parse_args()
 
     if args.video_format in supported_data_rates:
@@ -74,17 +188,85 @@ if __name__ == "__main__":
         video_format = args.video_format[:-2] + "_3g"
     else:
         sys.exit("Unsupported video format")
+    if args.auto_format and not args.pattern_gen:
+        # Formats of the same data rate share a bitstream
+        video_format = "auto_" + video_format.split("_")[-1]
 
     if args.lanes not in (2, 4):
         sys.exit("Unsupported number of lanes")
 
+    if args.gear not in (8, 16):
+        sys.exit("Unsupported gear")
+
+    if args.fast_relock and args.overflow_drop == "line":
+        sys.exit("Fast relock requires frame overflow drop policy")
+
     # create names
     four_lanes = True if args.lanes == 4 else False
     lanes_name_part = "4lanes" if four_lanes else "2lanes"
+    if args.gear == 16:
+        lanes_name_part += "-gear16"
+    if args.cont_clk:
+        lanes_name_part += "-cont_clk"
+    if args.line_burst:
+        lanes_name_part += "-line_burst"
+    if args.pack_sync:
+        lanes_name_part += "-pack_sync"
+    if args.hs_watermark:
+        lanes_name_part += f"-hs_watermark{args.hs_watermark}"
+    if args.predict_hs:
+        lanes_name_part += "-predict_hs"
+    if args.overflow_drop:
+        lanes_name_part += f"-drop_{args.overflow_drop}"
+    if args.lock_frames:
+        lanes_name_part += f"-lock{args.lock_frames}x{args.lock_lines}"
+    if args.reset_delay_us is not None:
+        lanes_name_part += f"-reset{args.reset_delay_us}us"
+    if args.tinit_us is not None:
+        lanes_name_part += f"-tinit{args.tinit_us}us"
+    if args.timing_margin:
+        lanes_name_part += f"-margin{args.timing_margin}"
+    if args.fast_relock:
+        lanes_name_part += "-fast_relock"
+    if args.auto_format and args.pattern_gen:
+        lanes_name_part += "-auto_format"
+    if args.perf_counters:
+        lanes_name_part += "-perf_counters"
     output_dir_rel = os.path.join("build", f"{video_format}-{lanes_name_part}")
     output_dir = os.path.abspath(output_dir_rel)
 
+    # sources are kept untouched if they were generated from the same configuration
+    # and Python sources, so that they aren't synthesized again
+    config = {k: v for k, v in vars(args).items() if k != "force"}
+    manifest = sources_manifest(config)
+    if not args.force and manifest_up_to_date(manifest, output_dir):
+        print("Sources in %s are up to date" % output_dir_rel)
+        sys.exit(0)
+
     # generate sources
     four_lanes = True if args.lanes == 4 else False
     os.makedirs(output_dir, exist_ok=True)
-    prepare_top_sources(output_dir, args.video_format, four_lanes, args.sim, args.pattern_gen)
+    prepare_top_sources(
+        output_dir,
+        video_format=args.video_format,
+        four_lanes=four_lanes,
+        sim=args.sim,
+        pattern_gen=args.pattern_gen,
+        gear=args.gear,
+        cont_clk=args.cont_clk,
+        line_burst=args.line_burst,
+        pack_sync=args.pack_sync,
+        hs_watermark=args.hs_watermark,
+        predict_hs=args.predict_hs,
+        perf_counters=args.perf_counters,
+        overflow_drop=args.overflow_drop,
+        lock_frames=args.lock_frames,
+        lock_lines=args.lock_lines,
+        reset_delay_us=args.reset_delay_us,
+        tinit_us=args.tinit_us,
+        fast_relock=args.fast_relock,
+        auto_format=args.auto_format,
+        timing_margin=args.timing_margin,
+    )
+    outputs = ["top.v", "link_budget.json"] + (["dphy_model.v"] if args.sim else [])
+    write_manifest(manifest, output_dir, outputs)
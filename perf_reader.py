@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import sys
+filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+sys.path.append(filepath)
+
+import argparse
+import time
+
+import serial
+
+from perf_counters import PERF_COUNTERS
+from reset_sequencer import BOOT_PHASES
+from uart_bridge import CMD_CLEAR, REG_BYTES
+
+TX_STATE_COUNTERS = [name for name, _ in PERF_COUNTERS if name.startswith("tx_")]
+
+
+def read_counter(port, adr):
+    port.write(bytes([adr]))
+    data = port.read(REG_BYTES)
+    if len(data) != REG_BYTES:
+        sys.exit("No response from the performance counters")
+    return int.from_bytes(data, "little")
+
+
+def read_counters(port):
+    return {name: read_counter(port, adr) for adr, (name, _) in enumerate(PERF_COUNTERS)}
+
+
+def print_counters(values, previous=None, interval=None):
+    for name, kind in PERF_COUNTERS:
+        line = f"{name:24}{values[name]:>12}"
+        if name == "boot_phase" and values[name] < len(BOOT_PHASES):
+            line += f"{BOOT_PHASES[values[name]]:>16}"
+        if previous is not None and kind == "count":
+            delta = (values[name] - previous[name]) % 2 ** (8 * REG_BYTES)
+            line += f"{delta / interval:>16.1f}/s"
+        print(line)
+
+    # Share of byte clock cycles spent in HS data transmission, counters are read one
+    # by one, so it is approximate
+    if previous is not None:
+        cycles = {name: (values[name] - previous[name]) % 2 ** (8 * REG_BYTES)
+                  for name in TX_STATE_COUNTERS}
+        total = sum(cycles.values())
+        if total:
+            print(f"{'link_utilization':24}{100 * cycles['tx_data_enable_cycles'] / total:>11.1f}%")
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Read performance counters of SDI MIPI Video Converter"
+    )
+    parser.add_argument(
+        "--port", default="/dev/ttyUSB0", help="Serial port connected to the counters UART"
+    )
+    parser.add_argument(
+        "--baudrate", type=int, default=115200, help="UART baud rate"
+    )
+    parser.add_argument(
+        "--clear", action="store_true", help="Clear counters before reading"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0,
+        help="Read counters periodically with the given interval in seconds and show rates",
+    )
+    args = parser.parse_args()
+
+    with serial.Serial(args.port, args.baudrate, timeout=1) as port:
+        if args.clear:
+            port.write(bytes([CMD_CLEAR]))
+        values = read_counters(port)
+        print_counters(values)
+        while args.interval:
+            time.sleep(args.interval)
+            previous, values = values, read_counters(port)
+            print_counters(values, previous, args.interval)
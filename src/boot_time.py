@@ -0,0 +1,158 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+from migen import *
+from migen.fhdl.verilog import convert
+from migen.fhdl.module import Module
+from cmos2dphy import CMOS2DPHY
+from common import get_timings, tinit_cycles
+from pattern_gen import PatternGenerator
+from reset_sequencer import ResetSequencer
+
+__all__ = ["BootTime"]
+
+
+class BootTime(Module):
+    """Boot sequence of the converter from configuration to the first frame.
+
+    Reset sequencing of Top with the pattern generator as the video source,
+    which starts sending frames once the pixel clock domain leaves reset, as the
+    deserializer does after the PLL lock. Internal oscillator and deserializer
+    clocks are provided by the simulation.
+
+    Parameters
+    ----------
+    video_format : str
+        Video format of the pattern generator.
+    four_lanes : bool
+        Use 4 D-PHY lanes instead of 2.
+    reset_delay_us : int
+        Time from the PLL lock to the reset release, see ResetSequencer.
+    tinit_us : int
+        D-PHY initialization time in microseconds. If None, default one is used.
+    lock_frames : int
+        Number of stable frames required before sending, see CMOS2DPHY.
+    lock_lines : int
+        Minimum number of matching lines in a stable frame, see CMOS2DPHY.
+    """
+    def __init__(self, video_format, four_lanes=False, reset_delay_us=None, tinit_us=None,
+                 lock_frames=0, lock_lines=16):
+        WC = 2560 if video_format.startswith("720p") else 3840
+
+        self.clock_domains.cd_sys = ClockDomain("sys")
+        self.clock_domains.cd_hfc = ClockDomain("hfc", reset_less=True)
+
+        self.pll_lock_i = Signal(name="pll_lock_i")
+        self.des_reset_n_o = Signal(name="des_reset_n_o")
+        self.phase_o = Signal(3, name="phase_o")
+        self.tinit_done_o = Signal(name="tinit_done_o")
+        self.sp_en_o = Signal(name="sp_en_o")
+        self.dt_o = Signal(6, name="dt_o")
+
+        mipi_dphy_ios = {
+            "mipi_clk_n_o": Signal(name="mipi_dphy_clk_n_o"),
+            "mipi_clk_p_o": Signal(name="mipi_dphy_clk_p_o"),
+            "mipi_d0_n_io": Signal(name="mipi_dphy_d0_n_o"),
+            "mipi_d0_p_io": Signal(name="mipi_dphy_d0_p_o"),
+            "mipi_d1_n_o": Signal(name="mipi_dphy_d1_n_o"),
+            "mipi_d1_p_o": Signal(name="mipi_dphy_d1_p_o"),
+        }
+        if four_lanes:
+            mipi_dphy_ios = {
+                **mipi_dphy_ios,
+                "mipi_d2_n_o": Signal(name="mipi_dphy_d2_n_o"),
+                "mipi_d2_p_o": Signal(name="mipi_dphy_d2_p_o"),
+                "mipi_d3_n_o": Signal(name="mipi_dphy_d3_n_o"),
+                "mipi_d3_p_o": Signal(name="mipi_dphy_d3_p_o"),
+            }
+
+        self.submodules.reset_sequencer = reset_sequencer = ResetSequencer(
+            225000000, reset_delay_us
+        )
+        self.comb += [
+            self.cd_sys.rst.eq(reset_sequencer.sys_rst_o),
+            reset_sequencer.pll_lock_i.eq(self.pll_lock_i),
+            self.des_reset_n_o.eq(reset_sequencer.des_reset_n_o),
+            self.phase_o.eq(reset_sequencer.phase_o),
+        ]
+
+        timings = get_timings(video_format, four_lanes)
+        if tinit_us is not None:
+            timings = dict(timings, TINIT_VALUE=tinit_cycles(tinit_us, video_format, four_lanes))
+        self.submodules.cmos2dphy = cmos2dphy = CMOS2DPHY(
+            mipi_dphy_ios, timings, four_lanes, sim=True,
+            lock_frames=lock_frames, lock_lines=lock_lines
+        )
+        self.submodules.pattern_gen = pattern_gen = PatternGenerator(video_format)
+        self.comb += [
+            cmos2dphy.pix_data0_i.eq(pattern_gen.data_o[:8]),
+            cmos2dphy.pix_data1_i.eq(pattern_gen.data_o[8:]),
+            cmos2dphy.fv_i.eq(pattern_gen.fv_o),
+            cmos2dphy.lv_i.eq(pattern_gen.lv_o),
+            cmos2dphy.vc_i.eq(0),
+            cmos2dphy.dt_i.eq(0x1e),
+            cmos2dphy.wc_i.eq(WC),
+            cmos2dphy.pll_lock_i.eq(self.pll_lock_i),
+        ]
+
+        streaming = Signal()
+        self.sync.byte += If(cmos2dphy.fsm.before_leaving("WAIT_FV_START"),
+            streaming.eq(1),
+        )
+        self.comb += [
+            reset_sequencer.tinit_done_i.eq(cmos2dphy.tinit_done_o),
+            reset_sequencer.streaming_i.eq(streaming),
+            self.tinit_done_o.eq(cmos2dphy.tinit_done_o),
+            self.sp_en_o.eq(cmos2dphy.sp_en_o),
+            self.dt_o.eq(cmos2dphy.dt_o),
+        ]
+
+        self.ios = {
+            self.cd_sys.clk,
+            self.cd_hfc.clk,
+            cmos2dphy.cd_byte.clk,
+            self.pll_lock_i,
+            self.des_reset_n_o,
+            self.phase_o,
+            self.tinit_done_o,
+            self.sp_en_o,
+            self.dt_o,
+        }
+        self.ios.update(mipi_dphy_ios.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--video-format", default="1080p30", help="Video format of the pattern generator"
+    )
+    parser.add_argument("--lanes", type=int, choices=[2, 4], default=2, help="Number of lanes")
+    parser.add_argument(
+        "--reset-delay-us", type=int, help="Time from the PLL lock to the reset release"
+    )
+    parser.add_argument("--tinit-us", type=int, help="D-PHY initialization time")
+    parser.add_argument(
+        "--lock-frames", type=int, default=0, help="Number of stable frames required before sending"
+    )
+    parser.add_argument(
+        "--lock-lines", type=int, default=16, help="Minimum number of matching lines in a stable frame"
+    )
+    args = parser.parse_args()
+
+    boot_time = BootTime(
+        args.video_format, args.lanes == 4, args.reset_delay_us, args.tinit_us,
+        args.lock_frames, args.lock_lines
+    )
+    print(convert(boot_time, boot_time.ios, name="boot_time_" + args.video_format))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content hashes of build inputs and a local cache of build results.
+
+generate.py records hashes of its configuration, the Python sources and the
+generated files in a manifest and regenerates the files only when it changes,
+leaving them untouched otherwise so that make doesn't synthesize them again.
+
+Synthesized JSON and FASM are kept in a cache outside of the build directories,
+keyed on hashes of the input files and the tool arguments, so configurations
+built before are restored instead of being built again, also after `make clean`.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+__all__ = ["file_hash", "sources_manifest", "manifest_up_to_date", "write_manifest",
+           "cache_key", "fetch", "store"]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST = "manifest.json"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fd:
+        for chunk in iter(lambda: fd.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sources_manifest(config):
+    """Return the manifest of a configuration and the sources generating it."""
+    paths = [os.path.join(ROOT, "generate.py")] + sorted(glob.glob(os.path.join(ROOT, "src", "*.py")))
+    return {
+        "config": config,
+        "sources": {os.path.relpath(path, ROOT): file_hash(path) for path in paths},
+    }
+
+
+def manifest_up_to_date(manifest, output_dir):
+    """Check that the files in output_dir were generated from the same manifest and
+    weren't modified since."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as fd:
+            previous = json.load(fd)
+        outputs = previous.pop("outputs")
+        return previous == manifest and all(
+            file_hash(os.path.join(output_dir, name)) == digest for name, digest in outputs.items())
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def write_manifest(manifest, output_dir, outputs):
+    manifest = dict(manifest, outputs={name: file_hash(os.path.join(output_dir, name))
+                                       for name in outputs})
+    with open(os.path.join(output_dir, MANIFEST), "w") as fd:
+        json.dump(manifest, fd, indent=4)
+
+
+def cache_key(inputs, args):
+    """Return the cache key of results built from the input files with the given
+    tool arguments."""
+    digest = hashlib.sha256(" ".join(args.split()).encode() + b"\0")
+    for path in inputs:
+        digest.update(file_hash(path).encode())
+    return digest.hexdigest()
+
+
+def _entry(cache, key, output):
+    # Entries keep the extension of the result, JSON and FASM of a key differ
+    return os.path.join(cache, key + os.path.splitext(output)[1])
+
+
+def fetch(cache, key, output):
+    """Copy a cached result to output, returns False if it isn't cached."""
+    entry = _entry(cache, key, output)
+    try:
+        shutil.copyfile(entry, output)
+    except OSError:
+        return False
+    os.utime(entry)
+    return True
+
+
+def store(cache, key, output):
+    os.makedirs(cache, exist_ok=True)
+    # Results appear in the cache atomically
+    fd, tmp = tempfile.mkstemp(dir=cache, prefix=".tmp-")
+    os.close(fd)
+    shutil.copyfile(output, tmp)
+    os.replace(tmp, _entry(cache, key, output))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache of synthesis and place and route results")
+    parser.add_argument("action", choices=["fetch", "store"])
+    parser.add_argument("output", help="Result file")
+    parser.add_argument("--inputs", nargs="+", required=True, help="Files the result is built from")
+    parser.add_argument("--args", default="", help="Tool arguments and versions")
+    parser.add_argument("--cache", required=True, help="Cache directory")
+    args = parser.parse_args()
+
+    key = cache_key(args.inputs, args.args)
+    if args.action == "fetch":
+        if not fetch(args.cache, key, args.output):
+            sys.exit(1)
+        print("Restored {} from cache {}".format(os.path.basename(args.output), key[:16]))
+    else:
+        store(args.cache, key, args.output)
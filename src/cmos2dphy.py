@@ -16,19 +16,43 @@
 from migen import *
 from migen.fhdl.verilog import convert
 from migen.fhdl.module import Module
-from migen.genlib.fifo import AsyncFIFO
-from packet_formatter import PacketFormatter
-from mipi_dphy import TXDPHY
+from migen.genlib.cdc import MultiReg, PulseSynchronizer
+from packet_formatter import PacketFormatter, DT_NULL
+from line_buffer import LineBuffer, line_buffer_depth
+from mipi_dphy import TXDPHY, hs_round_trip, hs_entry_latency
 from crc16 import CRC16
+from input_lock import InputLock
 
 __all__ = ["CMOS2DPHY"]
 
 
 class CMOS2DPHY(Module):
-    def __init__(self, mipi_dphy_ios, timings, four_lanes=False, sim=False):
+    def __init__(self, mipi_dphy_ios, timings, four_lanes=False, sim=False, gear=8,
+                 cont_clk=False, line_burst=False, pack_sync=False, buffer_depth=None,
+                 hs_watermark=0, predict_hs=False, perf_counters=False, overflow_drop=None,
+                 lock_frames=0, lock_lines=16, fast_relock=False):
         assert four_lanes in [True, False]
         assert sim in [True, False]
+        assert gear in [8, 16]
+        assert cont_clk in [True, False]
+        assert line_burst in [True, False]
+        assert pack_sync in [True, False]
+        assert predict_hs in [True, False]
+        assert perf_counters in [True, False]
+        assert overflow_drop in [None, "line", "frame"]
+        assert lock_frames >= 0
+        assert fast_relock in [True, False]
+        assert not (fast_relock and overflow_drop == "line")
+        if fast_relock:
+            # Frame interrupted by the PLL lock loss is dropped like an overflowed one
+            overflow_drop = "frame"
         LANES = 4 if four_lanes else 2
+        WIDTH = LANES * gear
+        # Number of 16-bit pixels in a single byte clock domain word
+        PIXELS = WIDTH // 16
+        # Words are tagged with the line number modulo 2**TAG_BITS if overflows are
+        # handled, so that the byte clock domain can tell lines apart
+        TAG_BITS = 3 if overflow_drop else 0
 
         self.clock_domains.cd_byte = ClockDomain("byte")
         self.comb += ResetSignal("byte").eq(ResetSignal("sys"))
@@ -75,6 +99,11 @@ class CMOS2DPHY(Module):
         self.phdr_xfr_done_o = phdr_xfr_done = Signal()
         self.dt_o = dt = Signal(6)
         self.wc_o = wc = Signal(16)
+        # HS data and data lane states passed to the D-PHY, for lane monitors
+        self.hs_data_o = Signal(WIDTH)
+        self.hs_data_en_o = Signal()
+        self.hs_tx_en_o = Signal()
+        self.lp_tx_data_en_o = Signal()
 
         self.ios = {
             self.cd_byte.clk,
@@ -101,12 +130,19 @@ class CMOS2DPHY(Module):
                 self.dt_o,
                 self.wc_o,
                 self.pll_lock_i,
+                self.hs_data_o,
+                self.hs_data_en_o,
+                self.hs_tx_en_o,
+                self.lp_tx_data_en_o,
             ))
 
-        # FIFO between pixel clock and byte clock domains
+        # Line buffer between pixel clock and byte clock domains, HS mode for a line
+        # is requested once hs_watermark words are buffered
+        if buffer_depth is None:
+            buffer_depth = line_buffer_depth(timings, four_lanes, gear, cont_clk)
         self.submodules.fifo = fifo = ResetInserter(["sys", "byte"])(
             ClockDomainsRenamer({"write": "sys", "read": "byte"})(
-                AsyncFIFO(width=(LANES * 8), depth=512)
+                LineBuffer(WIDTH + TAG_BITS, buffer_depth, almost_empty=hs_watermark)
             )
         )
 
@@ -117,13 +153,13 @@ class CMOS2DPHY(Module):
 
         # Packet Formatter - Low Level Protocol
         self.submodules.packet_formatter = packet_formatter = \
-            ClockDomainsRenamer("byte")(PacketFormatter(timings, four_lanes))
+            ClockDomainsRenamer("byte")(PacketFormatter(timings, four_lanes, gear, line_burst, pack_sync))
 
-        # CRC Generator
-        self.submodules.crc_gen = crc_gen = CRC16()
+        # CRC Generator, operates on FIFO output words in the byte domain
+        self.submodules.crc_gen = crc_gen = CRC16(data_width=WIDTH)
 
         # Hardened TX D-PHY with TX Global Operations
-        self.submodules.tx_dphy = tx_dphy = TXDPHY(timings, four_lanes, sim)
+        self.submodules.tx_dphy = tx_dphy = TXDPHY(timings, four_lanes, sim, gear, cont_clk)
         txgo = tx_dphy.txgo
 
         # Internal signals
@@ -131,7 +167,7 @@ class CMOS2DPHY(Module):
 
         fv_d = Signal()
         lv_d = Signal()
-        w_byte_data = Signal((LANES * 8))
+        w_byte_data = Signal(WIDTH)
         w_byte_data_en = Signal()
         ld_pyld = Signal()
 
@@ -167,21 +203,22 @@ class CMOS2DPHY(Module):
             fv_start_d.eq(fv_start),
         ]
 
-        # Merge every two 16-bit words if operating on 4 D-PHY lanes
-        pixdata_converted = Signal(LANES * 8)
+        # Merge 16-bit words if a byte clock word holds more than a single pixel
+        pixdata_converted = Signal(WIDTH)
         pixdata_en = Signal()
-        if four_lanes:
-            pix_odd = Signal()
-            pixdata_d = Signal().like(pixdata)
+        if PIXELS > 1:
+            pix_cnt = Signal(max=PIXELS)
+            pixdata_d = [Signal().like(pixdata) for _ in range(PIXELS - 1)]
             self.sync += [
                 If(self.lv_i,
-                    pix_odd.eq(~pix_odd & self.lv_i),
+                    pix_cnt.eq(pix_cnt + 1),
                 ).Else(
-                    pix_odd.eq(0),
+                    pix_cnt.eq(0),
                 ),
-                pixdata_d.eq(pixdata),
-                pixdata_converted.eq(Cat(pixdata_d, pixdata)),
-                pixdata_en.eq(pix_odd & self.fv_i & self.lv_i),
+                pixdata_d[0].eq(pixdata),
+                [pixdata_d[i].eq(pixdata_d[i - 1]) for i in range(1, PIXELS - 1)],
+                pixdata_converted.eq(Cat(*reversed(pixdata_d), pixdata)),
+                pixdata_en.eq((pix_cnt == (PIXELS - 1)) & self.fv_i & self.lv_i),
             ]
         else:
             self.comb += [
@@ -189,31 +226,307 @@ class CMOS2DPHY(Module):
                 pixdata_en.eq(self.fv_i & self.lv_i),
             ]
 
-        self.comb += self.tx_dphy.pll_lock_i.eq(self.pll_lock_i)
+        if fast_relock:
+            # D-PHY is kept powered and initialized through PLL lock losses after the
+            # first lock, which don't reset the pixel clock domain then
+            pll_lock = Signal()
+            dphy_on = Signal()
+            self.specials += MultiReg(self.pll_lock_i, pll_lock, "byte")
+            self.sync.byte += If(pll_lock,
+                dphy_on.eq(1),
+            )
+            self.comb += self.tx_dphy.pll_lock_i.eq(dphy_on)
+        else:
+            self.comb += self.tx_dphy.pll_lock_i.eq(self.pll_lock_i)
+
+        # Words are written to the FIFO if it isn't full
+        fifo_we = byte_data_en & fifo.writable
+        fifo_din = pixdata_converted
+        # Payload words read from the FIFO
+        fifo_data = fifo.dout
+        payload_word = fifo_data
+        payload_step = fifo.re
+
+        if overflow_drop:
+            # Pixels arriving at a full FIFO are lost, so the rest of the line or the
+            # frame is dropped instead of sending it torn. Each word carries its line
+            # tag, which lets the byte clock domain skip the dropped line, discard its
+            # words and pad a packet that was already started.
+            fv_sys_d = Signal()
+            lv_sys_d = Signal()
+            frame_begin = self.fv_i & ~fv_sys_d
+            line_begin = self.lv_i & ~lv_sys_d
+            wr_tag = Signal(TAG_BITS)
+            next_tag = Signal(TAG_BITS)
+            word_tag = Signal(TAG_BITS)
+            dropping = Signal()
+            drop_end = line_begin if overflow_drop == "line" else frame_begin
+            overflow = Signal()
+            drop_start = overflow
+            if fast_relock:
+                # Frames are dropped from the PLL lock loss until a frame starts with
+                # the lock restored
+                pll_lock_sys = Signal()
+                self.specials += MultiReg(self.pll_lock_i, pll_lock_sys)
+                drop_start = overflow | ~pll_lock_sys
+                drop_end = drop_end & pll_lock_sys
+            write_en = ~dropping | drop_end
+            self.comb += [
+                next_tag.eq(Mux(frame_begin, 1, wr_tag + 1)),
+                word_tag.eq(Mux(line_begin, next_tag, wr_tag)),
+                overflow.eq(byte_data_en & ~fifo.writable & write_en),
+            ]
+            self.sync += [
+                fv_sys_d.eq(self.fv_i),
+                lv_sys_d.eq(self.lv_i),
+                If(line_begin,
+                    wr_tag.eq(next_tag),
+                ).Elif(frame_begin,
+                    wr_tag.eq(0),
+                ),
+                If(drop_start,
+                    dropping.eq(1),
+                ).Elif(drop_end,
+                    dropping.eq(0),
+                ),
+            ]
+            fifo_we = fifo_we & write_en
+            fifo_din = Cat(pixdata_converted, word_tag)
+            fifo_data = fifo.dout[:WIDTH]
+            fifo_tag = fifo.dout[WIDTH:]
+
+            if overflow_drop == "line":
+                # Flag of a dropped line is cleared once the byte clock domain is
+                # done with it, when the line half of the tags later starts
+                drop_flags = Array(Signal() for _ in range(2**TAG_BITS))
+                # Array targets indexed by a sliced expression produce invalid Verilog
+                done_tag = Signal(TAG_BITS)
+                self.comb += done_tag.eq(next_tag + 2**(TAG_BITS - 1))
+                self.sync += [
+                    If(frame_begin,
+                        [flag.eq(0) for flag in drop_flags],
+                    ),
+                    If(line_begin,
+                        drop_flags[done_tag].eq(0),
+                    ),
+                    If(overflow,
+                        drop_flags[word_tag].eq(1),
+                    ),
+                ]
+                drop_flags_byte = Signal(2**TAG_BITS)
+                self.specials += MultiReg(Cat(*drop_flags), drop_flags_byte, "byte")
+            else:
+                frame_drop = Signal()
+                self.specials += MultiReg(dropping, frame_drop, "byte")
+
+            # Tag of the line handled in the byte clock domain
+            line_tag = Signal(TAG_BITS, reset=1)
+            self.sync.byte += [
+                If(fsm.ongoing("WAIT_FV_START"),
+                    line_tag.eq(1),
+                ).Elif(fsm.before_entering("LV_END"),
+                    line_tag.eq(line_tag + 1),
+                ),
+            ]
+            if overflow_drop == "line":
+                line_skip = Array(drop_flags_byte[i] for i in range(2**TAG_BITS))[line_tag]
+            else:
+                line_skip = frame_drop
+            line_word = fifo.readable & (fifo_tag == line_tag)
+            # Words of previous lines are left from dropped ones and are discarded
+            stale_word = fifo.readable & (fifo_tag - line_tag)[TAG_BITS - 1]
+            fifo_re = Signal()
+            self.comb += fifo.re.eq(fifo_re | stale_word)
+
+            # Missing words of a started packet that was dropped are replaced with zeros
+            payload_word = Mux(line_word, fifo_data, 0)
+            payload_step = Signal()
+            padded = Signal()
+            # Null packet sent instead of a line dropped after entering HS mode
+            null_xfr = Signal()
+            self.sync.byte += [
+                If(lp_en,
+                    padded.eq(0),
+                ).Elif(payload_step & ~line_word,
+                    padded.eq(1),
+                ),
+            ]
+
+        if line_burst:
+            # Measure horizontal blanking and keep HS mode between lines if it is
+            # shorter than switching to LP mode and back. Result is applied at the
+            # line end, so it doesn't change while Null packets are sent.
+            ROUND_TRIP = hs_round_trip(timings, cont_clk)
+            hblank_cnt = Signal(max=ROUND_TRIP + 1, reset=ROUND_TRIP)
+            hblank_fast = Signal()
+            hblank_short = Signal()
+            self.sync.byte += [
+                If(self.lv_i,
+                    hblank_cnt.eq(0),
+                ).Elif(hblank_cnt != ROUND_TRIP,
+                    hblank_cnt.eq(hblank_cnt + 1),
+                ),
+                If(self.lv_i & ~lv_d,
+                    hblank_fast.eq(hblank_cnt != ROUND_TRIP),
+                ),
+                If(~self.lv_i & lv_d,
+                    hblank_short.eq(hblank_fast),
+                ),
+            ]
+
+            # Lines may start before the previous one is sent, count the pending ones
+            lines_pending = Signal(2)
+            line_started = fsm.before_leaving("LV_START")
+            self.sync.byte += [
+                # Line starting along with the frame is already pending
+                If(fsm.ongoing("WAIT_FV_START"),
+                    lines_pending.eq(lv_start),
+                ).Elif(lv_start & ~line_started,
+                    lines_pending.eq(lines_pending + 1),
+                ).Elif(~lv_start & line_started,
+                    lines_pending.eq(lines_pending - 1),
+                ),
+            ]
+            burst = hblank_short & (self.fv_i | (lines_pending != 0))
+            if overflow_drop == "frame":
+                burst = burst & ~frame_drop
+            self.comb += packet_formatter.burst_i.eq(burst)
+
+        if line_burst or overflow_drop:
+            # Next line may already be written to the FIFO, read only the current one
+            payload_words = Signal(16)
+            self.sync.byte += [
+                If(lp_en,
+                    payload_words.eq(wc >> log2_int(WIDTH // 8)),
+                ).Elif(payload_step,
+                    payload_words.eq(payload_words - 1),
+                ),
+            ]
+            payload_readable = fifo.readable & (payload_words != 0)
+        else:
+            payload_readable = fifo.readable
+
+        # Line start requests HS mode once enough words are buffered, or earlier
+        # if the buffer is about to fill up
+        line_ready = ~fifo.almost_empty | fifo.almost_full
+
+        if pack_sync:
+            # Frame Start is sent along with the first line, Frame End along with
+            # the last one if the frame is already finished at its end
+            fs_pending = Signal()
+            self.sync.byte += [
+                If(lp_en,
+                    fs_pending.eq(0),
+                ).Elif(fsm.before_leaving("WAIT_FV_START"),
+                    fs_pending.eq(1),
+                ),
+            ]
+            frame_end = ~self.fv_i
+            if line_burst:
+                frame_end = frame_end & (lines_pending == 0)
+            if overflow_drop == "frame":
+                frame_end = frame_end | frame_drop
+            self.comb += [
+                packet_formatter.frame_start_i.eq(fs_pending),
+                packet_formatter.frame_end_i.eq(frame_end),
+            ]
+            # Line starting along with the frame carries Frame Start right away, its
+            # request is blocked until the frame is accepted unless it is deferred
+            frame_start_next = If(lv_start & line_ready,
+                NextState("HS_REQ"),
+            ).Elif(lv_start,
+                NextState("LV_START"),
+            ).Else(
+                NextState("WAIT_LV_START"),
+            )
+        else:
+            frame_start_next = NextState("FV_START")
 
-        # Calculate CRC on incoming pixels and keep the result
-        calculated_crc = Signal(16)
-        sys_lv_d = Signal()
+        # Calculate CRC on payload words read from the FIFO and keep the result
+        calculated_crc = Signal(16, reset=0xffff)
         self.comb += [
-            crc_gen.data_i.eq(pixdata),
+            crc_gen.data_i.eq(payload_word),
+            crc_gen.crc_i.eq(calculated_crc),
         ]
-        self.sync += [
-            sys_lv_d.eq(self.lv_i),
-            If(self.fv_i & self.lv_i,
+        self.sync.byte += [
+            If(lp_en,
+                calculated_crc.eq(0xffff),
+            ).Elif(payload_step,
                 calculated_crc.eq(crc_gen.crc_o),
-                crc_gen.crc_i.eq(crc_gen.crc_o),
-            ).Else(
-                calculated_crc.eq(calculated_crc),
-                crc_gen.crc_i.eq(0xffff),
             ),
         ]
 
+        if predict_hs:
+            # Learn line period and number of lines in a frame, then request HS mode
+            # ahead of the next line start by D-PHY entry latency. If the line
+            # doesn't start in time, HS mode is left without sending any packet.
+            LEAD = hs_entry_latency(timings, cont_clk)
+            line_cnt = Signal(16)
+            line_period = Signal(16)
+            line_idx = Signal(12)
+            frame_lines = Signal(12)
+            hs_predicted = Signal()
+            self.sync.byte += [
+                If(lv_start,
+                    line_cnt.eq(0),
+                    If(line_idx != 0,
+                        line_period.eq(line_cnt + 1),
+                    ),
+                    line_idx.eq(line_idx + 1),
+                ).Elif(line_cnt != (2**len(line_cnt) - 1),
+                    line_cnt.eq(line_cnt + 1),
+                ),
+                If(fv_start,
+                    line_idx.eq(lv_start),
+                ).Elif(fv_end,
+                    frame_lines.eq(line_idx),
+                ),
+            ]
+            hs_predict = (fsm.ongoing("LV_END") & self.fv_i & (line_idx < frame_lines) &
+                          (line_period > LEAD) & (line_cnt == (line_period - LEAD - 1)))
+            hs_abort = (fsm.ongoing("LV_END") & hs_predicted & d_hs_rdy &
+                        (line_cnt == (line_period + LEAD)))
+            self.sync.byte += [
+                If(hs_predict & txfr_req,
+                    hs_predicted.eq(1),
+                ).Elif(fsm.ongoing("LV_START") | hs_abort,
+                    hs_predicted.eq(0),
+                ),
+            ]
+            # Payload can't be delayed, so the line starts once its first word is
+            # buffered
+            line_start_ready = d_hs_rdy & (line_word if overflow_drop else fifo.readable)
+        else:
+            line_start_ready = d_hs_rdy
+
+        # First frames are rejected due to deserializer timing characteristics, unless
+        # input timings are found stable earlier
+        frame_accepted = rejected_frames == 6
+        if lock_frames:
+            self.submodules.input_lock = input_lock = ClockDomainsRenamer("byte")(
+                InputLock(lock_frames, lock_lines)
+            )
+            self.comb += [
+                input_lock.fv_i.eq(self.fv_i),
+                input_lock.lv_i.eq(self.lv_i),
+            ]
+            frame_accepted = frame_accepted | input_lock.locked_o
+
+        frame_begin_allowed = self.tinit_done_o
+        if fast_relock:
+            frame_begin_allowed = frame_begin_allowed & pll_lock
+        frame_begin_ready = fv_start & frame_begin_allowed
+        # FIFO is released at the frame edge already, a line starting along with
+        # the frame writes its first words before fv_start is registered
+        fifo_release = (self.fv_i & ~fv_d | fv_start) & frame_begin_allowed & frame_accepted
         fsm.act("WAIT_FV_START",
-            fifo.reset_sys.eq(1),
-            fifo.reset_byte.eq(1),
-            If(fv_start & self.tinit_done_o,
-                If(rejected_frames == 6,
-                    NextState("FV_START"),
+            fifo.reset_sys.eq(~fifo_release),
+            fifo.reset_byte.eq(~fifo_release),
+            If(frame_begin_ready,
+                If(frame_accepted,
+                    # Further frames are accepted regardless of the lock
+                    NextValue(rejected_frames, 6) if lock_frames else [],
+                    frame_start_next,
                 ).Else(
                     NextValue(rejected_frames, rejected_frames + 1),
                 )
@@ -253,47 +566,166 @@ class CMOS2DPHY(Module):
                 NextState("LV_START"),
             ),
         )
+        line_start = If(line_start_ready,
+            dt.eq(self.dt_i),
+            wc.eq(self.wc_i),
+            NextValue(lp_en, 1),
+            NextValue(null_xfr, 0) if overflow_drop else [],
+            NextState("WAIT_FOR_PHDR"),
+        )
+        packet_dt = self.dt_i
+        packet_wc = self.wc_i
+        if overflow_drop:
+            line_start = If(line_skip,
+                NextState("DROP_LINE"),
+            ).Else(
+                line_start,
+            )
+            # Null packet carries a single zero word
+            packet_dt = Mux(null_xfr, DT_NULL, self.dt_i)
+            packet_wc = Mux(null_xfr, WIDTH // 8, self.wc_i)
         fsm.act("LV_START",
-            If(d_hs_rdy,
-                dt.eq(self.dt_i),
-                wc.eq(self.wc_i),
-                NextValue(lp_en, 1),
-                NextState("WAIT_FOR_PHDR"),
-            ),
+            If(packet_formatter.burst_o,
+                w_byte_data.eq(packet_formatter.data_o),
+                w_byte_data_en.eq(1),
+            ) if line_burst else [],
+            # Request HS mode again if D-PHY was leaving it after the prediction
+            If(~d_hs_rdy & dphy_ready,
+                hs_req.eq(1),
+            ) if predict_hs else [],
+            line_start,
         )
         fsm.act("WAIT_FOR_PHDR",
             NextValue(lp_en, 0),
-            dt.eq(self.dt_i),
-            wc.eq(self.wc_i),
+            dt.eq(packet_dt),
+            wc.eq(packet_wc),
             w_byte_data.eq(packet_formatter.data_o),
             w_byte_data_en.eq(1),
             If(ld_pyld,
                 NextState("LP_XFR"),
             ),
         )
+        if overflow_drop:
+            # Words lost with the line are replaced with zeros, others are read once
+            # readable like without dropping
+            payload_read = If((payload_words != 0) & (line_word | line_skip),
+                payload_step.eq(1),
+                fifo_re.eq(line_word),
+                w_byte_data.eq(payload_word),
+            )
+        else:
+            payload_read = If(payload_readable,
+                fifo.re.eq(1),
+                w_byte_data.eq(fifo.dout),
+            )
         fsm.act("LP_XFR",
             NextValue(lp_en, 0),
-            dt.eq(self.dt_i),
-            wc.eq(self.wc_i),
+            dt.eq(packet_dt),
+            wc.eq(packet_wc),
             w_byte_data_en.eq(1),
-            If(fifo.readable,
-                fifo.re.eq(1),
-                w_byte_data.eq(fifo.dout),
-            ).Else(
+            payload_read.Else(
                 w_byte_data.eq(packet_formatter.data_o),
                 If(phdr_xfr_done,
                     NextState("LV_END"),
+                    If(packet_formatter.frame_end_o,
+                        NextState("WAIT_FV_START"),
+                    ) if pack_sync else [],
                 ),
             ),
         )
-        fsm.act("LV_END",
-            If(~self.fv_i & dphy_ready,
-                hs_req.eq(1),
-                NextState("FV_END"),
+        if predict_hs:
+            # Falling edge of data enable makes D-PHY leave HS mode
+            lv_end_abort = If(hs_abort,
+                w_byte_data_en.eq(1),
+            )
+        else:
+            lv_end_abort = []
+        frame_over = ~self.fv_i
+        next_line = lv_start | (lines_pending != 0) if line_burst else lv_start
+        frame_end_req = [
+            hs_req.eq(1),
+            NextState("FV_END"),
+        ]
+        if overflow_drop == "frame":
+            # Rest of a dropped frame is skipped, Frame End is sent unless Frame
+            # Start is still pending
+            frame_over = frame_over | frame_drop
+            next_line = next_line & ~frame_drop
+            if pack_sync:
+                frame_end_req = If(fs_pending,
+                    NextState("WAIT_FV_START"),
+                ).Else(
+                    *frame_end_req,
+                )
+        if fast_relock:
+            # Lines may not come at all while the PLL is unlocked
+            fsm.act("WAIT_LV_START",
+                If(~pll_lock & dphy_ready,
+                    frame_end_req,
+                ),
+            )
+        if not line_burst:
+            lv_end_next = If(frame_over & dphy_ready,
+                frame_end_req,
             ).Elif(lv_start,
                 NextState("LV_START"),
             )
-        )
+            if overflow_drop:
+                # Line may have started while the previous one was dropped, its
+                # words are already buffered then
+                lv_end_next = lv_end_next.Elif(line_word & dphy_ready,
+                    NextState("HS_REQ"),
+                )
+            fsm.act("LV_END",
+                lv_end_abort,
+                lv_end_next,
+            )
+        else:
+            hs_kept = packet_formatter.burst_o | (lv_start & dphy_ready)
+            if predict_hs:
+                hs_kept = hs_kept | (hs_predicted & d_hs_rdy)
+            fsm.act("LV_END",
+                lv_end_abort,
+                # HS mode is kept by Packet Formatter sending Null packets
+                If(packet_formatter.burst_o,
+                    w_byte_data.eq(packet_formatter.data_o),
+                    w_byte_data_en.eq(1),
+                ),
+                If(next_line,
+                    # Line start requests HS mode only if D-PHY is in Stop State
+                    If(hs_kept,
+                        NextState("LV_START"),
+                    ).Elif(dphy_ready,
+                        NextState("HS_REQ"),
+                    ),
+                ).Elif(frame_over & dphy_ready,
+                    frame_end_req,
+                )
+            )
+        if overflow_drop:
+            # Words of a dropped line are discarded. If HS mode has already been
+            # entered for the line, a Null packet is sent, so that the transmission
+            # isn't left without a packet, unless Packet Formatter keeps HS mode
+            # with Null packets anyway.
+            burst_kept = packet_formatter.burst_o if line_burst else 0
+            fsm.act("DROP_LINE",
+                If(packet_formatter.burst_o,
+                    w_byte_data.eq(packet_formatter.data_o),
+                    w_byte_data_en.eq(1),
+                ) if line_burst else [],
+                fifo_re.eq(line_word),
+                If(~line_word,
+                    If(d_hs_rdy & ~burst_kept,
+                        dt.eq(DT_NULL),
+                        wc.eq(WIDTH // 8),
+                        NextValue(lp_en, 1),
+                        NextValue(null_xfr, 1),
+                        NextState("WAIT_FOR_PHDR"),
+                    ).Elif(d_hs_rdy | dphy_ready,
+                        NextState("LV_END"),
+                    ),
+                ),
+            )
         fsm.act("FV_END",
             hs_req.eq(0),
             dt.eq(1),
@@ -315,14 +747,37 @@ class CMOS2DPHY(Module):
             ),
         )
 
+        hs_defer = Signal()
+        hs_defer_done = line_ready & dphy_ready
+        if overflow_drop:
+            # Deferred request of a dropped line is cancelled
+            hs_defer_done = hs_defer_done | fsm.ongoing("DROP_LINE")
+        self.sync.byte += [
+            If(lv_start & ~line_ready,
+                hs_defer.eq(1),
+            ).Elif(hs_defer_done,
+                hs_defer.eq(0),
+            ),
+        ]
+        line_req = (lv_start | hs_defer) & line_ready
+
+        txfr_events = fv_start_d | fv_start | fv_end | line_req | hs_req
+        if pack_sync:
+            # HS mode for Frame Start is requested by the first line
+            txfr_events = fv_end | line_req | hs_req
+        if predict_hs:
+            txfr_events = txfr_events | hs_predict
+        txfr_allowed = ~fsm.ongoing("WAIT_FV_START")
+        if overflow_drop:
+            txfr_allowed = txfr_allowed & ~fsm.ongoing("DROP_LINE")
+
         self.comb += [
-            txfr_req.eq(dphy_ready & ~fsm.ongoing("WAIT_FV_START") &
-                (fv_start_d | fv_start | fv_end | lv_start | hs_req)),
+            txfr_req.eq(dphy_ready & txfr_allowed & txfr_events),
             byte_data_en.eq(pixdata_en),
 
-            If(byte_data_en & fifo.writable,
+            If(fifo_we,
                 fifo.we.eq(1),
-                fifo.din.eq(pixdata_converted),
+                fifo.din.eq(fifo_din),
             ).Else(
                 fifo.we.eq(0),
                 fifo.din.eq(0),
@@ -331,7 +786,7 @@ class CMOS2DPHY(Module):
 
         # Connect Pixel to D-PHY and Packet Formatter
         self.comb += [
-            packet_formatter.byte_data_i.eq(fifo.dout),
+            packet_formatter.byte_data_i.eq(payload_word),
             packet_formatter.vc_i.eq(self.vc_i),
             packet_formatter.wc_i.eq(wc),
             packet_formatter.dt_i.eq(dt),
@@ -353,12 +808,101 @@ class CMOS2DPHY(Module):
             mipi_dphy_data_n.eq(tx_dphy.data_n_io),
             d_hs_rdy.eq(txgo.d_hs_rdy_o),
             dphy_ready.eq(txgo.dphy_ready_o),
-            self.tinit_done_o.eq(txgo.tinit_done_o)
+            self.tinit_done_o.eq(txgo.tinit_done_o),
+            self.hs_data_o.eq(w_byte_data),
+            self.hs_data_en_o.eq(w_byte_data_en),
+            self.hs_tx_en_o.eq(txgo.hs_tx_en_o),
+            self.lp_tx_data_en_o.eq(txgo.lp_tx_data_en_o),
         ]
 
+        if perf_counters:
+            # Events counted by PerfCounters in the byte clock domain. Frames starting
+            # while the previous one is still being sent are rejected as well. FIFO
+            # level is ignored while the FIFO is held in reset, as synchronized
+            # pointers are not reset.
+            self.submodules.overflow_sync = overflow_sync = PulseSynchronizer("sys", "byte")
+            if overflow_drop:
+                self.comb += overflow_sync.i.eq(overflow)
+            else:
+                overflow = Signal()
+                overflow_d = Signal()
+                self.comb += overflow.eq(byte_data_en & ~fifo.writable)
+                self.sync += overflow_d.eq(overflow)
+                self.comb += overflow_sync.i.eq(overflow & ~overflow_d)
+
+            lines_dropped = 0
+            frames_dropped = 0
+            lines_padded = 0
+            if overflow_drop == "line":
+                lines_dropped = fsm.before_entering("DROP_LINE")
+            elif overflow_drop == "frame":
+                frame_drop_d = Signal()
+                self.sync.byte += frame_drop_d.eq(frame_drop)
+                frames_dropped = frame_drop & ~frame_drop_d
+            lines_sent = fsm.before_leaving("LP_XFR")
+            if overflow_drop:
+                lines_sent = lines_sent & ~null_xfr
+                lines_padded = lines_sent & padded
+            pll_lock_losses = 0
+            if fast_relock:
+                pll_lock_d = Signal()
+                self.sync.byte += pll_lock_d.eq(pll_lock)
+                pll_lock_losses = pll_lock_d & ~pll_lock
+
+            self.perf_events = {
+                "frames_sent": fsm.before_entering("WAIT_FV_START"),
+                "lines_sent": lines_sent,
+                "frames_rejected": fv_start & self.tinit_done_o &
+                    (~fsm.ongoing("WAIT_FV_START") | ~frame_accepted),
+                "fifo_high_water": Mux(fsm.ongoing("WAIT_FV_START"), 0, fifo.level),
+                "fifo_overflows": overflow_sync.o,
+                "hs_bursts": txgo.fsm.before_entering("TX_DATA_ENABLE"),
+                "tx_stop_cycles": txgo.fsm.ongoing("TX_STOP"),
+                "tx_clk_enable_cycles": txgo.fsm.ongoing("TX_CLK_ENABLE"),
+                "tx_data_enable_cycles": txgo.fsm.ongoing("TX_DATA_ENABLE"),
+                "tx_hs_disable_cycles": txgo.fsm.ongoing("TX_HS_DISABLE"),
+                "lines_dropped": lines_dropped,
+                "frames_dropped": frames_dropped,
+                "lines_padded": lines_padded,
+                "pll_lock_losses": pll_lock_losses,
+            }
+
 
 if __name__ == "__main__":
-    from common import dphy_timings
+    import argparse
+    from common import get_timings, supported_formats
+    parser = argparse.ArgumentParser(description="Generate CMOS to D-PHY RTL")
+    parser.add_argument(
+        "--burst", action="store_true", help="Keep HS mode between lines with Null packets"
+    )
+    parser.add_argument(
+        "--pack-sync", action="store_true",
+        help="Send Frame Start and Frame End along with the first and the last line"
+    )
+    parser.add_argument(
+        "--predict-hs", action="store_true", help="Request HS mode ahead of the next line start"
+    )
+    parser.add_argument(
+        "--overflow-drop",
+        choices=["line", "frame"],
+        help="Drop the rest of the line or the frame on FIFO overflow",
+    )
+    parser.add_argument(
+        "--buffer-depth", type=int, help="Number of words in the line buffer"
+    )
+    parser.add_argument(
+        "--fast-relock", action="store_true", help="Keep D-PHY running through PLL lock losses"
+    )
+    parser.add_argument(
+        "--video-format", choices=supported_formats, default="1080p_3g",
+        help="Video format of the D-PHY timings"
+    )
+    parser.add_argument(
+        "--timing-margin", type=int, default=0,
+        help="Margin above the minimal D-PHY timings in percent"
+    )
+    args = parser.parse_args()
+
     mipi_dphy_ios = {
         "mipi_clk_n_o": Signal(name="mipi_dphy_clk_n_o"),
         "mipi_clk_p_o": Signal(name="mipi_dphy_clk_p_o"),
@@ -367,5 +911,20 @@ if __name__ == "__main__":
         "mipi_d1_n_o": Signal(name="mipi_dphy_d1_n_o"),
         "mipi_d1_p_o": Signal(name="mipi_dphy_d1_p_o"),
     }
-    cmos2dphy = CMOS2DPHY(mipi_dphy_ios, dphy_timings["sdi_3g-2lanes"], four_lanes=False, sim=True)
-    print(convert(cmos2dphy, cmos2dphy.ios, name="cmos2dphy"))
+    timings = get_timings(args.video_format, False, margin=args.timing_margin / 100)
+    cmos2dphy = CMOS2DPHY(mipi_dphy_ios, timings, four_lanes=False,
+                          sim=True, line_burst=args.burst, pack_sync=args.pack_sync,
+                          predict_hs=args.predict_hs, buffer_depth=args.buffer_depth,
+                          overflow_drop=args.overflow_drop, fast_relock=args.fast_relock)
+    module_name = "cmos2dphy"
+    if args.burst:
+        module_name += "_burst"
+    if args.pack_sync:
+        module_name += "_pack_sync"
+    if args.predict_hs:
+        module_name += "_predict_hs"
+    if args.overflow_drop:
+        module_name += "_drop_" + args.overflow_drop
+    if args.fast_relock:
+        module_name += "_fast_relock"
+    print(convert(cmos2dphy, cmos2dphy.ios, name=module_name))
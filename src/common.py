@@ -12,86 +12,108 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-supported_formats_hd = ["720p_hd", "720p50", "720p60", "1080p_hd", "1080p25", "1080p30"]
+supported_formats_hd = ["720p_hd", "720p25", "720p30", "720p50", "720p60", "1080p_hd", "1080p25", "1080p30"]
 supported_formats_3g = ["1080p_3g", "1080p50", "1080p60"]
 supported_formats = supported_formats_hd + supported_formats_3g
 
-clock_timings_2lanes = {
-    "74_25MHz": {
-        "CN": "0b10000",# 3
-        "CM": "0b10100000", # 96
-        "CO": "0b010", # 4
-        "TINIT_VALUE": 5000,
-        "T_LPX": 4,
-        "T_DATPREP": 4,
-        "T_DAT_HSZERO": 10,
-        "T_DATTRAIL": 13,
-        "T_CLKPREP": 3,
-        "T_CLK_HSZERO": 20,
-        "T_CLKPOST": 10,
-        "T_CLKTRAIL": 6,
-    },
-    "148_5MHz": {
-        "CN": "0b11100",# 5
-        "CM": "0b10010000", # 80
-        "CO": "0b001", # 2
-        "TINIT_VALUE": 10000,
-        "T_LPX": 8,
-        "T_DATPREP": 7,
-        "T_DAT_HSZERO": 18,
-        "T_DATTRAIL": 19,
-        "T_CLKPREP": 6,
-        "T_CLK_HSZERO": 39,
-        "T_CLKPOST": 15,
-        "T_CLKTRAIL": 10,
-    }
+# Hardened D-PHY PLL limits, reference clock is divided by N, multiplied by M in
+# the VCO and divided by O to the HS bit clock
+PLL_PFD_FREQ = (24000000, 30000000)
+PLL_VCO_FREQ = (1250000000, 2500000000)
+PLL_O = [1, 2, 4, 8]
+# Feedback divider is encoded as M + 64, output divider as log2(O)
+PLL_M = range(64, 192)
+# Encodings of the input divider are only known for the values below
+PLL_CN = {
+    3: "0b10000",
+    5: "0b11100",
 }
 
-clock_timings_4lanes = {
-    "74_25MHz": {
-        "CN": "0b10000",# 3
-        "CM": "0b10100000", # 96
-        "CO": "0b011", # 8
-        "TINIT_VALUE": 5000,
-        "T_LPX": 2,
-        "T_DATPREP": 2,
-        "T_DAT_HSZERO": 6,
-        "T_DATTRAIL": 10,
-        "T_CLKPREP": 2,
-        "T_CLK_HSZERO": 10,
-        "T_CLKPOST": 8,
-        "T_CLKTRAIL": 4,
-    },
-    "148_5MHz": {
-        "CN": "0b11100",# 5
-        "CM": "0b10010000", # 80
-        "CO": "0b010", # 4
-        "TINIT_VALUE": 10000,
-        "T_LPX": 4,
-        "T_DATPREP": 4,
-        "T_DAT_HSZERO": 9,
-        "T_DATTRAIL": 10,
-        "T_CLKPREP": 3,
-        "T_CLK_HSZERO": 20,
-        "T_CLKPOST": 8,
-        "T_CLKTRAIL": 5,
-    }
-}
+# Default D-PHY initialization time in microseconds
+TINIT_US = 100
 
-dphy_timings = {
-    "sdi_hd-2lanes" : clock_timings_2lanes["74_25MHz"],
-    "sdi_3g-2lanes" : clock_timings_2lanes["148_5MHz"],
-    "sdi_hd-4lanes" : clock_timings_4lanes["74_25MHz"],
-    "sdi_3g-4lanes" : clock_timings_4lanes["148_5MHz"],
-}
+def solve_pll(ref_freq, line_rate):
+    """Return (N, M, O) of the lowest HS bit clock not slower than line_rate, ties
+    are resolved by the lowest N."""
+    solutions = []
+    for n in sorted(PLL_CN):
+        if not PLL_PFD_FREQ[0] <= ref_freq / n <= PLL_PFD_FREQ[1]:
+            continue
+        for o in PLL_O:
+            for m in PLL_M:
+                vco = ref_freq * m / n
+                if PLL_VCO_FREQ[0] <= vco <= PLL_VCO_FREQ[1] and vco / o >= line_rate:
+                    solutions.append((vco / o, n, m, o))
+    if not solutions:
+        raise ValueError("No D-PHY PLL settings for {} Hz reference and {} b/s line rate".format(
+            ref_freq, line_rate))
+    _, n, m, o = min(solutions)
+    return n, m, o
+
+def solve_timings(ref_freq, lanes, line_rate, gear=8, margin=0):
+    """Return D-PHY PLL settings and minimal timings compliant with the D-PHY
+    specification, in byte clock cycles of each TX Global Operations phase.
+
+    Minimal durations are extended by margin (a fraction of them), unless that
+    exceeds the maximal duration. The line rate is the one of each lane, rounded up
+    to the nearest PLL output frequency.
+    """
+    assert lanes in [2, 4]
+    assert gear in [8, 16]
+    n, m, o = solve_pll(ref_freq, line_rate)
+    ui = 1e9 * n * o / (ref_freq * m)
+    period = gear * ui
 
-def get_timings(video_format, four_lanes):
+    def cycles(name, min_ns, max_ns=None, least=1):
+        count = max(least, -int(-min_ns * (1 + margin) // period))
+        if max_ns is not None and count * period > max_ns:
+            # Margin is dropped where it doesn't fit below the maximum
+            count = max(least, -int(-min_ns // period))
+            if count * period > max_ns:
+                raise ValueError("No legal {} for {} ns byte clock period".format(name, period))
+        return count
+
+    t_datprep = cycles("T_HS-PREPARE", 40 + 4 * ui, 85 + 6 * ui)
+    t_clkprep = cycles("T_CLK-PREPARE", 38, 95)
+    # HS and clock trails are limited by T_EOT
+    t_eot = 105 + 12 * ui
+    return {
+        "CN": PLL_CN[n],
+        "CM": "0b{:08b}".format(m + 64),
+        "CO": "0b{:03b}".format(o.bit_length() - 1),
+        "TINIT_VALUE": cycles("T_INIT", TINIT_US * 1000),
+        "T_LPX": cycles("T_LPX", 50),
+        "T_DATPREP": t_datprep,
+        "T_DAT_HSZERO": cycles("T_HS-ZERO", 145 + 10 * ui) - t_datprep,
+        # Packet Formatter sends at least 2 cycles of HS Trail
+        "T_DATTRAIL": cycles("T_HS-TRAIL", max(8 * ui, 60 + 4 * ui), t_eot, least=2),
+        "T_CLKPREP": t_clkprep,
+        "T_CLK_HSZERO": cycles("T_CLK-ZERO", 300) - t_clkprep,
+        "T_CLKPOST": cycles("T_CLK-POST", 60 + 52 * ui),
+        "T_CLKTRAIL": cycles("T_CLK-TRAIL", 60, t_eot),
+        "T_HSEXIT": cycles("T_HS-EXIT", 100),
+    }
+
+def byte_clk_freq(video_format, four_lanes, gear=8):
+    # Byte clock carries 16-bit pixels on all lanes at the pixel rate
     LANES = 4 if four_lanes else 2
-    lanes = str(LANES) + "lanes"
+    pix_clk_freq = 148500000 if video_format in supported_formats_3g else 74250000
+    return pix_clk_freq * 16 // (LANES * gear)
 
-    if video_format in supported_formats_hd:
-        timings_str = "sdi_hd-" + lanes
-    elif video_format in supported_formats_3g:
-        timings_str = "sdi_3g-" + lanes
+def tinit_cycles(tinit_us, video_format, four_lanes, gear=8):
+    # D-PHY initialization time is counted in byte clock cycles
+    return -(-tinit_us * byte_clk_freq(video_format, four_lanes, gear) // 1000000)
 
-    return dphy_timings[timings_str]
+def get_timings(video_format, four_lanes, gear=8, margin=0):
+    LANES = 4 if four_lanes else 2
+    pix_clk_freq = 148500000 if video_format in supported_formats_3g else 74250000
+    # Lanes carry 16-bit pixels at the pixel rate
+    return solve_timings(pix_clk_freq, LANES, pix_clk_freq * 16 // LANES, gear, margin)
+
+# Timings of the default variants
+dphy_timings = {
+    "sdi_hd-2lanes" : get_timings("1080p_hd", False),
+    "sdi_3g-2lanes" : get_timings("1080p_3g", False),
+    "sdi_hd-4lanes" : get_timings("1080p_hd", True),
+    "sdi_3g-4lanes" : get_timings("1080p_3g", True),
+}
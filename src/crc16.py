@@ -12,34 +12,91 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-
+import sys
+import argparse
+from functools import reduce
+from operator import xor
 from migen import *
 from migen.fhdl.verilog import convert
 from migen.fhdl.module import Module
 
+__all__ = ["CRC16", "crc_matrix", "crc16_reference"]
+
+# MIPI CSI-2 checksum parameters
+CRC16_POLY = 0x8408
+CRC16_INIT = 0xffff
+
+
+def crc_matrix(data_width, poly=CRC16_POLY, crc_width=16):
+    """Calculate XOR matrix of a right-shifting (little endian) CRC generator
+    that consumes data_width bits in a single step.
+
+    The shift register is processed symbolically, bit by bit, starting from
+    the data LSB. Every register bit is kept as a pair of bit masks telling
+    which bits of the input CRC and of the input data are XOR-ed into it.
+
+    Returns
+    -------
+    list of (int, int)
+        For each output CRC bit, masks of input CRC bits and input data bits.
+    """
+    state = [(1 << i, 0) for i in range(crc_width)]
+    for bit in range(data_width):
+        feedback = (state[0][0], state[0][1] ^ (1 << bit))
+        state = state[1:] + [(0, 0)]
+        for i in range(crc_width):
+            if (poly >> i) & 1:
+                state[i] = (state[i][0] ^ feedback[0], state[i][1] ^ feedback[1])
+    return state
+
+
+def crc16_reference(data, crc=CRC16_INIT, poly=CRC16_POLY):
+    """Bitwise software model of the CSI-2 checksum, used as a golden reference.
+
+    data is an iterable of bytes, consumed in transmission order.
+    """
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+    return crc
+
 
 class CRC16(Module):
     """16-bit CRC generator that can be used as a checksum generator for MIPI CSI-2
-       long packets with 16-bit input data width.
+       long packets with any input data width being a multiple of 8 bits.
 
-    CRC generated by https://bues.ch/h/crcgen as verilog code and converted to Migen.
+    XOR network is derived from the polynomial at elaboration time (see crc_matrix).
     CRC polynomial coefficients: x^16 + x^12 + x^5 + 1
                                  0x8408 (hex)
     CRC width:                   16 bits
     CRC shift direction:         right (little endian)
-    Input word width:            16 bits
+    Input word width:            data_width bits (16 by default)
+
+    Parameters
+    ----------
+    data_width : int
+        Number of data bits consumed in a single step, e.g. LANES * 8.
 
     Attributes
     ----------
-    data_i : Signal(16)
-        Input data to the CRC generator.
+    data_i : Signal(data_width)
+        Input data to the CRC generator, the first byte on the wire is placed
+        on the least significant bits.
+    be_i : Signal(data_width // 8)
+        Byte enable, only contiguous patterns starting from the least significant
+        byte are supported (tail words). All bytes are enabled by default.
     crc_i : Signal(16)
         Input CRC to the CRC generator.
     crc_o : Signal(16)
         Calculated CRC.
     """
-    def __init__(self):
-        self.data_i = Signal(16)
+    def __init__(self, data_width=16):
+        assert data_width % 8 == 0
+        BYTES = data_width // 8
+
+        self.data_i = Signal(data_width)
+        self.be_i = Signal(BYTES, reset=2**BYTES - 1)
         self.crc_i = Signal(16)
         self.crc_o = Signal(16)
 
@@ -48,59 +105,42 @@ class CRC16(Module):
             self.crc_i,
             self.crc_o,
         }
+        # Byte enable is exposed only for wide variants, so the 16-bit module
+        # keeps its original interface
+        if data_width > 16:
+            self.ios.add(self.be_i)
 
-        self.comb += [
-            self.crc_o[0].eq(self.crc_i[4] ^ self.crc_i[5] ^ self.crc_i[8] ^ self.crc_i[12] ^
-                            self.data_i[4] ^ self.data_i[5] ^ self.data_i[8] ^ self.data_i[12]),
-            self.crc_o[1].eq(self.crc_i[5] ^ self.crc_i[6] ^ self.crc_i[9] ^ self.crc_i[13] ^
-                            self.data_i[5] ^ self.data_i[6] ^ self.data_i[9] ^ self.data_i[13]),
-            self.crc_o[2].eq(self.crc_i[6] ^ self.crc_i[7] ^ self.crc_i[10] ^ self.crc_i[14] ^
-                            self.data_i[6] ^ self.data_i[7] ^ self.data_i[10] ^ self.data_i[14]),
-            self.crc_o[3].eq(self.crc_i[0] ^ self.crc_i[7] ^ self.crc_i[8] ^ self.crc_i[11] ^
-                            self.crc_i[15] ^ self.data_i[0] ^ self.data_i[7] ^ self.data_i[8] ^
-                            self.data_i[11] ^ self.data_i[15]),
-            self.crc_o[4].eq(self.crc_i[0] ^ self.crc_i[1] ^ self.crc_i[4] ^ self.crc_i[5] ^
-                            self.crc_i[9] ^ self.data_i[0] ^ self.data_i[1] ^ self.data_i[4] ^
-                            self.data_i[5] ^ self.data_i[9]),
-            self.crc_o[5].eq(self.crc_i[1] ^ self.crc_i[2] ^ self.crc_i[5] ^ self.crc_i[6] ^
-                            self.crc_i[10] ^ self.data_i[1] ^ self.data_i[2] ^ self.data_i[5] ^
-                            self.data_i[6] ^ self.data_i[10]),
-            self.crc_o[6].eq(self.crc_i[0] ^ self.crc_i[2] ^ self.crc_i[3] ^ self.crc_i[6] ^
-                            self.crc_i[7] ^ self.crc_i[11] ^ self.data_i[0] ^ self.data_i[2] ^
-                            self.data_i[3] ^ self.data_i[6] ^ self.data_i[7] ^ self.data_i[11]),
-            self.crc_o[7].eq(self.crc_i[0] ^ self.crc_i[1] ^ self.crc_i[3] ^ self.crc_i[4] ^
-                            self.crc_i[7] ^ self.crc_i[8] ^ self.crc_i[12] ^ self.data_i[0] ^
-                            self.data_i[1] ^ self.data_i[3] ^ self.data_i[4] ^ self.data_i[7] ^
-                            self.data_i[8] ^ self.data_i[12]),
-            self.crc_o[8].eq(self.crc_i[0] ^ self.crc_i[1] ^ self.crc_i[2] ^ self.crc_i[4] ^
-                            self.crc_i[5] ^ self.crc_i[8] ^ self.crc_i[9] ^ self.crc_i[13] ^
-                            self.data_i[0] ^ self.data_i[1] ^ self.data_i[2] ^ self.data_i[4] ^
-                            self.data_i[5] ^ self.data_i[8] ^ self.data_i[9] ^ self.data_i[13]),
-            self.crc_o[9].eq(self.crc_i[1] ^ self.crc_i[2] ^ self.crc_i[3] ^ self.crc_i[5] ^
-                            self.crc_i[6] ^ self.crc_i[9] ^ self.crc_i[10] ^ self.crc_i[14] ^
-                            self.data_i[1] ^ self.data_i[2] ^ self.data_i[3] ^ self.data_i[5] ^
-                            self.data_i[6] ^ self.data_i[9] ^ self.data_i[10] ^ self.data_i[14]),
-            self.crc_o[10].eq(self.crc_i[2] ^ self.crc_i[3] ^ self.crc_i[4] ^ self.crc_i[6] ^
-                            self.crc_i[7] ^ self.crc_i[10] ^ self.crc_i[11] ^ self.crc_i[15] ^
-                            self.data_i[2] ^ self.data_i[3] ^ self.data_i[4] ^ self.data_i[6] ^
-                            self.data_i[7] ^ self.data_i[10] ^ self.data_i[11] ^ self.data_i[15]),
-            self.crc_o[11].eq(self.crc_i[0] ^ self.crc_i[3] ^ self.crc_i[7] ^ self.crc_i[11] ^
-                            self.data_i[0] ^ self.data_i[3] ^ self.data_i[7] ^ self.data_i[11]),
-            self.crc_o[12].eq(self.crc_i[0] ^ self.crc_i[1] ^ self.crc_i[4] ^ self.crc_i[8] ^
-                            self.crc_i[12] ^ self.data_i[0] ^ self.data_i[1] ^ self.data_i[4] ^
-                            self.data_i[8] ^ self.data_i[12]),
-            self.crc_o[13].eq(self.crc_i[1] ^ self.crc_i[2] ^ self.crc_i[5] ^ self.crc_i[9] ^
-                            self.crc_i[13] ^ self.data_i[1] ^ self.data_i[2] ^ self.data_i[5] ^
-                            self.data_i[9] ^ self.data_i[13]),
-            self.crc_o[14].eq(self.crc_i[2] ^ self.crc_i[3] ^ self.crc_i[6] ^ self.crc_i[10] ^
-                            self.crc_i[14] ^ self.data_i[2] ^ self.data_i[3] ^ self.data_i[6] ^
-                            self.data_i[10] ^ self.data_i[14]),
-            self.crc_o[15].eq(self.crc_i[3] ^ self.crc_i[4] ^ self.crc_i[7] ^ self.crc_i[11] ^
-                            self.crc_i[15] ^ self.data_i[3] ^ self.data_i[4] ^ self.data_i[7] ^
-                            self.data_i[11] ^ self.data_i[15]),
-        ]
+        def xor_network(width):
+            crc = []
+            for crc_mask, data_mask in crc_matrix(width):
+                taps = [self.crc_i[i] for i in range(16) if (crc_mask >> i) & 1]
+                taps += [self.data_i[i] for i in range(width) if (data_mask >> i) & 1]
+                crc.append(reduce(xor, taps) if taps else 0)
+            return Cat(*crc)
+
+        # The widest network is used for fully enabled words, shorter ones only
+        # for tail words
+        partial_crc = [xor_network(n * 8) for n in range(1, BYTES + 1)]
+        cases = {2**n - 1: self.crc_o.eq(partial_crc[n - 1]) for n in range(1, BYTES)}
+        cases[0] = self.crc_o.eq(self.crc_i)
+        cases["default"] = self.crc_o.eq(partial_crc[-1])
+
+        if BYTES == 1:
+            self.comb += self.crc_o.eq(partial_crc[-1])
+        else:
+            self.comb += Case(self.be_i, cases)
 
 
 if __name__ == "__main__":
-    crc = CRC16()
-    print(convert(crc, crc.ios, name="crc16"))
+    parser = argparse.ArgumentParser(description="Generate CRC16 RTL")
+    parser.add_argument(
+        "--data-width", type=int, default=16, help="Input data width in bits (16, 32 or 64)"
+    )
+    args = parser.parse_args()
+
+    if args.data_width not in (16, 32, 64):
+        sys.exit("Unsupported data width")
+
+    crc = CRC16(args.data_width)
+    module_name = "crc16" if args.data_width == 16 else "crc16_" + str(args.data_width) + "bit"
+    print(convert(crc, crc.ios, name=module_name))
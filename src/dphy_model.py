@@ -0,0 +1,329 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Behavioural Verilog models of the hardened primitives used by Top.
+
+The DPHY model covers the subset of the hardened D-PHY used with CIL bypassed:
+PLL and byte clock, HS serializers and LP drivers of the clock lane and the data
+lanes. Ports, their directions and widths follow the primitive, so an instance
+connecting a port the wrong way or a port the model doesn't know fails to
+elaborate, and check_instance reports the same at generation time. The OSCA
+model provides the internal oscillator.
+
+Models need timing support of the simulator (`--timing` in Verilator).
+"""
+
+from migen import Instance
+
+from common import PLL_CN
+
+__all__ = ["DPHY_PORTS", "check_instance", "dphy_model"]
+
+# Data lane ports of the hardened D-PHY in lane order: HS data, HS_TX enable,
+# HS serializer enable, LP_TX enable, LP_TX positive and negative data
+DPHY_LANE_PORTS = {
+    "hs_data": ["UTXDHS", "U1TXDHS", "U2TXDHS", "U3TXDHS"],
+    "hs_en": ["UED0THEN", "U1ENTHEN", "U2END2", "U3END3"],
+    "ser_en": ["UTRD0SEN", "U1TXREQH", "U2TXREQH", "U3TXREQH"],
+    "lp_en": ["UDE0D0TN", "UDE1D1TN", "UDE2D2TN", "UDE3D3TN"],
+    "lp_p": ["UTXMDTX", "U2FTXST", "U3TDISD2", "U3TXVD3"],
+    "lp_n": ["U1FTXST", "U3FTXST", "U3TREQD2", "U3TXULPS"],
+    "dp": ["DP0", "DP1", "DP2", "DP3"],
+    "dn": ["DN0", "DN1", "DN2", "DN3"],
+}
+
+# Ports which are tied off with CIL bypassed, only declared by the model
+DPHY_TIED_PORTS = [
+    "BITCKEXT", "SCCLKIN", "UCTXREQH", "UCTXUPSX", "UTXENER", "UTXRD0EN", "UTXULPSE",
+    "UFRXMODE", "URXCKINE", "UTDIS", "UTRNREQ", "UTXCKE", "UTXUPSEX", "UTXVDE",
+    "U1TXLPD", "U1TXREQ", "U1TDE6", "U1TDE7", "U1FRXMD", "U1TDIS", "U1TREQ", "U1TXUPSE",
+    "U1TXUPSX", "U1TXVDE", "U2TXREQ", "U2FRXMD", "U2TDIS", "U2TPDTE", "U2TREQ", "U2TXUPSE",
+    "U2TXUPSX", "U2TXVDE", "U3TXREQ", "U3TDE6", "U3TDE7", "U3FRXMD",
+    # Power down of HS_TX and LP_TX, CDEN and HS_TX data of the test mode
+    "U2TDE0D0", "U2TDE1D1", "U2TDE2D2", "U2TDE3D3", "U2TDE4CK", "U2TDE5D0", "U2TDE6D1",
+    "U2TDE7D2", "U3TDE0D3", "U1TDE2D0", "U1TDE3D1", "U1TDE4D2", "U1TDE5D3", "U3TDE1D0",
+    "U3TDE2D1", "U3TDE3D2", "U3TDE4D3", "U3TDE5CK",
+] + ["{}TXTGE{}".format(lane, i) for lane in ["U", "U1", "U2", "U3"] for i in range(4)]
+
+
+def _dphy_ports():
+    ports = {
+        "CLKREF": ("input", 1),
+        "PDDPHY": ("input", 1),
+        "PDPLL": ("input", 1),
+        # Clock lane HS_TX enable, LP_TX enable and LP_TX positive and negative data
+        "UCENCK": ("input", 1),
+        "UDE4CKTN": ("input", 1),
+        "U3TXUPSX": ("input", 1),
+        "U3TXLPDT": ("input", 1),
+        # HS_TX word valid of each lane
+        "UTXWVDHS": ("input", 4),
+        "U1TXWVHS": ("input", 4),
+        "U2TXWVHS": ("input", 4),
+        "U3TXWVHS": ("input", 4),
+        "UTWDCKHS": ("output", 1),
+        "LOCK": ("output", 1),
+        "CKP": ("output", 1),
+        "CKN": ("output", 1),
+    }
+    for role, names in DPHY_LANE_PORTS.items():
+        for name in names:
+            if role in ["dp", "dn"]:
+                ports[name] = ("output", 1)
+            else:
+                ports[name] = ("input", 32 if role == "hs_data" else 1)
+    ports.update((name, ("input", 1)) for name in DPHY_TIED_PORTS)
+    return ports
+
+
+# Direction and width of each modelled port of the hardened D-PHY, pads are
+# inouts of the primitive, driven as outputs by the model
+DPHY_PORTS = _dphy_ports()
+
+# Reference clock cycles from the start of the PLL to its lock
+PLL_LOCK_CYCLES = 64
+
+
+def check_instance(instance):
+    """Return problems of a DPHY instance port map, unknown ports and ports
+    connected in the wrong direction or with a too wide signal."""
+    problems = []
+    for item in instance.items:
+        if isinstance(item, Instance.Parameter):
+            continue
+        if item.name not in DPHY_PORTS:
+            problems.append("Unknown D-PHY port {}".format(item.name))
+            continue
+        direction, width = DPHY_PORTS[item.name]
+        if isinstance(item, Instance.Input) != (direction == "input"):
+            problems.append("D-PHY port {} is an {}".format(item.name, direction))
+        if len(item.expr) > width:
+            problems.append("D-PHY port {} is {} bits wide, connected to {} bits".format(
+                item.name, width, len(item.expr)))
+    return problems
+
+
+# Value of a decimal or "0b" prefixed binary string parameter
+PARAM_VALUE = """\tfunction integer param_value(input [8*16-1:0] value, input integer base);
+\t\tinteger i;
+\t\tbegin
+\t\t\tparam_value = 0;
+\t\t\tfor (i = 15; i >= 0; i = i - 1)
+\t\t\t\tif (value[8*i +: 8] >= "0" && value[8*i +: 8] < "0" + base)
+\t\t\t\t\tparam_value = param_value * base + value[8*i +: 8] - "0";
+\t\t\t\telse if (value[8*i +: 8] == "b")
+\t\t\t\t\tparam_value = 0;
+\t\tend
+\tendfunction
+"""
+
+
+def dphy_model():
+    """Return Verilog of the DPHY and OSCA models."""
+    ports = ",\n".join("\t{}{} {}".format(direction, " [{}:0]".format(width - 1) if width > 1 else "",
+                                          name)
+                       for name, (direction, width) in DPHY_PORTS.items())
+    pll_n = " : ".join('CN == "{}" ? {}'.format(code, n) for n, code in sorted(PLL_CN.items()))
+
+    def lanes(role):
+        return ", ".join(reversed(DPHY_LANE_PORTS[role]))
+
+    return """
+// Behavioural model of the hardened D-PHY with CIL bypassed.
+//
+// HS bit clock is the reference clock multiplied by M / (N * O), byte clock
+// is the bit clock divided by the gear. Data lanes take the lower gear bits of
+// their HS data each byte clock cycle, LSB first. HS_TX enable, serializer
+// enable and LP_TX enable are sampled at the byte clock edge and apply to the
+// whole word, LP_TX enable takes precedence. Clock lane toggles in the middle of
+// each UI while its HS_TX is enabled. Protocol violations are counted in errors.
+module DPHY #(
+	parameter GSR = "ENABLED",
+	parameter AUTO_PD_EN = "POWERED_UP",
+	parameter CFG_NUM_LANES = "ONE_LANE",
+	parameter CM = "0b00000000",
+	parameter CN = "0b00000",
+	parameter CO = "0b000",
+	parameter CONT_CLK_MODE = "DISABLED",
+	parameter DESKEW_EN = "DISABLED",
+	parameter DSI_CSI = "CSI2_APP",
+	parameter EN_CIL = "CIL_ENABLED",
+	parameter HSEL = "DISABLED",
+	parameter LANE0_SEL = "LANE_0",
+	parameter LOCK_BYP = "GATE_TXBYTECLKHS",
+	parameter MASTER_SLAVE = "SLAVE",
+	parameter PLLCLKBYPASS = "REGISTERED",
+	parameter TXDATAWIDTHHS = "0b00"
+) (
+{ports}
+);
+{param_value}
+	localparam integer PLL_N = {pll_n} : 0;
+	localparam integer PLL_M = param_value(CM, 2) - 64;
+	localparam integer PLL_O = 1 << param_value(CO, 2);
+	localparam integer GEAR = TXDATAWIDTHHS == "0b01" ? 16 : 8;
+	localparam integer LANES = CFG_NUM_LANES == "FOUR_LANES" ? 4 :
+		CFG_NUM_LANES == "THREE_LANES" ? 3 : CFG_NUM_LANES == "TWO_LANES" ? 2 : 1;
+	localparam integer LOCK_CYCLES = {lock_cycles};
+
+	wire [31:0] hs_data [0:3];
+	assign {{hs_data[3], hs_data[2], hs_data[1], hs_data[0]}} = {{{hs_data}}};
+	wire [3:0] hs_en = {{{hs_en}}};
+	wire [3:0] ser_en = {{{ser_en}}};
+	wire [3:0] lp_en = {{{lp_en}}};
+	wire [3:0] lp_p = {{{lp_p}}};
+	wire [3:0] lp_n = {{{lp_n}}};
+	reg [3:0] dp = 0;
+	reg [3:0] dn = 0;
+	assign {{{dp}}} = dp;
+	assign {{{dn}}} = dn;
+
+	reg byte_clk = 0;
+	reg clk_p = 0;
+	reg clk_n = 0;
+	reg lock = 0;
+	assign UTWDCKHS = byte_clk;
+	assign CKP = clk_p;
+	assign CKN = clk_n;
+	assign LOCK = lock;
+
+	// Number of protocol violations and of HS words sent
+	integer errors = 0;
+	integer words = 0;
+	real ref_period = 0;
+	real ui = 0;
+
+	reg [31:0] word [0:3];
+	reg [3:0] hs = 0;
+	reg [3:0] word_lp_p = 0;
+	reg [3:0] word_lp_n = 0;
+	reg hs_clk = 0;
+	real start;
+	integer cycles = 0;
+	integer lane, step;
+
+	initial begin
+		@(posedge CLKREF);
+		start = $realtime;
+		@(posedge CLKREF);
+		ref_period = $realtime - start;
+		if (PLL_N == 0 || PLL_M <= 0) begin
+			$display("DPHY model: unknown PLL settings CN=%s CM=%s", CN, CM);
+			errors = errors + 1;
+		end else begin
+			ui = ref_period * PLL_N * PLL_O / PLL_M;
+			$display("DPHY model: %0d lanes, gear %0d, UI %f, byte clock period %f",
+				LANES, GEAR, ui, ui * GEAR);
+			repeat (LOCK_CYCLES) @(posedge CLKREF);
+			while (PDPLL) @(negedge PDPLL);
+			lock = 1;
+			start = $realtime;
+			forever begin
+				// Inputs are sampled before the rising edge of the byte clock
+				for (lane = 0; lane < 4; lane = lane + 1) begin
+					word[lane] = hs_data[lane];
+					hs[lane] = lane < LANES && !PDDPHY && hs_en[lane] && ser_en[lane] && !lp_en[lane];
+					if (hs[lane] && (hs_data[lane] >> GEAR) != 0) begin
+						$display("DPHY model: lane %0d HS data %h exceeds gear %0d at %t",
+							lane, hs_data[lane], GEAR, $realtime);
+						errors = errors + 1;
+					end
+				end
+				word_lp_p = lp_p;
+				word_lp_n = lp_n;
+				if (hs_clk && !UCENCK && CONT_CLK_MODE == "ENABLED") begin
+					$display("DPHY model: clock lane left HS mode in continuous clock mode at %t",
+						$realtime);
+					errors = errors + 1;
+				end
+				hs_clk = UCENCK && !PDDPHY;
+				if (hs != 0 && !hs_clk) begin
+					$display("DPHY model: HS data sent without HS clock at %t", $realtime);
+					errors = errors + 1;
+				end
+				if (hs != 0)
+					words = words + 1;
+
+				byte_clk = 1;
+				for (step = 0; step < 2 * GEAR; step = step + 1) begin
+					if (step == GEAR)
+						byte_clk = 0;
+					if (step % 2 == 0) begin
+						for (lane = 0; lane < 4; lane = lane + 1)
+							if (PDDPHY || lane >= LANES) begin
+								dp[lane] = 0;
+								dn[lane] = 0;
+							end else if (hs[lane]) begin
+								dp[lane] = word[lane][step / 2];
+								dn[lane] = !word[lane][step / 2];
+							end else begin
+								dp[lane] = word_lp_p[lane];
+								dn[lane] = word_lp_n[lane];
+							end
+						if (!hs_clk) begin
+							clk_p = PDDPHY ? 0 : U3TXUPSX;
+							clk_n = PDDPHY ? 0 : U3TXLPDT;
+						end else if (clk_p == clk_n) begin
+							// HS clock starts low
+							clk_p = 0;
+							clk_n = 1;
+						end
+					end else if (hs_clk) begin
+						clk_p = !clk_p;
+						clk_n = !clk_p;
+					end
+					// Absolute schedule, so that delay rounding doesn't accumulate
+					#(start + (2 * GEAR * cycles + step + 1) * ui / 2 - $realtime);
+				end
+				cycles = cycles + 1;
+			end
+		end
+	end
+endmodule
+
+// Behavioural model of the internal oscillator, HF_CLK_DIV divides 450 MHz
+module OSCA #(
+	parameter HF_CLK_DIV = "1",
+	parameter HF_OSC_EN = "ENABLED",
+	parameter HF_SED_SEC_DIV = "1",
+	parameter LF_OUTPUT_EN = "DISABLED"
+) (
+	input HFOUTEN,
+	input HFSDSCEN,
+	output reg HFCLKOUT = 0,
+	output LFCLKOUT,
+	output HFCLKCFG,
+	output HFSDCOUT
+);
+{param_value}
+	// Half period in ps of 450 MHz divided by HF_CLK_DIV + 1
+	localparam real HALF_PERIOD = 1111.111 * (param_value(HF_CLK_DIV, 10) + 1);
+
+	assign LFCLKOUT = 0;
+	assign HFCLKCFG = HFCLKOUT;
+	assign HFSDCOUT = 0;
+
+	initial forever begin
+		#(HALF_PERIOD * 1ps);
+		HFCLKOUT = HF_OSC_EN == "ENABLED" && HFOUTEN ? !HFCLKOUT : 0;
+	end
+endmodule
+""".format(ports=ports, pll_n=pll_n, lock_cycles=PLL_LOCK_CYCLES, hs_data=lanes("hs_data"),
+           hs_en=lanes("hs_en"), ser_en=lanes("ser_en"), lp_en=lanes("lp_en"),
+           lp_p=lanes("lp_p"), lp_n=lanes("lp_n"), dp=lanes("dp"), dn=lanes("dn"),
+           param_value=PARAM_VALUE)
+
+
+if __name__ == "__main__":
+    print(dphy_model())
@@ -0,0 +1,195 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from migen import *
+from migen.fhdl.verilog import convert
+from migen.fhdl.module import Module
+
+__all__ = ["FormatDetect"]
+
+
+class FormatDetect(Module):
+    """Measurement of the input video format.
+
+    Active width is the number of pixels in a line and active height the number
+    of lines in a frame, line and frame periods are measured between subsequent
+    line and frame starts, all in pixel clock cycles. Results are updated at the
+    end of each frame. They are valid if all lines of the frame have the same
+    width and the frame matches the previous one in width, height and line period.
+
+    Frames are passed on `fv_o` and `lv_o` while the format is valid. A line of
+    a different width than `width_o`, e.g. the first one after a format change,
+    is cut or padded to `width_o` pixels, and the rest of the frame is dropped
+    until the new format is valid. Pixels of padding are marked by `pad_o`.
+
+    Attributes
+    ----------
+    fv_i : Signal(1)
+        Frame valid.
+    lv_i : Signal(1)
+        Line valid.
+    width_o : Signal(12)
+        Active width in pixels.
+    height_o : Signal(12)
+        Active height in lines.
+    line_period_o : Signal(16)
+        Line period in clock cycles.
+    frame_period_o : Signal(24)
+        Frame period in clock cycles.
+    valid_o : Signal(1)
+        High if the measured format is stable, changes only while `fv_i` is low.
+    fv_o : Signal(1)
+        Frame valid of passed frames.
+    lv_o : Signal(1)
+        Line valid of passed lines, `width_o` pixels long.
+    pad_o : Signal(1)
+        High while a line shorter than `width_o` is padded, its pixels are to be
+        replaced with zeros.
+    """
+    def __init__(self):
+        self.fv_i = Signal()
+        self.lv_i = Signal()
+        self.width_o = Signal(12)
+        self.height_o = Signal(12)
+        self.line_period_o = Signal(16)
+        self.frame_period_o = Signal(24)
+        self.valid_o = Signal()
+        self.fv_o = Signal()
+        self.lv_o = Signal()
+        self.pad_o = Signal()
+
+        self.ios = {
+            self.fv_i,
+            self.lv_i,
+            self.width_o,
+            self.height_o,
+            self.line_period_o,
+            self.frame_period_o,
+            self.valid_o,
+            self.fv_o,
+            self.lv_o,
+            self.pad_o,
+        }
+
+        fv_d = Signal()
+        lv_d = Signal()
+        fv_start = Signal()
+        fv_end = Signal()
+        lv_start = Signal()
+        lv_end = Signal()
+        self.comb += [
+            fv_start.eq(self.fv_i & ~fv_d),
+            fv_end.eq(~self.fv_i & fv_d),
+            lv_start.eq(self.lv_i & ~lv_d),
+            lv_end.eq(~self.lv_i & lv_d),
+        ]
+        self.sync += [
+            fv_d.eq(self.fv_i),
+            lv_d.eq(self.lv_i),
+        ]
+
+        # Geometry of the current frame, counters saturate
+        pix_cnt = Signal(12)
+        line_width = Signal(12)
+        line_cnt = Signal(16)
+        line_period = Signal(16)
+        line_idx = Signal(12)
+        frame_cnt = Signal(24)
+        width_glitch = Signal()
+        self.sync += [
+            If(lv_start,
+                pix_cnt.eq(1),
+            ).Elif(self.lv_i & (pix_cnt != (2**len(pix_cnt) - 1)),
+                pix_cnt.eq(pix_cnt + 1),
+            ),
+            If(lv_end,
+                line_width.eq(pix_cnt),
+                If((line_idx > 1) & (pix_cnt != line_width),
+                    width_glitch.eq(1),
+                ),
+            ),
+            If(lv_start,
+                line_cnt.eq(0),
+                If(line_idx != 0,
+                    line_period.eq(line_cnt + 1),
+                ),
+                line_idx.eq(line_idx + 1),
+            ).Elif(line_cnt != (2**len(line_cnt) - 1),
+                line_cnt.eq(line_cnt + 1),
+            ),
+            If(fv_start,
+                frame_cnt.eq(0),
+                self.frame_period_o.eq(frame_cnt + 1),
+            ).Elif(frame_cnt != (2**len(frame_cnt) - 1),
+                frame_cnt.eq(frame_cnt + 1),
+            ),
+            If(fv_start,
+                line_idx.eq(0),
+                width_glitch.eq(0),
+            ),
+        ]
+
+        # Results are compared with the previous frame
+        frame_ok = (~width_glitch & (line_idx != 0) & (line_width == self.width_o) &
+                    (line_idx == self.height_o) & (line_period == self.line_period_o))
+        self.sync += [
+            If(fv_end,
+                self.width_o.eq(line_width),
+                self.height_o.eq(line_idx),
+                self.line_period_o.eq(line_period),
+                self.valid_o.eq(frame_ok),
+            ),
+        ]
+
+        # Lines are passed while their width matches the measured one, a line of
+        # a different width ends with width_o pixels and the rest of the frame is
+        # dropped. Index of the current pixel is pix_cnt, except on the line start.
+        frame_pass = Signal()
+        mismatch = Signal()
+        line_out = Signal()
+        out_cnt = Signal(12)
+        pix_idx = Mux(lv_start, 0, pix_cnt)
+        frame_on = Mux(fv_start, self.valid_o, frame_pass)
+        lines_on = Mux(fv_start, self.valid_o, frame_pass & ~mismatch)
+        pix_pass = self.lv_i & lines_on & (pix_idx < self.width_o)
+        self.comb += [
+            self.fv_o.eq(self.fv_i & frame_on),
+            # Padding may last into the next input line, which is dropped anyway
+            self.pad_o.eq(line_out & self.fv_i & ~pix_pass & (out_cnt < self.width_o)),
+            self.lv_o.eq(pix_pass | self.pad_o),
+        ]
+        self.sync += [
+            If(fv_start,
+                frame_pass.eq(self.valid_o),
+            ),
+            If(fv_start,
+                mismatch.eq(0),
+            ).Elif(self.lv_i & ~lv_start & (pix_cnt == self.width_o) |
+                   lv_end & (pix_cnt != self.width_o),
+                mismatch.eq(1),
+            ),
+            If(lv_start & lines_on,
+                line_out.eq(1),
+                out_cnt.eq(1),
+            ).Elif(fv_end,
+                line_out.eq(0),
+            ).Elif(self.lv_o,
+                out_cnt.eq(out_cnt + 1),
+            ),
+        ]
+
+
+if __name__ == "__main__":
+    format_detect = FormatDetect()
+    print(convert(format_detect, format_detect.ios, name="format_detect"))
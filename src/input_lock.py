@@ -0,0 +1,145 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+from migen import *
+from migen.fhdl.verilog import convert
+from migen.fhdl.module import Module
+
+__all__ = ["InputLock"]
+
+
+class InputLock(Module):
+    """Detector of stable input frame timings.
+
+    Line period is measured between subsequent line starts. A frame is consistent
+    if it has at least `lines` line periods, all of them match each other, and its
+    number of lines and line period match the previous frame. Lock is reported
+    once `frames` subsequent frames are consistent, and it is lost with the first
+    inconsistent one. Input signals are sampled directly, so periods measured in
+    an asynchronous clock domain may differ by a cycle, which is covered by the
+    tolerance.
+
+    Parameters
+    ----------
+    frames : int
+        Number of subsequent consistent frames required for the lock.
+    lines : int
+        Minimum number of matching line periods in a frame.
+    tolerance : int
+        Maximum difference between matching line periods, in clock cycles.
+
+    Attributes
+    ----------
+    fv_i : Signal(1)
+        Frame valid.
+    lv_i : Signal(1)
+        Line valid.
+    locked_o : Signal(1)
+        High if input timings are stable, updated at the end of each frame.
+    """
+    def __init__(self, frames, lines, tolerance=2):
+        assert frames >= 1
+        assert lines >= 1
+
+        self.fv_i = Signal()
+        self.lv_i = Signal()
+        self.locked_o = Signal()
+
+        self.ios = {
+            self.fv_i,
+            self.lv_i,
+            self.locked_o,
+        }
+
+        fv_d = Signal()
+        lv_d = Signal()
+        fv_start = Signal()
+        fv_end = Signal()
+        lv_start = Signal()
+        self.comb += [
+            fv_start.eq(self.fv_i & ~fv_d),
+            fv_end.eq(~self.fv_i & fv_d),
+            lv_start.eq(self.lv_i & ~lv_d),
+        ]
+        self.sync += [
+            fv_d.eq(self.fv_i),
+            lv_d.eq(self.lv_i),
+        ]
+
+        def matches(a, b):
+            return Mux(a > b, a - b, b - a) <= tolerance
+
+        # Line period of the current frame
+        line_cnt = Signal(16)
+        line_period = Signal(16)
+        line_idx = Signal(12)
+        stable_lines = Signal(max=lines + 1)
+        line_glitch = Signal()
+        self.sync += [
+            If(lv_start,
+                line_cnt.eq(0),
+                line_period.eq(line_cnt + 1),
+                line_idx.eq(line_idx + 1),
+                If(line_idx > 1,
+                    If(~matches(line_cnt + 1, line_period),
+                        line_glitch.eq(1),
+                    ).Elif(stable_lines != lines,
+                        stable_lines.eq(stable_lines + 1),
+                    ),
+                ),
+            ).Elif(line_cnt != (2**len(line_cnt) - 1),
+                line_cnt.eq(line_cnt + 1),
+            ),
+            If(fv_start,
+                line_idx.eq(0),
+                stable_lines.eq(0),
+                line_glitch.eq(0),
+            ),
+        ]
+
+        # Timings of the previous frame
+        frame_lines = Signal(12)
+        frame_period = Signal(16)
+        good_frames = Signal(max=frames + 1)
+        frame_ok = ((stable_lines == lines) & ~line_glitch & (line_idx == frame_lines) &
+                    matches(line_period, frame_period))
+        self.sync += [
+            If(fv_end,
+                frame_lines.eq(line_idx),
+                frame_period.eq(line_period),
+                If(frame_ok,
+                    If(good_frames != frames,
+                        good_frames.eq(good_frames + 1),
+                    ),
+                ).Else(
+                    good_frames.eq(0),
+                ),
+            ),
+        ]
+        self.comb += self.locked_o.eq(good_frames == frames)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--frames", type=int, default=2, help="Number of subsequent consistent frames"
+    )
+    parser.add_argument(
+        "--lines", type=int, default=4, help="Minimum number of matching line periods in a frame"
+    )
+    args = parser.parse_args()
+
+    input_lock = InputLock(args.frames, args.lines)
+    print(convert(input_lock, input_lock.ios, name="input_lock"))
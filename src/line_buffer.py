@@ -0,0 +1,204 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from migen import *
+from migen.fhdl.verilog import convert
+from migen.fhdl.module import Module
+from migen.genlib.cdc import MultiReg, GrayCounter, GrayDecoder
+from mipi_dphy import hs_round_trip
+
+__all__ = ["LineBuffer", "line_buffer_depth"]
+
+# Maximum number of bytes in a single line (1920 * 2 = 3840)
+MAX_LINE = 3840
+# Words written during CDC, FSM transitions, packet headers and Null packets
+LATENCY_MARGIN = 32
+
+
+def line_buffer_depth(timings, four_lanes=False, gear=8, cont_clk=False, wc=MAX_LINE):
+    """Return number of words the line buffer has to hold, assuming that words are
+    read at least as fast as they are written. A line may start while D-PHY is
+    still leaving HS mode after the previous one, so the buffer covers the whole
+    round trip. Result is rounded up to a power of 2 and limited to a single line."""
+    NB = (4 if four_lanes else 2) * gear // 8
+    words = hs_round_trip(timings, cont_clk) + LATENCY_MARGIN
+    return 2 ** log2_int(min(words, -(-wc // NB)), need_pow2=False)
+
+
+class LineBuffer(Module):
+    """Asynchronous FIFO buffering pixel words between pixel and byte clock domains.
+
+    Storage is a single memory, which is mapped to a block RAM. Write and read
+    interfaces are accessed from different clock domains, named `write` and `read`.
+    Use `ClockDomainsRenamer` to rename them to other names.
+
+    Number of buffered words is reported in the read domain and compared against
+    watermarks, so that HS transmission can be requested once enough data is
+    buffered. The write pointer is synchronized with a latency, so the level may be
+    lower than the actual one, but it is never higher.
+
+    Parameters
+    ----------
+    width : int
+        Width of a single word.
+    depth : int
+        Number of words, has to be a power of 2, at least 4.
+    almost_empty : int
+        Reset value of the almost empty watermark.
+    almost_full : int
+        Reset value of the almost full watermark, defaults to depth.
+
+    Attributes
+    ----------
+    din : Signal(width)
+        Word to be written (write domain).
+    we : Signal(1)
+        Write enable, word is written if writable is high (write domain).
+    writable : Signal(1)
+        High if there is space for at least one more word (write domain).
+    dout : Signal(width)
+        Oldest buffered word, valid if readable is high (read domain).
+    re : Signal(1)
+        Read enable, word is removed if readable is high (read domain).
+    readable : Signal(1)
+        High if at least one word is buffered (read domain).
+    level : Signal(max=depth + 1)
+        Number of buffered words (read domain).
+    almost_empty_level : Signal(max=depth + 1)
+        Almost empty watermark, can be driven at runtime (read domain).
+    almost_full_level : Signal(max=depth + 1)
+        Almost full watermark, can be driven at runtime (read domain).
+    almost_empty : Signal(1)
+        High while fewer than almost_empty_level words are buffered (read domain).
+    almost_full : Signal(1)
+        High while at least almost_full_level words are buffered (read domain).
+    """
+    def __init__(self, width, depth, almost_empty=0, almost_full=None):
+        assert depth >= 4 and depth == 2 ** log2_int(depth, need_pow2=False)
+        if almost_full is None:
+            almost_full = depth
+        assert 0 <= almost_empty <= depth
+        assert 0 <= almost_full <= depth
+        DEPTH_BITS = log2_int(depth)
+
+        self.width = width
+        self.depth = depth
+
+        # Write interface
+        self.din = Signal(width)
+        self.we = Signal()
+        self.writable = Signal()
+
+        # Read interface
+        self.dout = Signal(width)
+        self.re = Signal()
+        self.readable = Signal()
+        self.level = Signal(max=depth + 1)
+        self.almost_empty_level = Signal(max=depth + 1, reset=almost_empty)
+        self.almost_full_level = Signal(max=depth + 1, reset=almost_full)
+        self.almost_empty = Signal()
+        self.almost_full = Signal()
+
+        # IOs
+        self.ios = {
+            self.din,
+            self.we,
+            self.writable,
+            self.dout,
+            self.re,
+            self.readable,
+            self.level,
+            self.almost_empty_level,
+            self.almost_full_level,
+            self.almost_empty,
+            self.almost_full,
+        }
+
+        # Gray coded pointers are synchronized to the opposite domains
+        produce = ClockDomainsRenamer("write")(GrayCounter(DEPTH_BITS + 1))
+        consume = ClockDomainsRenamer("read")(GrayCounter(DEPTH_BITS + 1))
+        self.submodules += produce, consume
+        self.comb += [
+            produce.ce.eq(self.writable & self.we),
+            consume.ce.eq(self.readable & self.re),
+        ]
+
+        produce_rdomain = Signal(DEPTH_BITS + 1)
+        produce.q.attr.add("no_retiming")
+        self.specials += MultiReg(produce.q, produce_rdomain, "read")
+        consume_wdomain = Signal(DEPTH_BITS + 1)
+        consume.q.attr.add("no_retiming")
+        self.specials += MultiReg(consume.q, consume_wdomain, "write")
+
+        # Buffer is full if pointers differ only by the wrap bit
+        self.comb += self.writable.eq((produce.q[-1] == consume_wdomain[-1]) |
+                                      (produce.q[-2] == consume_wdomain[-2]) |
+                                      (produce.q[:-2] != consume_wdomain[:-2]))
+        self.comb += self.readable.eq(consume.q != produce_rdomain)
+
+        # Fill level and watermarks
+        produce_decoder = ClockDomainsRenamer("read")(GrayDecoder(DEPTH_BITS + 1))
+        self.submodules += produce_decoder
+        self.comb += [
+            produce_decoder.i.eq(produce_rdomain),
+            self.level.eq((produce_decoder.o - consume.q_binary)[:DEPTH_BITS + 1]),
+            self.almost_empty.eq(self.level < self.almost_empty_level),
+            self.almost_full.eq(self.level >= self.almost_full_level),
+        ]
+
+        # Block RAM storage
+        storage = Memory(width, depth)
+        self.specials += storage
+        wrport = storage.get_port(write_capable=True, clock_domain="write")
+        self.specials += wrport
+        self.comb += [
+            wrport.adr.eq(produce.q_binary[:-1]),
+            wrport.dat_w.eq(self.din),
+            wrport.we.eq(produce.ce),
+        ]
+        rdport = storage.get_port(clock_domain="read")
+        self.specials += rdport
+        self.comb += [
+            rdport.adr.eq(consume.q_next_binary[:-1]),
+            self.dout.eq(rdport.dat_r),
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate Line Buffer RTL")
+    parser.add_argument(
+        "--lanes", type=int, default=2, help='Number of lanes ("2", or "4")'
+    )
+    parser.add_argument(
+        "--depth", type=int, default=16, help="Number of buffered words"
+    )
+    args = parser.parse_args()
+
+    if args.lanes not in (2, 4):
+        sys.exit("Unsupported number of lanes")
+
+    line_buffer = ClockDomainsRenamer({"write": "sys", "read": "byte"})(
+        LineBuffer(args.lanes * 8, args.depth, almost_empty=4, almost_full=args.depth - 4)
+    )
+    line_buffer.clock_domains.cd_sys = ClockDomain("sys")
+    line_buffer.clock_domains.cd_byte = ClockDomain("byte")
+    line_buffer.ios.update({
+        line_buffer.cd_sys.clk,
+        line_buffer.cd_sys.rst,
+        line_buffer.cd_byte.clk,
+        line_buffer.cd_byte.rst,
+    })
+    print(convert(line_buffer, line_buffer.ios, name="line_buffer"))
@@ -0,0 +1,125 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from common import byte_clk_freq, supported_formats_3g
+from mipi_dphy import hs_entry_latency, hs_round_trip
+from pattern_gen import hv_timings
+
+__all__ = ["link_budget", "served_formats", "print_budget"]
+
+# Data bus words of HS Init and long packet header, see PacketFormatter
+HEADER_WORDS = 3
+# Data bus words of long packet footer
+FOOTER_WORDS = 1
+# Data bus words of a short packet including HS Init
+SHORT_PACKET_WORDS = 3
+
+
+def served_formats(video_format, auto_format=False):
+    """Return precise video formats whose input a bitstream generated for
+    video_format has to sustain."""
+    if video_format in hv_timings:
+        return [video_format]
+    resolution = video_format.split("_")[0]
+    is_3g = video_format in supported_formats_3g
+    return [f for f in hv_timings
+            if (auto_format or f.startswith(resolution)) and
+            (f in supported_formats_3g) == is_3g]
+
+
+def link_budget(video_format, timings, four_lanes=False, gear=8, cont_clk=False,
+                line_burst=False, pack_sync=False, hs_watermark=0, buffer_depth=None):
+    """Return link budget of a precise video format sent with the given D-PHY timings.
+
+    Lengths are expressed in byte clock cycles, one data bus word is sent in each
+    of them. The byte clock carries 16-bit pixels on all lanes at the pixel rate,
+    so the payload of a line is sent as fast as it is received and HS entry and
+    exit have to fit in the blanking. Lines are sent in separate HS transmissions,
+    unless they are kept in HS mode across short horizontal blanking. Frame Start
+    and Frame End packets take separate HS transmissions in the vertical blanking,
+    unless they are packed with the adjacent lines.
+
+    The line buffer holds words received from the line start until the first
+    payload word is sent, that is the HS watermark, the entry latency and the
+    packet header. It is sustainable if that doesn't exceed buffer_depth, and the
+    slack left after each line and each frame isn't negative.
+    """
+    h = hv_timings[video_format]
+    LANES = 4 if four_lanes else 2
+    NB = LANES * gear // 8
+    byte_clk = byte_clk_freq(video_format, four_lanes, gear)
+    h_total = h["H_ACTIVE"] + h["H_SYNC"] + h["H_BACK_PORCH"] + h["H_FRONT_PORCH"]
+    v_total = h["V_ACTIVE"] + h["V_SYNC"] + h["V_BACK_PORCH"] + h["V_FRONT_PORCH"]
+
+    # 16-bit pixels, NB bytes per word
+    line_words = h_total * 2 / NB
+    payload_words = -(-h["H_ACTIVE"] * 2 // NB)
+    hblank_words = line_words - payload_words
+    round_trip = hs_round_trip(timings, cont_clk)
+    packet_words = HEADER_WORDS + payload_words + FOOTER_WORDS
+
+    # Lines are kept in HS mode if horizontal blanking is shorter than a round trip
+    line_overhead = HEADER_WORDS + FOOTER_WORDS
+    if not (line_burst and hblank_words < round_trip):
+        line_overhead += round_trip
+    line_slack = hblank_words - line_overhead
+
+    frame_words = line_words * v_total
+    vblank_words = line_words * (v_total - h["V_ACTIVE"])
+    sync_words = 2 * SHORT_PACKET_WORDS
+    if not pack_sync:
+        sync_words += 2 * round_trip
+    frame_slack = vblank_words - sync_words
+
+    fifo_occupancy = hs_watermark + hs_entry_latency(timings, cont_clk) + HEADER_WORDS
+    if pack_sync:
+        # Frame Start is sent before the header of the first line
+        fifo_occupancy += SHORT_PACKET_WORDS
+
+    hs_words = h["V_ACTIVE"] * (packet_words + timings["T_DATTRAIL"]) + 2 * SHORT_PACKET_WORDS
+
+    def us(words):
+        return round(words * 1e6 / byte_clk, 3)
+
+    return {
+        "video_format": video_format,
+        "byte_clk_hz": byte_clk,
+        "line_words": line_words,
+        "payload_words": payload_words,
+        "hblank_words": hblank_words,
+        "line_overhead_words": line_overhead,
+        "line_slack_words": line_slack,
+        "line_slack_us": us(line_slack),
+        "hs_line_us": us(packet_words + timings["T_DATTRAIL"]),
+        "frame_words": frame_words,
+        "vblank_words": vblank_words,
+        "frame_overhead_words": sync_words,
+        "frame_slack_words": frame_slack,
+        "frame_slack_us": us(frame_slack),
+        "link_utilization": round(hs_words / frame_words, 4),
+        "fifo_occupancy_words": fifo_occupancy,
+        "buffer_depth": buffer_depth,
+        "sustainable": line_slack >= 0 and frame_slack >= 0 and
+            (buffer_depth is None or fifo_occupancy <= buffer_depth),
+    }
+
+
+def print_budget(budgets):
+    print("{:10}{:>13}{:>12}{:>15}{:>16}{:>13}".format(
+        "format", "utilization", "HS/line us", "line slack us", "frame slack us", "FIFO words"))
+    for b in budgets:
+        print("{:10}{:>12.1f}%{:>12.2f}{:>15.2f}{:>16.1f}{:>8}/{:<4}{:>6}".format(
+            b["video_format"], 100 * b["link_utilization"], b["hs_line_us"], b["line_slack_us"],
+            b["frame_slack_us"], b["fifo_occupancy_words"], b["buffer_depth"] or "-",
+            "ok" if b["sustainable"] else "FAIL"))
@@ -16,7 +16,8 @@
 from migen import *
 from migen.fhdl.verilog import convert
 from migen.fhdl.module import Module
-from common import dphy_timings
+from common import get_timings, supported_formats
+from dphy_model import check_instance
 
 
 class TXGlobalOperations(Module):
@@ -30,6 +31,9 @@ class TXGlobalOperations(Module):
     four_lanes : bool
         If true, modules will be generated in 4 lanes variant, otherwise it will
         be generated for 2 lanes.
+    cont_clk : bool
+        If true, clock lane is switched to HS mode once after initialization and
+        it is kept there, only data lanes are switched between LP and HS modes.
 
     Attributes
     ----------
@@ -55,9 +59,12 @@ class TXGlobalOperations(Module):
     lp_tx_data_p_o, lp_tx_data_n_o : Signal(LANES)
         LP state on data lanes.
     """
-    def __init__(self, timings, four_lanes=False):
+    def __init__(self, timings, four_lanes=False, cont_clk=False):
         assert four_lanes in [True, False]
+        assert cont_clk in [True, False]
         LANES = 4 if four_lanes else 2
+        # Clock lane is already running in HS mode before data lanes are enabled
+        T_CLKPRE = 0 if cont_clk else timings["T_CLKPREP"]
 
         # Miscellanous signals
         self.dphy_ready_o = Signal()
@@ -98,7 +105,7 @@ class TXGlobalOperations(Module):
         self.submodules.fsm = fsm = FSM(reset_state="TX_STOP")
 
         counter = Signal(14)
-        tinit_counter = Signal(14)
+        tinit_counter = Signal(max(14, bits_for(timings["TINIT_VALUE"] + 1)))
 
         self.sync += [
             If(~self.tinit_done_o,
@@ -111,27 +118,59 @@ class TXGlobalOperations(Module):
             ),
         ]
 
-        fsm.act("TX_STOP",
-            NextValue(self.lp_tx_data_en_o, 1),
-            NextValue(self.d_hs_rdy_o, 0),
+        if not cont_clk:
+            fsm.act("TX_STOP",
+                NextValue(self.lp_tx_data_en_o, 1),
+                NextValue(self.d_hs_rdy_o, 0),
 
-            # Keep Stop State - LP-11
-            NextValue(self.lp_tx_clk_p_o, 1),
-            NextValue(self.lp_tx_clk_n_o, 1),
-            NextValue(self.lp_tx_data_p_o, Replicate(1, LANES)),
-            NextValue(self.lp_tx_data_n_o, Replicate(1, LANES)),
+                # Keep Stop State - LP-11
+                NextValue(self.lp_tx_clk_p_o, 1),
+                NextValue(self.lp_tx_clk_n_o, 1),
+                NextValue(self.lp_tx_data_p_o, Replicate(1, LANES)),
+                NextValue(self.lp_tx_data_n_o, Replicate(1, LANES)),
 
-            # D-PHY is ready in Stop State
-            NextValue(self.dphy_ready_o, 1),
+                # D-PHY is ready in Stop State
+                NextValue(self.dphy_ready_o, 1),
+
+                If(self.d_hs_en_i & self.tinit_done_o,
+                    NextValue(counter, 0),
+                    NextValue(self.dphy_ready_o, 0),
+                    NextValue(self.lp_tx_clk_p_o, 0),
+                    NextValue(self.lp_tx_clk_n_o, 1),
+                    NextState("TX_CLK_ENABLE"),
+                ),
+            )
+        else:
+            fsm.act("TX_STOP",
+                NextValue(self.lp_tx_data_en_o, 1),
+                NextValue(self.d_hs_rdy_o, 0),
+
+                # Keep data lanes in Stop State - LP-11
+                NextValue(self.lp_tx_data_p_o, Replicate(1, LANES)),
+                NextValue(self.lp_tx_data_n_o, Replicate(1, LANES)),
+
+                # D-PHY is ready in Stop State
+                NextValue(self.dphy_ready_o, 1),
+
+                # Clock lane is switched to HS mode only once after initialization
+                If(~self.hs_clk_en_o & self.tinit_done_o,
+                    NextValue(counter, 0),
+                    NextValue(self.dphy_ready_o, 0),
+                    NextValue(self.lp_tx_clk_p_o, 0),
+                    NextValue(self.lp_tx_clk_n_o, 1),
+                    NextState("TX_CLK_ENABLE"),
+                ).Elif(self.d_hs_en_i & self.tinit_done_o,
+                    NextValue(counter, 0),
+                    NextValue(self.dphy_ready_o, 0),
+                    NextState("TX_DATA_ENABLE"),
+                ),
+            )
+        if cont_clk:
+            # Wait in Stop State for a data transfer request
+            clk_enabled = [NextValue(self.hs_clk_en_o, 1), NextState("TX_STOP")]
+        else:
+            clk_enabled = NextState("TX_DATA_ENABLE")
 
-            If(self.d_hs_en_i & self.tinit_done_o,
-                NextValue(counter, 0),
-                NextValue(self.dphy_ready_o, 0),
-                NextValue(self.lp_tx_clk_p_o, 0),
-                NextValue(self.lp_tx_clk_n_o, 1),
-                NextState("TX_CLK_ENABLE"),
-            ),
-        )
         fsm.act("TX_CLK_ENABLE",
             NextValue(counter, counter + 1),
             NextValue(self.dphy_ready_o, 0),
@@ -154,7 +193,7 @@ class TXGlobalOperations(Module):
                 NextValue(self.lp_tx_clk_n_o, 1),
             ).Else(
                 NextValue(counter, 0),
-                NextState("TX_DATA_ENABLE"),
+                clk_enabled,
             ),
         )
         fsm.act("TX_DATA_ENABLE",
@@ -162,19 +201,19 @@ class TXGlobalOperations(Module):
             NextValue(self.dphy_ready_o, 0),
             NextValue(self.hs_clk_en_o, 1),
 
-            If(counter <= timings["T_CLKPREP"],
+            If(counter <= T_CLKPRE,
                 # TX Stop
                 NextValue(self.lp_tx_data_p_o, Replicate(1, LANES)),
                 NextValue(self.lp_tx_data_n_o, Replicate(1, LANES)),
-            ).Elif(counter <= (timings["T_CLKPREP"] + timings["T_LPX"]),
+            ).Elif(counter <= (T_CLKPRE + timings["T_LPX"]),
                 # HS Request
                 NextValue(self.lp_tx_data_p_o, Replicate(0, LANES)),
                 NextValue(self.lp_tx_data_n_o, Replicate(1, LANES)),
-            ).Elif(counter <= (timings["T_CLKPREP"] + timings["T_LPX"] + timings["T_DATPREP"]),
+            ).Elif(counter <= (T_CLKPRE + timings["T_LPX"] + timings["T_DATPREP"]),
                 # HS Prepare
                 NextValue(self.lp_tx_data_p_o, Replicate(0, LANES)),
                 NextValue(self.lp_tx_data_n_o, Replicate(0, LANES)),
-            ).Elif(counter <= (timings["T_CLKPREP"] + timings["T_LPX"] + timings["T_DATPREP"] + timings["T_DAT_HSZERO"]),
+            ).Elif(counter <= (T_CLKPRE + timings["T_LPX"] + timings["T_DATPREP"] + timings["T_DAT_HSZERO"]),
                 # HS Go
                 NextValue(self.lp_tx_data_en_o, 0),
                 NextValue(self.hs_tx_en_o, 1),
@@ -191,30 +230,68 @@ class TXGlobalOperations(Module):
                 ),
             ),
         )
-        fsm.act("TX_HS_DISABLE",
-            NextValue(counter, counter + 1),
-            NextValue(self.dphy_ready_o, 0),
-            NextValue(self.hs_tx_en_o, 0),
-            NextValue(self.d_hs_rdy_o, 0),
-            NextValue(self.lp_tx_data_p_o, Replicate(1, LANES)),
-            NextValue(self.lp_tx_data_n_o, Replicate(1, LANES)),
+        if not cont_clk:
+            fsm.act("TX_HS_DISABLE",
+                NextValue(counter, counter + 1),
+                NextValue(self.dphy_ready_o, 0),
+                NextValue(self.hs_tx_en_o, 0),
+                NextValue(self.d_hs_rdy_o, 0),
+                NextValue(self.lp_tx_data_p_o, Replicate(1, LANES)),
+                NextValue(self.lp_tx_data_n_o, Replicate(1, LANES)),
 
-            If(counter <= (timings["T_CLKPOST"]),
-                NextValue(self.hs_clk_en_o, 1),
-                NextValue(self.lp_tx_data_en_o, 1),
-            ).Elif(counter <= (timings["T_CLKPOST"] + timings["T_CLKTRAIL"]),
-                NextValue(self.hs_clk_en_o, 0),
-                NextValue(self.lp_tx_data_en_o, 1),
-                NextValue(self.lp_tx_clk_p_o, 0),
-                NextValue(self.lp_tx_clk_n_o, 1),
-            ).Else(
-                NextValue(self.hs_clk_en_o, 0),
+                If(counter <= (timings["T_CLKPOST"]),
+                    NextValue(self.hs_clk_en_o, 1),
+                    NextValue(self.lp_tx_data_en_o, 1),
+                ).Elif(counter <= (timings["T_CLKPOST"] + timings["T_CLKTRAIL"]),
+                    NextValue(self.hs_clk_en_o, 0),
+                    NextValue(self.lp_tx_data_en_o, 1),
+                    NextValue(self.lp_tx_clk_p_o, 0),
+                    NextValue(self.lp_tx_clk_n_o, 1),
+                ).Else(
+                    NextValue(self.hs_clk_en_o, 0),
+                    NextValue(self.lp_tx_data_en_o, 1),
+                    NextValue(self.lp_tx_clk_p_o, 1),
+                    NextValue(self.lp_tx_clk_n_o, 1),
+                    NextState("TX_STOP"),
+                ),
+            )
+        else:
+            # Clock lane stays in HS mode, data lanes are kept in Stop State
+            # for T_HSEXIT before next transfer can be requested
+            fsm.act("TX_HS_DISABLE",
+                NextValue(counter, counter + 1),
+                NextValue(self.dphy_ready_o, 0),
+                NextValue(self.hs_tx_en_o, 0),
+                NextValue(self.d_hs_rdy_o, 0),
                 NextValue(self.lp_tx_data_en_o, 1),
-                NextValue(self.lp_tx_clk_p_o, 1),
-                NextValue(self.lp_tx_clk_n_o, 1),
-                NextState("TX_STOP"),
-            ),
-        )
+                NextValue(self.lp_tx_data_p_o, Replicate(1, LANES)),
+                NextValue(self.lp_tx_data_n_o, Replicate(1, LANES)),
+
+                If(counter > timings["T_HSEXIT"],
+                    NextState("TX_STOP"),
+                ),
+            )
+
+
+def hs_entry_latency(timings, cont_clk=False):
+    """Return number of byte clock cycles from HS request in Stop State to the first
+    HS data word."""
+    if cont_clk:
+        return timings["T_LPX"] + timings["T_DATPREP"] + timings["T_DAT_HSZERO"] + 2
+    return (timings["T_LPX"] + timings["T_CLKPREP"] + timings["T_CLK_HSZERO"] + 2) + \
+        (timings["T_CLKPREP"] + timings["T_LPX"] + timings["T_DATPREP"] +
+         timings["T_DAT_HSZERO"] + 2)
+
+
+def hs_round_trip(timings, cont_clk=False):
+    """Return number of byte clock cycles needed to leave HS mode and enter it again,
+    counted from the start of the HS Trail to the first HS data word."""
+    if cont_clk:
+        hs_exit = timings["T_HSEXIT"] + 2
+    else:
+        hs_exit = timings["T_CLKPOST"] + timings["T_CLKTRAIL"] + 2
+    # HS Trail and a single cycle spent in Stop State
+    return timings["T_DATTRAIL"] + hs_exit + 1 + hs_entry_latency(timings, cont_clk)
 
 
 class TXDPHY(Module):
@@ -229,6 +306,11 @@ class TXDPHY(Module):
         be generated for 2 lanes.
     sim : bool
         Omit generating D-PHY module if simulation mode is True.
+    gear : int
+        HS data width of every lane in a single byte clock cycle, either 8 or 16.
+        Timings have to be expressed in byte clock cycles for a selected gear.
+    cont_clk : bool
+        Keep clock lane in HS mode continuously, see TXGlobalOperations.
 
     Attributes
     ----------
@@ -236,8 +318,9 @@ class TXDPHY(Module):
         Child module used to control D-PHY states, switched between LP and HS modes.
         See class specific documentation for more information.
 
-    byte_or_pkt_data_i : Signal(16)
-        Byte data containing either converted pixel or packet data.
+    byte_or_pkt_data_i : Signal(LANES * gear)
+        Byte data containing either converted pixel or packet data. In gear 16
+        mode lane N transmits byte N first and byte N + LANES afterwards.
     byte_or_pkt_data_en_i : Signal(1)
         Validation signal for byte data.
     d_hs_en_i : Signal(1)
@@ -252,22 +335,23 @@ class TXDPHY(Module):
         Internal D-PHY PLL lock status.
 
     """
-    def __init__(self, timings, four_lanes=False, sim=False):
+    def __init__(self, timings, four_lanes=False, sim=False, gear=8, cont_clk=False):
         assert four_lanes in [True, False]
         assert sim in [True, False]
+        assert gear in [8, 16]
         LANES = 4 if four_lanes else 2
         LANES_STR = "FOUR_LANES" if four_lanes else "TWO_LANES"
 
         self.clock_domains.cd_byte = ClockDomain("byte")
 
         self.submodules.txgo = txgo = ClockDomainsRenamer("byte")(
-            TXGlobalOperations(timings, four_lanes))
+            TXGlobalOperations(timings, four_lanes, cont_clk))
 
         # PLL IOs
         self.pll_lock_i = Signal()
 
         # Data flow control
-        self.byte_or_pkt_data_i = Signal(LANES * 8)
+        self.byte_or_pkt_data_i = Signal(LANES * gear)
         self.byte_or_pkt_data_en_i = Signal()
         self.d_hs_en_i = Signal()
 
@@ -318,6 +402,14 @@ class TXDPHY(Module):
             self.hs_tx_en_i.eq(txgo.hs_tx_en_o),
         ]
 
+        # HS data of each lane, padded to the D-PHY 32-bit data ports
+        lane_data = []
+        for lane in range(LANES):
+            data = self.byte_or_pkt_data_i[lane * 8:(lane + 1) * 8]
+            if gear == 16:
+                data = Cat(data, self.byte_or_pkt_data_i[(lane + LANES) * 8:(lane + LANES + 1) * 8])
+            lane_data.append(Cat(data, Replicate(0, 32 - gear)))
+
         if not sim:
             LANES_STR = "FOUR_LANES" if four_lanes else "TWO_LANES"
             dphy_params = {
@@ -327,7 +419,7 @@ class TXDPHY(Module):
                 "p_CM": timings["CM"],
                 "p_CN": timings["CN"],
                 "p_CO": timings["CO"],
-                "p_CONT_CLK_MODE": "DISABLED",
+                "p_CONT_CLK_MODE": "ENABLED" if cont_clk else "DISABLED",
                 "p_DESKEW_EN": "DISABLED",
                 "p_DSI_CSI": "CSI2_APP",
                 "p_EN_CIL": "CIL_BYPASSED",
@@ -336,7 +428,7 @@ class TXDPHY(Module):
                 "p_LOCK_BYP": "GATE_TXBYTECLKHS",
                 "p_MASTER_SLAVE": "MASTER",
                 "p_PLLCLKBYPASS": "REGISTERED",
-                "p_TXDATAWIDTHHS": "0b00", # Gear: 8 - "0b00", 16 - "0b01"
+                "p_TXDATAWIDTHHS": "0b00" if gear == 8 else "0b01", # Gear: 8 - "0b00", 16 - "0b01"
                 # Clock and reset
                 "i_BITCKEXT": 1, #(((DPHY_PLL == "REGISTERED") ? 1'd1 : pll_clkop_i)), # Maybe Bit clock external.
                 "i_CLKREF": ClockSignal(), # Reference clock to PLL.
@@ -349,8 +441,8 @@ class TXDPHY(Module):
                 "i_UED0THEN": self.hs_tx_en_i,  # Lane 0 HS_TX enable.
                 "i_U1ENTHEN": self.hs_tx_en_i,  # Lane 1 HS_TX enable.
                 # HS_TX ports
-                "i_UTXDHS": Cat(self.byte_or_pkt_data_i[:8], Replicate(0, 24)),  # Lane 0 HS_TX data.
-                "i_U1TXDHS": Cat(self.byte_or_pkt_data_i[8:16], Replicate(0, 24)),  # Lane 1 HS_TX data.
+                "i_UTXDHS": lane_data[0],  # Lane 0 HS_TX data.
+                "i_U1TXDHS": lane_data[1],  # Lane 1 HS_TX data.
                 # HS_TX word valid ports
                 "i_UTXWVDHS": 1,  # Lane 0 HS_TX word valid.
                 "i_U1TXWVHS": 1,  # Lane 1 HS_TX word valid.
@@ -408,43 +500,43 @@ class TXDPHY(Module):
                 "o_DP0": self.data_p_io[0],  # Positive part of differential data lane 0.
                 "o_DP1": self.data_p_io[1],  # Positive part of differential data lane 1.
                 # Unused input ports(ports which used in CIL mode)
-                "o_URXCKINE": 1,  # N/A
-                "o_UTXCKE": 1,  # N/A
-                "o_UTRNREQ": 1,  # N/A
-                "o_UFRXMODE": 1,  # N/A
-                "o_UTDIS": 1,  # N/A
-                "o_UTXTGE0": 1,  # N/A
-                "o_UTXTGE1": 1,  # N/A
-                "o_UTXTGE2": 1,  # N/A
-                "o_UTXTGE3": 1,  # N/A
-                "o_UTXUPSEX": 1,  # N/A
-                "o_UTXVDE": 1,  # N/A
-                "o_U1FRXMD": 1,  # N/A
-                "o_U1TDIS": 1,  # N/A
-                "o_U1TREQ": 1,  # N/A
-                "o_U1TXTGE0": 1,  # N/A
-                "o_U1TXTGE1": 1,  # N/A
-                "o_U1TXTGE2": 1,  # N/A
-                "o_U1TXTGE3": 1,  # N/A
-                "o_U1TXUPSE": 1,  # N/A
-                "o_U1TXUPSX": 1,  # N/A
-                "o_U1TXVDE": 1,  # N/A
-                "o_U2FRXMD": 1,  # N/A
-                "o_U2TDIS": 1,  # N/A
-                "o_U2TREQ": 1,  # N/A
-                "o_U2TPDTE": 1,  # N/A
-                "o_U2TXTGE0": 1,  # N/A
-                "o_U2TXTGE1": 1,  # N/A
-                "o_U2TXTGE2": 1,  # N/A
-                "o_U2TXTGE3": 1,  # N/A
-                "o_U2TXUPSE": 1,  # N/A
-                "o_U2TXUPSX": 1,  # N/A
-                "o_U2TXVDE": 1,  # N/A
-                "o_U3FRXMD": 1,  # N/A
-                "o_U3TXTGE0": 1,  # N/A
-                "o_U3TXTGE1": 1,  # N/A
-                "o_U3TXTGE2": 1,  # N/A
-                "o_U3TXTGE3": 1,  # N/A
+                "i_URXCKINE": 1,  # N/A
+                "i_UTXCKE": 1,  # N/A
+                "i_UTRNREQ": 1,  # N/A
+                "i_UFRXMODE": 1,  # N/A
+                "i_UTDIS": 1,  # N/A
+                "i_UTXTGE0": 1,  # N/A
+                "i_UTXTGE1": 1,  # N/A
+                "i_UTXTGE2": 1,  # N/A
+                "i_UTXTGE3": 1,  # N/A
+                "i_UTXUPSEX": 1,  # N/A
+                "i_UTXVDE": 1,  # N/A
+                "i_U1FRXMD": 1,  # N/A
+                "i_U1TDIS": 1,  # N/A
+                "i_U1TREQ": 1,  # N/A
+                "i_U1TXTGE0": 1,  # N/A
+                "i_U1TXTGE1": 1,  # N/A
+                "i_U1TXTGE2": 1,  # N/A
+                "i_U1TXTGE3": 1,  # N/A
+                "i_U1TXUPSE": 1,  # N/A
+                "i_U1TXUPSX": 1,  # N/A
+                "i_U1TXVDE": 1,  # N/A
+                "i_U2FRXMD": 1,  # N/A
+                "i_U2TDIS": 1,  # N/A
+                "i_U2TREQ": 1,  # N/A
+                "i_U2TPDTE": 1,  # N/A
+                "i_U2TXTGE0": 1,  # N/A
+                "i_U2TXTGE1": 1,  # N/A
+                "i_U2TXTGE2": 1,  # N/A
+                "i_U2TXTGE3": 1,  # N/A
+                "i_U2TXUPSE": 1,  # N/A
+                "i_U2TXUPSX": 1,  # N/A
+                "i_U2TXVDE": 1,  # N/A
+                "i_U3FRXMD": 1,  # N/A
+                "i_U3TXTGE0": 1,  # N/A
+                "i_U3TXTGE1": 1,  # N/A
+                "i_U3TXTGE2": 1,  # N/A
+                "i_U3TXTGE3": 1,  # N/A
             }
 
             if four_lanes:
@@ -453,8 +545,8 @@ class TXDPHY(Module):
                     "i_U2END2": self.hs_tx_en_i,  # lane 2 HS_TX enable.
                     "i_U3END3": self.hs_tx_en_i,  # lane 3 HS_TX enable.
                     # HS_TX ports
-                    "i_U2TXDHS": Cat(self.byte_or_pkt_data_i[16:24], Replicate(0, 24)),  # Lane 2 HS_TX data.
-                    "i_U3TXDHS": Cat(self.byte_or_pkt_data_i[24:32], Replicate(0, 24)),  # Lane 3 HS_TX data.
+                    "i_U2TXDHS": lane_data[2],  # Lane 2 HS_TX data.
+                    "i_U3TXDHS": lane_data[3],  # Lane 3 HS_TX data.
                     # HS_TX word valid ports
                     "i_U2TXWVHS": 1,  # Lane 2 HS_TX word valid.
                     "i_U3TXWVHS": 1,  # Lane 3 HS_TX word valid.
@@ -487,9 +579,29 @@ class TXDPHY(Module):
                     "o_DP3": self.data_p_io[3],  # Positive part of differential data lane 3.
                 }
 
-            self.specials += Instance("DPHY", **dphy_params)
+            dphy = Instance("DPHY", **dphy_params)
+            problems = check_instance(dphy)
+            if problems:
+                raise ValueError("Wrong D-PHY port map: {}".format(", ".join(problems)))
+            self.specials += dphy
 
 if __name__ == "__main__":
-    from common import dphy_timings
-    txdphy = TXDPHY(dphy_timings["sdi_3g-2lanes"], four_lanes=False, sim=True)
-    print(convert(txdphy, txdphy.ios, name="mipi_dphy"))
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate TX D-PHY RTL")
+    parser.add_argument(
+        "--cont-clk", action="store_true", help="Keep clock lane in HS mode continuously"
+    )
+    parser.add_argument(
+        "--video-format", choices=supported_formats, default="1080p_3g",
+        help="Video format of the D-PHY timings"
+    )
+    parser.add_argument(
+        "--timing-margin", type=int, default=0,
+        help="Margin above the minimal D-PHY timings in percent"
+    )
+    args = parser.parse_args()
+
+    timings = get_timings(args.video_format, False, margin=args.timing_margin / 100)
+    txdphy = TXDPHY(timings, four_lanes=False, sim=True, cont_clk=args.cont_clk)
+    module_name = "mipi_dphy_cont_clk" if args.cont_clk else "mipi_dphy"
+    print(convert(txdphy, txdphy.ios, name=module_name))
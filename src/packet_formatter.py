@@ -17,13 +17,51 @@ import argparse
 from migen import *
 from migen.fhdl.verilog import convert
 from migen.fhdl.module import Module
+from crc16 import crc16_reference
 
-__all__ = ["PacketFormatter"]
+__all__ = ["PacketFormatter", "ecc_reference", "null_packet"]
 
 # Maximum number of bytes in a single long packet payload (1920 * 2 = 3840)
 MAX_WIDTH = 3840
 # MIPI CSI-2 Initialization sequence
 HS_INIT_SEQ = 0xb8
+# MIPI CSI-2 Frame synchronization packets data types
+DT_FRAME_START = 0x00
+DT_FRAME_END = 0x01
+# MIPI CSI-2 Null packet data type, its payload is ignored by receivers
+DT_NULL = 0x10
+
+# Packet header bits (data identifier and word count) covered by each ECC bit
+ECC_MASKS = [
+    0xf12cb7,
+    0xf2555b,
+    0x749a6d,
+    0xb8e38e,
+    0xdf03f0,
+    0xeffc00,
+]
+
+
+def ecc_reference(header):
+    """Software model of the packet header ECC, header is a 24-bit value
+    consisting of data identifier and word count."""
+    return sum((bin(header & mask).count("1") & 1) << i for i, mask in enumerate(ECC_MASKS))
+
+
+def null_packet(wc, vc=0):
+    """Bytes of a Null long packet with wc zeroed payload bytes."""
+    header = (wc << 8) | (vc << 6) | DT_NULL
+    crc = crc16_reference([0] * wc)
+    return ([header & 0xff, (header >> 8) & 0xff, header >> 16, ecc_reference(header)] +
+            [0] * wc + [crc & 0xff, crc >> 8])
+
+
+def word_case(sel, target, words):
+    """Case driving target with words[sel], the last word is the default so that
+    the case is full."""
+    cases = {i: target.eq(word) for i, word in enumerate(words[:-1])}
+    cases["default"] = target.eq(words[-1])
+    return Case(sel, cases)
 
 
 class PacketFormatter(Module):
@@ -39,11 +77,32 @@ class PacketFormatter(Module):
     Output data is valid for 3 cycles (HS Init + header) since receiving sp_en_i or
     lp_en_i high pulse and when phdr_xfr_done_o is asserted (footer + HS Trail).
 
+    In gear 16 mode every lane carries 2 bytes per cycle. Bytes are placed on the
+    data bus in transmission order, so the first byte of lane N is at byte N and
+    the second one at byte N + LANES. The HS Zero state is extended by a single
+    byte on 2 lanes, so that the payload stays aligned to the data bus words.
+
+    In burst mode, a long packet can be followed by Null packets instead of EoT,
+    which keeps data lanes in HS mode until the next packet request. Null packets
+    are constant, their lengths are chosen so that the next header ends on a data
+    bus word boundary. Requests received in the meantime are served once the
+    current Null packet is finished.
+
+    With frame synchronization packing, Frame Start short packet can be sent right
+    before a long packet header and Frame End short packet right after its CRC,
+    in the same HS transmission.
+
     Parameters
     ----------
     four_lanes : boolean
         Module operates on either 2 or 4 lanes variant depending on a value of
         this variable.
+    gear : int
+        Number of bits transferred on each lane in a single cycle (8 or 16).
+    burst : boolean
+        Generate logic keeping HS transmission active between packets.
+    pack_sync : boolean
+        Generate logic packing Frame Start and Frame End packets with long packets.
 
     Attributes
     ----------
@@ -57,21 +116,42 @@ class PacketFormatter(Module):
         When this signal is pulsed, packet formatter starts a short packet transfer.
     lp_en_i : Signal(1)
         When this signal is pulsed, packet formatter starts a long packet transfer.
-    byte_data_i : Signal(16)
+    byte_data_i : Signal(LANES * gear)
         Bytes that are included in a long packet.
     crc_i : Signal(16)
         Calculated checsksum value for currently transferred payload.
+    burst_i : Signal(1)
+        Sampled at the end of a long packet payload, if high Null packets are
+        sent until the next packet request or until it goes low (burst mode only).
+    frame_start_i : Signal(1)
+        Sampled along with lp_en_i, if high Frame Start short packet is sent before
+        the long packet header (frame synchronization packing only).
+    frame_end_i : Signal(1)
+        Sampled at the end of a long packet payload, if high Frame End short packet
+        is sent after CRC (frame synchronization packing only).
 
     phdr_xfr_done_o : Signal(1)
         Single pulse signal indicating that packet transfer is finished.
     ld_pyld_o : Signal(1)
         Single pulse signal indicating that long packet request is received.
-    data_o : Signal(16)
+    data_o : Signal(LANES * gear)
         Data for generated header, footer or HS Trail state.
+    burst_o : Signal(1)
+        High while HS transmission is kept active between packets, data_o is
+        valid during this time (burst mode only).
+    frame_end_o : Signal(1)
+        Single pulse signal along with phdr_xfr_done_o, indicating that Frame End
+        short packet has been sent (frame synchronization packing only).
     """
-    def __init__(self, timings, four_lanes=False):
+    def __init__(self, timings, four_lanes=False, gear=8, burst=False, pack_sync=False):
+        assert gear in [8, 16]
+        assert burst in [True, False]
+        assert pack_sync in [True, False]
         LANES = 4 if four_lanes else 2
-        WC_SHIFT = LANES // 2
+        WIDTH = LANES * gear
+        WC_SHIFT = log2_int(WIDTH // 8)
+        # Number of bytes in a single data bus word
+        NB = WIDTH // 8
 
         # Inputs
         self.vc_i = Signal(2)
@@ -79,13 +159,18 @@ class PacketFormatter(Module):
         self.wc_i = Signal(16)
         self.sp_en_i = Signal()
         self.lp_en_i = Signal()
-        self.byte_data_i = Signal(LANES * 8)
+        self.byte_data_i = Signal(WIDTH)
         self.crc_i = Signal(16)
+        self.burst_i = Signal()
+        self.frame_start_i = Signal()
+        self.frame_end_i = Signal()
 
         # Outputs
         self.phdr_xfr_done_o = Signal()
         self.ld_pyld_o = Signal()
-        self.data_o = Signal(LANES * 8)
+        self.data_o = Signal(WIDTH)
+        self.burst_o = Signal()
+        self.frame_end_o = Signal()
 
         # IOs
         self.ios = {
@@ -100,6 +185,10 @@ class PacketFormatter(Module):
             self.data_o,
             self.crc_i,
         }
+        if burst:
+            self.ios.update({self.burst_i, self.burst_o})
+        if pack_sync:
+            self.ios.update({self.frame_start_i, self.frame_end_i, self.frame_end_o})
 
         # Internal signals
         di = Signal(8)
@@ -107,7 +196,8 @@ class PacketFormatter(Module):
         long_xfr = Signal()
         hs_init_seq = Signal(LANES * 8)
         payload_cnt = Signal(max=MAX_WIDTH)
-        last_data = Signal(LANES * 8)
+        last_data = Signal(WIDTH)
+        last_payload = Signal(WIDTH)
 
         # ECC Generator
         self.sync += [
@@ -152,13 +242,6 @@ class PacketFormatter(Module):
             last_data.eq(self.data_o),
         ]
 
-        if LANES == 2:
-            ld_pyld_d = Signal()
-            self.sync += ld_pyld_d.eq(self.lp_en_i)
-            self.sync += self.ld_pyld_o.eq(ld_pyld_d)
-        elif LANES == 4:
-            self.sync += self.ld_pyld_o.eq(self.lp_en_i)
-
         self.comb += [
             di.eq(Cat(self.dt_i, self.vc_i)),
             hs_init_seq.eq(Replicate(HS_INIT_SEQ, LANES)),
@@ -167,21 +250,140 @@ class PacketFormatter(Module):
         # Packet formatter state machine
         self.submodules.fsm = fsm = FSM(reset_state="WAIT_FOR_PACKET_REQ")
 
+        if burst:
+            def to_word(data):
+                return Constant(int.from_bytes(bytes(data), "little"), len(data) * 8)
+
+            # Line is ended with CRC followed by Null packets which align the next
+            # header to the data bus words. Bytes that don't fill the last word
+            # (TAIL) are sent along with the following one.
+            line_end = null_packet(4) + null_packet(2)
+            TAIL = (2 + len(line_end)) % NB
+            line_end_words = [Cat(self.crc_i, to_word(line_end[:NB - 2])) if NB > 2 else self.crc_i]
+            line_end_words += [
+                to_word(line_end[i:i + NB]) for i in range(NB - 2, len(line_end) - TAIL, NB)
+            ]
+
+            # Null packets sent until the next request, shifted by the same offset
+            fill = null_packet(2)
+            fill = fill[TAIL:] + fill[:TAIL]
+            fill_words = [to_word(fill[i:i + NB]) for i in range(0, len(fill), NB)]
+            if TAIL:
+                fill_tail = to_word(fill[:TAIL])
+
+            in_burst = Signal()
+            req_pending = Signal()
+            fill_end = Signal()
+
+            self.sync += [
+                # Null packets end in the previous cycle if EoT is entered directly
+                fill_end.eq(fsm.ongoing("LINE_END") | fsm.ongoing("FILL")),
+                If(fsm.ongoing("LINE_END"),
+                    in_burst.eq(1),
+                ).Elif(self.phdr_xfr_done_o & ~fsm.ongoing("LINE_END"),
+                    in_burst.eq(0),
+                ),
+                # Long packet can be requested before the end of the line is sent
+                If(self.lp_en_i,
+                    long_xfr.eq(1),
+                ).Elif(fsm.before_entering("LINE_END"),
+                    long_xfr.eq(0),
+                ).Elif(fsm.ongoing("LINE_END"),
+                    long_xfr.eq(long_xfr),
+                ),
+                # Requests received while Null packet is sent are served afterwards
+                If(fsm.ongoing("GENERATE_HEADER"),
+                    req_pending.eq(0),
+                ).Elif(self.sp_en_i | self.lp_en_i,
+                    req_pending.eq(1),
+                ),
+            ]
+            self.comb += self.burst_o.eq(in_burst)
+
+        if pack_sync:
+            def sync_packet(dt):
+                # Word count is 0, so ECC depends only on the virtual channel
+                ecc_sync = Signal(8)
+                self.comb += ecc_sync.eq(
+                    Array(Constant(ecc_reference((vc << 6) | dt), 8) for vc in range(4))[self.vc_i])
+                return [Cat(Constant(dt, 6), self.vc_i), Constant(0, 8), Constant(0, 8), ecc_sync]
+
+            frame_start = sync_packet(DT_FRAME_START)
+            frame_end = sync_packet(DT_FRAME_END)
+            # Frame Start is sent along with the header if it fits in a single word
+            fs_flag = Signal()
+
         # Wait for a sp_en_i or lp_en_i pulse to initiate packet formatter, then
         # drive HS Init sequence on data output
+        if gear == 8:
+            start_of_xfr = hs_init_seq
+        elif LANES == 2:
+            # HS Zero is extended by one byte, HS Init is sent on the second one
+            start_of_xfr = Cat(Replicate(0, LANES * 8), hs_init_seq)
+        else:
+            # HS Zero is extended by one cycle, HS Init is sent along with header
+            start_of_xfr = 0
+
+        start_of_frame = []
+        if pack_sync:
+            if NB == 8:
+                # HS Init is sent on the second byte of each lane, so that Frame
+                # Start fits in the header word
+                start_of_xfr = Mux(self.frame_start_i & self.lp_en_i,
+                                   Cat(Replicate(0, LANES * 8), hs_init_seq), start_of_xfr)
+                start_of_frame = NextValue(fs_flag, self.frame_start_i & self.lp_en_i)
+            else:
+                start_of_frame = If(self.frame_start_i & self.lp_en_i,
+                    NextState("FRAME_START"),
+                )
+
         fsm.act("WAIT_FOR_PACKET_REQ",
             NextValue(payload_cnt, 0),
 
             If(self.sp_en_i | self.lp_en_i,
                 # Start of Transmission
-                self.data_o.eq(hs_init_seq),
+                self.data_o.eq(start_of_xfr),
                 NextState("GENERATE_HEADER"),
+                start_of_frame,
             ),
         )
+        if pack_sync and NB < 8:
+            # Send Frame Start short packet right before the long packet header
+            fs_words = [Cat(*frame_start[i:i + NB]) for i in range(0, len(frame_start), NB)]
+            fsm.act("FRAME_START",
+                NextValue(payload_cnt, payload_cnt + 1),
+                word_case(payload_cnt, self.data_o, fs_words),
+                If(payload_cnt == (len(fs_words) - 1),
+                    NextValue(payload_cnt, 0),
+                    NextState("GENERATE_HEADER"),
+                ),
+            )
         # Generate header on 2 clock cycles, then either restart CRC (set to 0xffff)
         # and proceed with long packet or generate End-of-Transmission if it's a short
         # packet
-        if LANES == 2:
+        if gear == 16:
+            header = Cat(self.dt_i, Replicate(0, 2), self.wc_i[:8], self.wc_i[8:], ecc)
+            if LANES == 4:
+                # Header is preceded by HS Init, by the end of the last Null packet
+                # or by Frame Start
+                first = hs_init_seq
+                if burst:
+                    first = Mux(in_burst, fill_tail, first)
+                if pack_sync:
+                    first = Mux(fs_flag, Cat(*frame_start), first)
+                header = Cat(first, header)
+            fsm.act("GENERATE_HEADER",
+                self.data_o.eq(header),
+                self.ld_pyld_o.eq(long_xfr),
+                NextValue(payload_cnt, 0),
+                NextValue(fs_flag, 0) if pack_sync and NB == 8 else [],
+                If(long_xfr,
+                    NextState("WAIT_FOR_XFR_FINISH"),
+                ).Else(
+                    NextState("EoT"),
+                ),
+            )
+        elif LANES == 2:
             fsm.act("GENERATE_HEADER",
                 NextValue(payload_cnt, payload_cnt + 1),
 
@@ -189,6 +391,7 @@ class PacketFormatter(Module):
                     self.data_o.eq(Cat(self.dt_i, Replicate(0, 2), self.wc_i[:8])),
                 ).Elif(payload_cnt == 1,
                     self.data_o.eq(Cat(self.wc_i[8:], ecc)),
+                    self.ld_pyld_o.eq(long_xfr),
                     NextValue(payload_cnt, 0),
                     If(long_xfr,
                         NextState("WAIT_FOR_XFR_FINISH"),
@@ -200,6 +403,7 @@ class PacketFormatter(Module):
         elif LANES == 4:
             fsm.act("GENERATE_HEADER",
                 self.data_o.eq(Cat(self.dt_i, Replicate(0, 2), self.wc_i[:8], self.wc_i[8:], ecc)),
+                self.ld_pyld_o.eq(long_xfr),
                 NextValue(payload_cnt, 0),
                 If(long_xfr,
                     NextState("WAIT_FOR_XFR_FINISH"),
@@ -209,18 +413,126 @@ class PacketFormatter(Module):
             )
         # Packet payload transfer is out of the scope of packet formatter so just
         # wait until it's finished, then generate End-of-Transmission
+        payload_end = NextState("EoT")
+        if burst:
+            payload_end = If(self.burst_i,
+                NextState("LINE_END"),
+            ).Else(
+                payload_end,
+            )
+        if pack_sync:
+            payload_end = If(self.frame_end_i,
+                NextState("FRAME_END"),
+            ).Else(
+                payload_end,
+            )
         fsm.act("WAIT_FOR_XFR_FINISH",
             NextValue(payload_cnt, payload_cnt + 1),
+            # Last payload word is needed for HS Trail on lanes not used by CRC
+            NextValue(last_payload, self.byte_data_i) if gear == 16 else [],
 
             If(payload_cnt == ((self.wc_i >> WC_SHIFT) - 1),
                 NextValue(payload_cnt, 0),
-                NextState("EoT"),
+                payload_end,
             ),
         )
+        if pack_sync:
+            # Send CRC followed by Frame End short packet, then HS Trail on each
+            # lane, inverting the last byte sent on it
+            fe_data = [self.crc_i[:8], self.crc_i[8:]] + frame_end
+            fe_bytes = fe_data[:]
+            for k in range(len(fe_data), -(-len(fe_data) // NB) * NB + NB):
+                last = max(j for j in range(len(fe_data)) if j % LANES == k % LANES)
+                fe_bytes.append(Replicate(~fe_data[last][-1], 8))
+            fe_words = [Cat(*fe_bytes[i:i + NB]) for i in range(0, len(fe_bytes), NB)]
+            fsm.act("FRAME_END",
+                NextValue(payload_cnt, payload_cnt + 1),
+                word_case(payload_cnt, self.data_o, fe_words),
+                If(payload_cnt == (len(fe_words) - 2 + timings["T_DATTRAIL"]),
+                    self.phdr_xfr_done_o.eq(1),
+                    self.frame_end_o.eq(1),
+                    NextState("WAIT_FOR_PACKET_REQ"),
+                ),
+            )
+        if burst:
+            # Send CRC followed by Null packets aligning the next header
+            # Next packet is chained after the last Null packet, otherwise the burst
+            # is either continued or finished
+            burst_next = If(self.sp_en_i | self.lp_en_i | req_pending,
+                NextState("GENERATE_HEADER"),
+            ).Elif(~self.burst_i,
+                NextState("EoT"),
+            )
+            fsm.act("LINE_END",
+                NextValue(payload_cnt, payload_cnt + 1),
+                word_case(payload_cnt, self.data_o, line_end_words),
+                If(payload_cnt == (len(line_end_words) - 1),
+                    NextValue(payload_cnt, 0),
+                    self.phdr_xfr_done_o.eq(1),
+                    NextState("FILL"),
+                    burst_next,
+                ),
+            )
+            # Keep sending Null packets until the next request or burst end
+            fsm.act("FILL",
+                NextValue(payload_cnt, payload_cnt + 1),
+                word_case(payload_cnt, self.data_o, fill_words),
+                If(payload_cnt == (len(fill_words) - 1),
+                    NextValue(payload_cnt, 0),
+                    burst_next,
+                ),
+            )
         # Send CRC to data output and generate the End-of-Transmission sequence
         # which consists of inverted last data MSB for time specified for HS Trail
         # EoT is dependent on number of lanes for long packets
-        if LANES == 2:
+        if gear == 16:
+            def trail(byte):
+                return Replicate(~byte[-1], 8)
+
+            # Bytes sent on the second half of the cycle are the last ones on each lane
+            last_bytes = [last_data[i:i + 8] for i in range(WIDTH // 2, WIDTH, 8)]
+            lane_trail = [trail(last_payload[i:i + 8]) for i in range(WIDTH // 2, WIDTH, 8)]
+
+            # CRC is sent on lanes 0 and 1, remaining lanes start HS Trail
+            crc_word = []
+            for i in range(LANES * 2):
+                if i < 2:
+                    crc_word.append(self.crc_i[i * 8:(i + 1) * 8])
+                    lane_trail[i] = trail(self.crc_i[i * 8:(i + 1) * 8])
+                else:
+                    crc_word.append(lane_trail[i % LANES])
+
+            short_trail = Replicate(Cat(*[trail(b) for b in last_bytes]), 2)
+            if burst and TAIL:
+                # Null packets end in the middle of a word, HS Trail starts right after
+                tail_bytes = [fill_tail[i:i + 8] for i in range(0, TAIL * 8, 8)]
+                short_trail = Mux(fill_end, Cat(fill_tail, *[trail(b) for b in tail_bytes]), short_trail)
+
+            fsm.act("EoT",
+                NextValue(payload_cnt, payload_cnt + 1),
+                If(~long_xfr,
+                    If(payload_cnt == 0,
+                        self.data_o.eq(short_trail),
+                    ).Elif(payload_cnt != (timings["T_DATTRAIL"] - 1),
+                        self.data_o.eq(Replicate(Cat(*last_bytes), 2)),
+                    ).Else(
+                        self.data_o.eq(Replicate(Cat(*last_bytes), 2)),
+                        self.phdr_xfr_done_o.eq(1),
+                        NextState("WAIT_FOR_PACKET_REQ"),
+                    ),
+                ).Else(
+                    If(payload_cnt == 0,
+                        self.data_o.eq(Cat(*crc_word)),
+                    ).Elif(payload_cnt != timings["T_DATTRAIL"],
+                        self.data_o.eq(Replicate(Cat(*last_bytes), 2)),
+                    ).Else(
+                        self.data_o.eq(Replicate(Cat(*last_bytes), 2)),
+                        self.phdr_xfr_done_o.eq(1),
+                        NextState("WAIT_FOR_PACKET_REQ"),
+                    ),
+                ),
+            )
+        elif LANES == 2:
             fsm.act("EoT",
                 NextValue(payload_cnt, payload_cnt + 1),
                 If(~long_xfr,
@@ -283,14 +595,41 @@ if __name__ == "__main__":
     parser.add_argument(
         "--lanes", type=int, default=2, help='Number of lanes ("2", or "4")'
     )
+    parser.add_argument(
+        "--gear", type=int, default=8, help='D-PHY HS data width per lane ("8", or "16")'
+    )
+    parser.add_argument(
+        "--burst", action="store_true", help="Keep HS mode between lines with Null packets"
+    )
+    parser.add_argument(
+        "--pack-sync", action="store_true", help="Send Frame Start/End along with long packets"
+    )
+    parser.add_argument(
+        "--video-format", default="1080p_3g", help="Video format of the D-PHY timings"
+    )
+    parser.add_argument(
+        "--timing-margin", type=int, default=0,
+        help="Margin above the minimal D-PHY timings in percent"
+    )
     args = parser.parse_args()
 
     if args.lanes not in (2, 4):
         sys.exit("Unsupported number of lanes")
+    if args.gear not in (8, 16):
+        sys.exit("Unsupported gear")
 
     four_lanes = True if args.lanes == 4 else False
 
-    from common import dphy_timings
-    packet_formatter = PacketFormatter(dphy_timings["sdi_3g-2lanes"], four_lanes)
+    from common import get_timings, supported_formats
+    if args.video_format not in supported_formats:
+        sys.exit("Unsupported video format")
+    timings = get_timings(args.video_format, four_lanes, args.gear, args.timing_margin / 100)
+    packet_formatter = PacketFormatter(timings, four_lanes, args.gear, args.burst, args.pack_sync)
     module_name = "packet_formatter_" + str(args.lanes) + "lanes"
+    if args.gear == 16:
+        module_name = "packet_formatter_gear16_" + str(args.lanes) + "lanes"
+    if args.burst:
+        module_name = module_name.replace("packet_formatter", "packet_formatter_burst")
+    if args.pack_sync:
+        module_name = module_name.replace("packet_formatter", "packet_formatter_pack_sync")
     print(convert(packet_formatter, packet_formatter.ios, name=module_name))
@@ -0,0 +1,117 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from migen import *
+from migen.fhdl.verilog import convert
+from migen.fhdl.module import Module
+from uart_bridge import UARTBridge, REG_BYTES
+
+__all__ = ["PerfCounters", "PERF_COUNTERS"]
+
+# Register map, address is the index in the list. Counters of "count" kind are
+# incremented on every cycle their event is high, "max" ones hold the highest
+# value their event has reached and "value" ones follow their event.
+PERF_COUNTERS = [
+    ("frames_sent", "count"),
+    ("lines_sent", "count"),
+    ("frames_rejected", "count"),
+    ("fifo_high_water", "max"),
+    ("fifo_overflows", "count"),
+    ("hs_bursts", "count"),
+    ("tx_stop_cycles", "count"),
+    ("tx_clk_enable_cycles", "count"),
+    ("tx_data_enable_cycles", "count"),
+    ("tx_hs_disable_cycles", "count"),
+    ("lines_dropped", "count"),
+    ("frames_dropped", "count"),
+    ("lines_padded", "count"),
+    ("boot_phase", "value"),
+    ("pll_lock_losses", "count"),
+    ("active_width", "value"),
+    ("active_height", "value"),
+]
+
+
+class PerfCounters(Module):
+    """Performance counters of the CSI-2 transmitter.
+
+    Counters wrap around, so rates are calculated from differences between
+    subsequent reads.
+
+    Parameters
+    ----------
+    events : dict
+        Expression for each counter name in PERF_COUNTERS.
+    width : int
+        Width of a single counter.
+
+    Attributes
+    ----------
+    adr_i : Signal(7)
+        Index of the counter in PERF_COUNTERS.
+    dat_o : Signal(width)
+        Value of the addressed counter, registered.
+    clear_i : Signal(1)
+        Set all counters to 0.
+    """
+    def __init__(self, events, width=8 * REG_BYTES):
+        assert set(events) == set(name for name, _ in PERF_COUNTERS)
+
+        self.adr_i = Signal(7)
+        self.dat_o = Signal(width)
+        self.clear_i = Signal()
+
+        cases = {}
+        for adr, (name, kind) in enumerate(PERF_COUNTERS):
+            counter = Signal(width, name=name)
+            event = events[name]
+            if kind == "count":
+                update = If(event, counter.eq(counter + 1))
+            elif kind == "max":
+                update = If(event > counter, counter.eq(event))
+            else:
+                update = counter.eq(event)
+            self.sync += If(self.clear_i,
+                counter.eq(0),
+            ).Else(
+                update,
+            )
+            cases[adr] = self.dat_o.eq(counter)
+        cases["default"] = self.dat_o.eq(0)
+        self.sync += Case(self.adr_i, cases)
+
+
+if __name__ == "__main__":
+    # Counters read over the bridge in a single clock domain, baud rate is raised
+    # to keep the simulation short
+    CLK_FREQ = 74250000
+    events = {name: Signal(1 if kind == "count" else 16, name=name + "_i")
+              for name, kind in PERF_COUNTERS}
+    module = Module()
+    module.submodules.counters = counters = PerfCounters(events)
+    module.submodules.bridge = bridge = UARTBridge(CLK_FREQ, CLK_FREQ // 16)
+    module.clock_domains.cd_sys = ClockDomain("sys")
+    module.comb += [
+        counters.adr_i.eq(bridge.adr_o),
+        counters.clear_i.eq(bridge.clear_o),
+        bridge.dat_i.eq(counters.dat_o),
+    ]
+    ios = {
+        module.cd_sys.clk,
+        module.cd_sys.rst,
+        bridge.rx_i,
+        bridge.tx_o,
+    }
+    ios.update(events.values())
+    print(convert(module, ios, name="perf_counters"))
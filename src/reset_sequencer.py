@@ -0,0 +1,223 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+from migen import *
+from migen.fhdl.verilog import convert
+from migen.fhdl.module import Module
+from migen.genlib.cdc import MultiReg
+
+__all__ = ["ResetSequencer", "BOOT_PHASES"]
+
+# Phases from configuration to the first frame, phase_o holds the index in the list
+BOOT_PHASES = [
+    "DES_RESET",    # Deserializer held in reset
+    "PLL_LOCK",     # Waiting for the deserializer PLL lock
+    "RESET_DELAY",  # Pixel clock domain held in reset
+    "TINIT",        # D-PHY initialization
+    "FRAME_WAIT",   # Frames rejected until the input is considered stable
+    "STREAMING",    # Frames are sent
+]
+
+# Deserializer reset pulse width in microseconds
+DES_RESET_US = 1
+
+
+class ResetSequencer(Module):
+    """Reset sequence of the deserializer and the pixel clock domain.
+
+    Deserializer is released from reset shortly after configuration. Pixel clock
+    domain reset is released either a second after configuration, or after the
+    deserializer PLL has been locked for the given time. Loss of the PLL lock
+    resets the pixel clock domain again, extended to allow the hardened D-PHY to
+    reset properly. Counters run in the `hfc` clock domain, which is free running,
+    pixel clock domain is `sys`.
+
+    Parameters
+    ----------
+    clk_freq : int
+        Frequency of the `hfc` clock domain in Hz.
+    reset_delay_us : int
+        Time from the PLL lock to the reset release in microseconds. If None,
+        reset is released a second after configuration regardless of the lock.
+    sim : bool
+        Release all resets immediately.
+    fast_relock : bool
+        Reset the pixel clock domain only on the first PLL lock, later lock losses
+        are handled by CMOS2DPHY.
+
+    Attributes
+    ----------
+    pll_lock_i : Signal(1)
+        Deserializer PLL lock.
+    tinit_done_i : Signal(1)
+        D-PHY initialization done, only reported in phase_o.
+    streaming_i : Signal(1)
+        First frame accepted, only reported in phase_o.
+    des_reset_n_o : Signal(1)
+        Deserializer reset, active low.
+    sys_rst_o : Signal(1)
+        Pixel clock domain reset.
+    blink_o : Signal(1)
+        Toggled every second.
+    phase_o : Signal(max=len(BOOT_PHASES))
+        Index of the current phase in BOOT_PHASES (`hfc` domain).
+    """
+    def __init__(self, clk_freq, reset_delay_us=None, sim=False, fast_relock=False):
+        self.pll_lock_i = Signal()
+        self.tinit_done_i = Signal()
+        self.streaming_i = Signal()
+        self.des_reset_n_o = des_reset_n = Signal()
+        self.sys_rst_o = Signal()
+        self.blink_o = Signal()
+        self.phase_o = Signal(max=len(BOOT_PHASES))
+
+        self.ios = {
+            self.pll_lock_i,
+            self.tinit_done_i,
+            self.streaming_i,
+            self.des_reset_n_o,
+            self.sys_rst_o,
+            self.blink_o,
+            self.phase_o,
+        }
+
+        des_pll_lock = self.pll_lock_i
+        des_pll_lock_d = Signal().like(des_pll_lock)
+        # Single synchronizer of the lock for the reset delay and the phase
+        pll_lock_sync = Signal()
+        self.specials += MultiReg(des_pll_lock, pll_lock_sync, "hfc")
+        reset_n = Signal(name="reset_n")
+        reset_n_d = Signal(name="reset_n_d", reset_less=True)
+        sys_reset_n = Signal(name="sys_reset_n", reset_less=True)
+
+        # Reset due to PLL lock is extended to allow hardened D-PHY reset properly
+        pll_lock_ext_n = Signal()
+        pll_lock_cnt = Signal(max=32)
+        self.sync.hfc += [
+            des_pll_lock_d.eq(des_pll_lock),
+            If(~des_pll_lock,
+                pll_lock_cnt.eq(31),
+                pll_lock_ext_n.eq(0),
+            ).Elif(pll_lock_cnt != 0,
+                pll_lock_ext_n.eq(1),
+                pll_lock_cnt.eq(pll_lock_cnt - 1),
+            ).Else(
+                pll_lock_ext_n.eq(0),
+            )
+        ]
+
+        ## Synchronize CDC reset
+        self.sync += [
+            reset_n_d.eq(reset_n),
+            sys_reset_n.eq(reset_n_d)
+        ]
+        pll_lock_rst = (~des_pll_lock & des_pll_lock_d) | pll_lock_ext_n
+        if fast_relock:
+            locked = Signal()
+            self.sync.hfc += If(des_pll_lock & (pll_lock_cnt == 0),
+                locked.eq(1),
+            )
+            pll_lock_rst = pll_lock_rst & ~locked
+        self.comb += self.sys_rst_o.eq(~sys_reset_n | pll_lock_rst)
+
+        if sim:
+            self.sync.hfc += [
+                des_reset_n.eq(1),
+                reset_n.eq(1),
+            ]
+        else:
+            COUNTER_1s = clk_freq
+            COUNTER_DES_RESET = clk_freq * DES_RESET_US // 1000000
+            counter = Signal(max=COUNTER_1s)
+            if reset_delay_us is None:
+                release = If(~reset_n,
+                    reset_n.eq(1),
+                )
+            else:
+                release = []
+
+            self.sync.hfc += [
+                counter.eq(counter + 1),
+                If((counter > COUNTER_DES_RESET) & (~des_reset_n),
+                    des_reset_n.eq(1),
+                ),
+                If((counter > COUNTER_1s),
+                    self.blink_o.eq(~self.blink_o),
+                    counter.eq(0),
+                    release,
+                ),
+            ]
+
+            if reset_delay_us is not None:
+                # Reset is released once the PLL has been locked for the whole delay
+                RESET_DELAY = clk_freq * reset_delay_us // 1000000
+                delay_cnt = Signal(max=RESET_DELAY + 1)
+                self.sync.hfc += [
+                    If(~pll_lock_sync,
+                        delay_cnt.eq(0),
+                    ).Elif(delay_cnt != RESET_DELAY,
+                        delay_cnt.eq(delay_cnt + 1),
+                    ).Elif(des_reset_n,
+                        reset_n.eq(1),
+                    ),
+                ]
+
+        # Later phases are reported by the pixel and byte clock domains
+        tinit_done = Signal()
+        streaming = Signal()
+        self.specials += [
+            MultiReg(self.tinit_done_i, tinit_done, "hfc"),
+            MultiReg(self.streaming_i, streaming, "hfc"),
+        ]
+        phase = lambda name: self.phase_o.eq(BOOT_PHASES.index(name))
+        self.comb += [
+            If(~des_reset_n,
+                phase("DES_RESET"),
+            ).Elif(~pll_lock_sync,
+                phase("PLL_LOCK"),
+            ).Elif(~reset_n,
+                phase("RESET_DELAY"),
+            ).Elif(~tinit_done,
+                phase("TINIT"),
+            ).Elif(~streaming,
+                phase("FRAME_WAIT"),
+            ).Else(
+                phase("STREAMING"),
+            ),
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--clk-freq", type=int, default=10000000, help="Frequency of the hfc clock in Hz"
+    )
+    parser.add_argument(
+        "--reset-delay-us", type=int, default=10, help="Time from the PLL lock to the reset release"
+    )
+    parser.add_argument(
+        "--fast-relock", action="store_true", help="Reset only on the first PLL lock"
+    )
+    args = parser.parse_args()
+
+    module = Module()
+    module.submodules.reset_sequencer = reset_sequencer = ResetSequencer(
+        args.clk_freq, args.reset_delay_us, fast_relock=args.fast_relock
+    )
+    module.clock_domains.cd_sys = ClockDomain("sys", reset_less=True)
+    module.clock_domains.cd_hfc = ClockDomain("hfc", reset_less=True)
+    ios = {module.cd_sys.clk, module.cd_hfc.clk}
+    ios.update(reset_sequencer.ios)
+    print(convert(module, ios, name="reset_sequencer"))
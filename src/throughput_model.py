@@ -0,0 +1,236 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import itertools
+import json
+from multiprocessing import Pool
+
+from common import byte_clk_freq, get_timings, solve_pll, supported_formats_3g
+from line_buffer import line_buffer_depth
+from link_budget import FOOTER_WORDS, HEADER_WORDS, SHORT_PACKET_WORDS
+from mipi_dphy import hs_entry_latency, hs_round_trip
+from pattern_gen import hv_timings
+
+__all__ = ["ThroughputModel", "pll_ppm", "sweep"]
+
+
+def pll_ppm(video_format, four_lanes=False):
+    """Return offset of the D-PHY line rate from the nominal one in ppm, the PLL
+    output is rounded up to a frequency it can produce."""
+    LANES = 4 if four_lanes else 2
+    pix_clk_freq = 148500000 if video_format in supported_formats_3g else 74250000
+    line_rate = pix_clk_freq * 16 / LANES
+    n, m, o = solve_pll(pix_clk_freq, line_rate)
+    return (pix_clk_freq * m / (n * o) / line_rate - 1) * 1e6
+
+
+class ThroughputModel:
+    """Transaction level model of CMOS2DPHY, Packet Formatter and TX Global Operations.
+
+    Instead of clock cycles, the model steps through line and frame events of the
+    input video, as generated by the pattern generator, and computes when TX Global
+    Operations enters and leaves HS mode and when payload words are read from the
+    line buffer. Lengths are expressed in byte clock cycles, with HS entry latency
+    and round trip taken from the RTL timing helpers, so the result matches the
+    RTL up to a few cycles of clock domain crossing. Steady state is modelled,
+    frames rejected after reset aren't.
+
+    A line requests HS mode once hs_watermark words are buffered, or with
+    predict_hs, the entry latency ahead of its start, except for the first line
+    of a frame and the first frame. Payload is read at a word per cycle, but not
+    faster than it is written. With line_burst, HS mode is kept between lines whose
+    horizontal blanking is shorter than the round trip. With pack_sync, Frame
+    Start and Frame End are sent along with the first and the last line.
+
+    Parameters
+    ----------
+    video_format : str
+        Precise video format, a key of pattern_gen.hv_timings.
+    timings : dict
+        D-PHY timing parameters.
+    ppm : float
+        Offset of the byte clock from its nominal frequency, a positive one makes
+        the input slower in byte clock cycles.
+    buffer_depth : int
+        Number of words in the line buffer, defaults to the one of Top.
+
+    Other parameters match CMOS2DPHY.
+    """
+    def __init__(self, video_format, timings, four_lanes=False, gear=8, cont_clk=False,
+                 line_burst=False, pack_sync=False, hs_watermark=0, predict_hs=False,
+                 ppm=0, buffer_depth=None):
+        h = hv_timings[video_format]
+        NB = (4 if four_lanes else 2) * gear // 8
+        if buffer_depth is None:
+            buffer_depth = line_buffer_depth(timings, four_lanes, gear, cont_clk, h["H_ACTIVE"] * 2)
+        scale = 1 + ppm * 1e-6
+
+        self.video_format = video_format
+        self.byte_clk = byte_clk_freq(video_format, four_lanes, gear) * scale
+        self.buffer_depth = buffer_depth
+        self.hs_watermark = hs_watermark
+        self.predict_hs = predict_hs
+        self.line_burst = line_burst
+        self.pack_sync = pack_sync
+        self.trail = timings["T_DATTRAIL"]
+        self.entry = hs_entry_latency(timings, cont_clk)
+        self.round_trip = hs_round_trip(timings, cont_clk)
+        # Stop State is reached this long after the end of a packet
+        self.exit = self.round_trip - self.entry
+
+        # Input timing in byte clock cycles, 16-bit pixels
+        def words(pixels):
+            return pixels * 2 / NB * scale
+        self.payload = -(-h["H_ACTIVE"] * 2 // NB)
+        self.line_period = words(h["H_ACTIVE"] + h["H_SYNC"] + h["H_BACK_PORCH"] +
+                                 h["H_FRONT_PORCH"])
+        self.line_offset = words(h["H_SYNC"] + h["H_BACK_PORCH"])
+        self.write_time = words(h["H_ACTIVE"])
+        self.word_time = self.write_time / self.payload
+        self.hblank = self.line_period - self.write_time
+        self.lines = h["V_ACTIVE"]
+        self.first_line = h["V_SYNC"] + h["V_BACK_PORCH"]
+        self.frame_period = self.line_period * (self.first_line + h["V_ACTIVE"] +
+                                                h["V_FRONT_PORCH"])
+
+    def short_packet(self, t, ready):
+        # Separate HS transmission, returns the next Stop State
+        start = max(t, ready)
+        return start + self.entry + SHORT_PACKET_WORDS + self.exit
+
+    def run(self, frames=2):
+        """Return statistics of the given number of subsequent frames."""
+        ready = 0.0         # Stop State reached
+        packet_end = None   # End of the last packet, if HS mode is kept
+        fifo_peak = 0
+        overflows = 0
+        hs_time = 0
+        latencies = []
+        end = 0.0
+
+        for frame in range(frames):
+            frame_start = frame * self.frame_period
+            fv_start = frame_start + self.first_line * self.line_period
+            fv_end = fv_start + self.lines * self.line_period
+            if not self.pack_sync:
+                ready = self.short_packet(fv_start, ready)
+                hs_time += SHORT_PACKET_WORDS + self.trail
+
+            for line in range(self.lines):
+                write_start = fv_start + line * self.line_period + self.line_offset
+                write_end = write_start + self.write_time
+                request = write_start + self.hs_watermark * self.word_time
+                if self.predict_hs and frame > 0 and line > 0:
+                    request = min(request, write_start - self.entry)
+
+                header = HEADER_WORDS
+                if self.pack_sync and line == 0:
+                    header += SHORT_PACKET_WORDS
+                if packet_end is not None:
+                    # Kept in HS mode, Null packets are sent until the line starts
+                    read_start = max(packet_end, request) + header
+                else:
+                    read_start = max(request, ready) + self.entry + header
+                read_end = max(read_start + self.payload, write_end)
+
+                # Line buffer level is the highest when reading starts or writing ends
+                level = min(self.payload, max(0, read_start - write_start) / self.word_time)
+                if write_end > read_start:
+                    level = max(level, self.payload - min(self.payload, write_end - read_start))
+                fifo_peak = max(fifo_peak, level)
+                overflows += level > self.buffer_depth
+                latencies.append(read_start - write_start)
+
+                footer = FOOTER_WORDS
+                if self.pack_sync and line == self.lines - 1:
+                    footer += SHORT_PACKET_WORDS
+                hs_time += header + self.payload + footer + self.trail
+                last = line == self.lines - 1
+                if self.line_burst and not last and self.hblank < self.round_trip:
+                    packet_end = read_end + footer
+                else:
+                    packet_end = None
+                    ready = read_end + footer + self.exit
+
+            if not self.pack_sync:
+                ready = self.short_packet(fv_end, ready)
+                hs_time += SHORT_PACKET_WORDS + self.trail
+            end = max(ready, (frame + 1) * self.frame_period)
+
+        return {
+            "video_format": self.video_format,
+            "fifo_peak": round(fifo_peak),
+            "buffer_depth": self.buffer_depth,
+            "overflows": overflows,
+            "link_utilization": round(hs_time / end, 4),
+            "latency_mean_us": round(sum(latencies) / len(latencies) * 1e6 / self.byte_clk, 3),
+            "latency_max_us": round(max(latencies) * 1e6 / self.byte_clk, 3),
+            # Transmission keeps up if it ends within the frame period
+            "sustained": overflows == 0 and ready <= frames * self.frame_period,
+        }
+
+
+def _run_point(point):
+    video_format, lanes, gear, margin, ppm, options = point
+    four_lanes = lanes == 4
+    timings = get_timings(video_format, four_lanes, gear, margin / 100)
+    model = ThroughputModel(video_format, timings, four_lanes, gear,
+                            ppm=ppm + pll_ppm(video_format, four_lanes), **options)
+    return dict(model.run(), lanes=lanes, gear=gear, timing_margin=margin, ppm=ppm)
+
+
+def sweep(formats, lanes, gears, margins, ppms, processes=None, **options):
+    """Run the model for every combination of the given parameters in a process pool."""
+    points = [p + (options,) for p in itertools.product(formats, lanes, gears, margins, ppms)]
+    with Pool(processes) as pool:
+        return pool.map(_run_point, points)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep throughput of the converter")
+    parser.add_argument("--formats", nargs="+", default=list(hv_timings), help="Video formats")
+    parser.add_argument("--lanes", nargs="+", type=int, default=[2, 4], help="Numbers of lanes")
+    parser.add_argument("--gears", nargs="+", type=int, default=[8], help="D-PHY gears")
+    parser.add_argument(
+        "--margins", nargs="+", type=int, default=[0], help="D-PHY timing margins in percent"
+    )
+    parser.add_argument(
+        "--ppms", nargs="+", type=float, default=[0], help="Byte clock offsets in ppm"
+    )
+    parser.add_argument("--cont-clk", action="store_true", help="Continuous clock mode")
+    parser.add_argument("--line-burst", action="store_true", help="Keep HS mode between lines")
+    parser.add_argument("--pack-sync", action="store_true", help="Pack Frame Start/End packets")
+    parser.add_argument("--predict-hs", action="store_true", help="Predictive HS request")
+    parser.add_argument("--hs-watermark", type=int, default=0, help="HS request watermark")
+    parser.add_argument("--processes", type=int, help="Number of worker processes")
+    parser.add_argument("--json", help="Write results to the given file")
+    args = parser.parse_args()
+
+    results = sweep(args.formats, args.lanes, args.gears, args.margins, args.ppms,
+                    args.processes, cont_clk=args.cont_clk, line_burst=args.line_burst,
+                    pack_sync=args.pack_sync, predict_hs=args.predict_hs,
+                    hs_watermark=args.hs_watermark)
+
+    print("{:10}{:>6}{:>6}{:>8}{:>8}{:>12}{:>13}{:>13}{:>12}".format(
+        "format", "lanes", "gear", "margin", "ppm", "FIFO peak", "utilization", "latency us",
+        "overflows"))
+    for r in results:
+        print("{:10}{:>6}{:>6}{:>7}%{:>8g}{:>7}/{:<4}{:>12.1f}%{:>13.3f}{:>12}{:>6}".format(
+            r["video_format"], r["lanes"], r["gear"], r["timing_margin"], r["ppm"], r["fifo_peak"],
+            r["buffer_depth"], 100 * r["link_utilization"], r["latency_max_us"], r["overflows"],
+            "ok" if r["sustained"] else "FAIL"))
+    if args.json:
+        with open(args.json, "w") as fd:
+            json.dump(results, fd, indent=4)
@@ -16,15 +16,25 @@
 
 from migen import *
 from migen.fhdl.verilog import convert
+from migen.genlib.cdc import MultiReg, BusSynchronizer, PulseSynchronizer
 from cmos2dphy import CMOS2DPHY
+from format_detect import FormatDetect
+from line_buffer import line_buffer_depth
+from perf_counters import PerfCounters
+from reset_sequencer import ResetSequencer
+from uart_bridge import UARTBridge
 
-from common import get_timings
+from common import get_timings, tinit_cycles
 
 class Top(Module):
     def __init__(
-        self, video_format="1080p_3g", four_lanes=False, sim=False, pattern_gen=False
+        self, *, video_format="1080p_3g", four_lanes=False, sim=False, pattern_gen=False, gear=8,
+        cont_clk=False, line_burst=False, pack_sync=False, hs_watermark=0,
+        predict_hs=False, perf_counters=False, overflow_drop=None, lock_frames=0, lock_lines=16,
+        reset_delay_us=None, tinit_us=None, fast_relock=False, auto_format=False,
+        timing_margin=0, buffer_depth=None, perf_baudrate=115200
     ):
-        if video_format in ["720p_hd", "720p25", "720p30", "720p50", "720p60"]:
+        if video_format in ["720p_hd", "720p25", "720p30", "720p50", "720p60"] and not auto_format:
             WC = 2560
         else:
             WC = 3840
@@ -79,6 +89,10 @@ class Top(Module):
                 **deserializer_ios
             ).values()
         )
+        if perf_counters:
+            perf_uart_rx_i = Signal(name="perf_uart_rx_i")
+            perf_uart_tx_o = Signal(name="perf_uart_tx_o")
+            self.ios.update((perf_uart_rx_i, perf_uart_tx_o))
 
         # Deserializer setup
         self.comb += [
@@ -95,76 +109,133 @@ class Top(Module):
         des_pix_clk = deserializer_ios["des_pix_clk_o"]
         des_reset_n = deserializer_ios["des_reset_n_i"]
         des_pll_lock = deserializer_ios["des_pll_lock_o"]
-        des_pll_lock_d = Signal().like(des_pll_lock)
 
         # Logic - clk & rst
         hfclkout = Signal(name="hfclkout")
-        reset_n = Signal(name="reset_n")
-        reset_n_d = Signal(name="reset_n_d", reset_less=True)
-        sys_reset_n = Signal(name="sys_reset_n", reset_less=True)
-
-        # Reset due to PLL lock is extended to allow hardened D-PHY reset properly
-        pll_lock_ext_n = Signal()
-        pll_lock_cnt = Signal(max=32)
-        self.sync.hfc += [
-            des_pll_lock_d.eq(des_pll_lock),
-            If(~des_pll_lock,
-                pll_lock_cnt.eq(31),
-                pll_lock_ext_n.eq(0),
-            ).Elif(pll_lock_cnt != 0,
-                pll_lock_ext_n.eq(1),
-                pll_lock_cnt.eq(pll_lock_cnt - 1),
-            ).Else(
-                pll_lock_ext_n.eq(0),
-            )
-        ]
-
-        ## Synchronize CDC reset and connect clk & rst signals
-        self.sync += [
-            reset_n_d.eq(reset_n),
-            sys_reset_n.eq(reset_n_d)
-        ]
+        self.submodules.reset_sequencer = reset_sequencer = ResetSequencer(
+            225000000, reset_delay_us, sim, fast_relock
+        )
         self.comb += [
             self.cd_sys.clk.eq(des_pix_clk),
-            self.cd_sys.rst.eq(~sys_reset_n | (~des_pll_lock & des_pll_lock_d) | pll_lock_ext_n),
+            self.cd_sys.rst.eq(reset_sequencer.sys_rst_o),
             self.cd_hfc.clk.eq(hfclkout),
+            reset_sequencer.pll_lock_i.eq(des_pll_lock),
+            des_reset_n.eq(reset_sequencer.des_reset_n_o),
+            cdone_led_o.eq(reset_sequencer.blink_o),
         ]
 
         # Logic - Generate timings and MIPI D-PHY
-        timings = get_timings(video_format, four_lanes)
-        self.submodules.cmos2dphy = CMOS2DPHY(mipi_dphy_ios, timings, four_lanes)
+        timings = get_timings(video_format, four_lanes, gear, timing_margin / 100)
+        if tinit_us is not None:
+            timings = dict(timings, TINIT_VALUE=tinit_cycles(tinit_us, video_format, four_lanes, gear))
+        # Kept for the link budget
+        self.timings = timings
+        if buffer_depth is None:
+            buffer_depth = line_buffer_depth(timings, four_lanes, gear, cont_clk, WC)
+        self.buffer_depth = buffer_depth
+        self.submodules.cmos2dphy = CMOS2DPHY(
+            mipi_dphy_ios, timings, four_lanes, gear=gear, cont_clk=cont_clk,
+            line_burst=line_burst, pack_sync=pack_sync, buffer_depth=self.buffer_depth,
+            hs_watermark=hs_watermark, predict_hs=predict_hs, perf_counters=perf_counters,
+            overflow_drop=overflow_drop, lock_frames=lock_frames, lock_lines=lock_lines,
+            fast_relock=fast_relock
+        )
 
         if pattern_gen:
             from pattern_gen import PatternGenerator
 
             self.submodules.pattern_gen = PatternGenerator(video_format)
-            self.comb += [
-                self.cmos2dphy.pix_data0_i.eq(self.pattern_gen.data_o[:8]),
-                self.cmos2dphy.pix_data1_i.eq(self.pattern_gen.data_o[8:]),
-                self.cmos2dphy.fv_i.eq(self.pattern_gen.fv_o),
-                self.cmos2dphy.lv_i.eq(self.pattern_gen.lv_o),
-            ]
+            pix_data = self.pattern_gen.data_o
+            fv = self.pattern_gen.fv_o
+            lv = self.pattern_gen.lv_o
         else:
             des_pix_data_UV = deserializer_ios["des_data_2to9_o"]
             des_pix_data_Y = deserializer_ios["des_data_12to19_o"]
             vblank = deserializer_ios["des_vblank_o"]
             hblank = deserializer_ios["des_hblank_o"]
+            pix_data = Cat(des_pix_data_UV, des_pix_data_Y)
+            fv = ~vblank
+            lv = ~hblank & ~vblank
 
+        if auto_format:
+            # Frames are passed once their format is measured, word count follows
+            # the measured width. Lines not matching it are cut or padded with
+            # zeros, then dropped until the new format is measured.
+            self.submodules.format_detect = format_detect = FormatDetect()
+            self.submodules.wc_sync = wc_sync = BusSynchronizer(16, "sys", "byte")
+            self.comb += [
+                format_detect.fv_i.eq(fv),
+                format_detect.lv_i.eq(lv),
+                self.cmos2dphy.fv_i.eq(format_detect.fv_o),
+                self.cmos2dphy.lv_i.eq(format_detect.lv_o),
+                wc_sync.i.eq(Cat(0, format_detect.width_o)),
+                self.cmos2dphy.wc_i.eq(wc_sync.o),
+            ]
+            pix_data = Mux(format_detect.pad_o, 0, pix_data)
+        else:
             self.comb += [
-                self.cmos2dphy.pix_data0_i.eq(des_pix_data_UV),
-                self.cmos2dphy.pix_data1_i.eq(des_pix_data_Y),
-                self.cmos2dphy.fv_i.eq(~vblank),
-                self.cmos2dphy.lv_i.eq(~hblank & ~vblank),
+                self.cmos2dphy.fv_i.eq(fv),
+                self.cmos2dphy.lv_i.eq(lv),
+                self.cmos2dphy.wc_i.eq(WC),   # pixels * 2, 16-bit each
             ]
 
         self.comb += [
+            self.cmos2dphy.pix_data0_i.eq(pix_data[:8]),
+            self.cmos2dphy.pix_data1_i.eq(pix_data[8:]),
             self.cmos2dphy.vc_i.eq(0),    # Virtual channel 0
             self.cmos2dphy.dt_i.eq(0x1e), # YUV422 8-bit
-            self.cmos2dphy.wc_i.eq(WC),   # pixels * 2, 16-bit each
             self.cmos2dphy.pll_lock_i.eq(des_pll_lock),
             user_led_o.eq(self.cmos2dphy.tx_dphy.txgo.tinit_done_o),
         ]
 
+        # Boot phases after the reset release are reported by CMOS2DPHY
+        streaming = Signal()
+        self.sync.byte += If(self.cmos2dphy.fsm.before_leaving("WAIT_FV_START"),
+            streaming.eq(1),
+        )
+        self.comb += [
+            reset_sequencer.tinit_done_i.eq(self.cmos2dphy.tinit_done_o),
+            reset_sequencer.streaming_i.eq(streaming),
+        ]
+
+        if perf_counters:
+            self.submodules.perf_phase_sync = phase_sync = BusSynchronizer(
+                len(reset_sequencer.phase_o), "hfc", "byte"
+            )
+            self.comb += phase_sync.i.eq(reset_sequencer.phase_o)
+            perf_events = dict(self.cmos2dphy.perf_events, boot_phase=phase_sync.o,
+                               active_width=0, active_height=0)
+            if auto_format:
+                geometry = Cat(format_detect.width_o, format_detect.height_o)
+                self.submodules.perf_geometry_sync = geometry_sync = BusSynchronizer(
+                    len(geometry), "sys", "byte"
+                )
+                self.comb += geometry_sync.i.eq(geometry)
+                perf_events["active_width"] = geometry_sync.o[:len(format_detect.width_o)]
+                perf_events["active_height"] = geometry_sync.o[len(format_detect.width_o):]
+
+            # Counters run in the byte clock domain, they are read over UART clocked
+            # from the internal oscillator, which keeps running without SDI input
+            self.submodules.perf_counters = perf = ClockDomainsRenamer("byte")(
+                PerfCounters(perf_events)
+            )
+            self.submodules.perf_bridge = bridge = ClockDomainsRenamer("hfc")(
+                UARTBridge(225000000, perf_baudrate)
+            )
+            self.submodules.perf_dat_sync = dat_sync = BusSynchronizer(
+                len(perf.dat_o), "byte", "hfc"
+            )
+            self.submodules.perf_clear_sync = clear_sync = PulseSynchronizer("hfc", "byte")
+            self.specials += MultiReg(bridge.adr_o, perf.adr_i, "byte")
+            self.comb += [
+                bridge.rx_i.eq(perf_uart_rx_i),
+                perf_uart_tx_o.eq(bridge.tx_o),
+                dat_sync.i.eq(perf.dat_o),
+                bridge.dat_i.eq(dat_sync.o),
+                clear_sync.i.eq(bridge.clear_o),
+                perf.clear_i.eq(clear_sync.o),
+            ]
+
         # Internal oscillator set to 225 MHz
         self.specials += Instance(
             "OSCA",
@@ -174,31 +245,52 @@ class Top(Module):
             o_HFCLKOUT = hfclkout,
         )
 
-        if sim:
-            self.sync.hfc += [
-                des_reset_n.eq(1),
-                reset_n.eq(1),
-            ]
-        else:
-            COUNTER_1s = 225000000
-            COUNTER_100us = COUNTER_1s // 1000000
-            counter = Signal(max=COUNTER_1s)
-
-            self.sync.hfc += [
-                counter.eq(counter + 1),
-                If((counter > COUNTER_100us) & (~des_reset_n),
-                    des_reset_n.eq(1),
-                ),
-                If((counter > COUNTER_1s),
-                    cdone_led_o.eq(~cdone_led_o),
-                    counter.eq(0),
-                    If(~reset_n,
-                        reset_n.eq(1),
-                    ),
-                ),
-            ]
-
 
 if __name__ == "__main__":
-    top = Top(video_format="1080p_3g")
-    print(convert(top, top.ios, name="top"))
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate Top RTL")
+    parser.add_argument("--lanes", type=int, choices=[2, 4], default=2, help="Number of lanes")
+    parser.add_argument("--gear", type=int, choices=[8, 16], default=8, help="D-PHY gear")
+    parser.add_argument(
+        "--cont-clk", action="store_true", help="Keep clock lane in HS mode continuously"
+    )
+    parser.add_argument("--tinit-us", type=int, help="D-PHY initialization time")
+    parser.add_argument(
+        "--perf-counters", action="store_true", help="Add performance counters readable over UART"
+    )
+    parser.add_argument(
+        "--perf-baudrate", type=int, default=115200,
+        help="Baud rate of the performance counters UART"
+    )
+    parser.add_argument(
+        "--overflow-drop",
+        choices=["line", "frame"],
+        help="Drop the rest of the line or the frame on FIFO overflow",
+    )
+    parser.add_argument(
+        "--buffer-depth", type=int, help="Number of words in the line buffer"
+    )
+    parser.add_argument(
+        "--fast-relock", action="store_true", help="Keep D-PHY running through PLL lock losses"
+    )
+    parser.add_argument(
+        "--auto-format", action="store_true", help="Measure the input format at run time"
+    )
+    parser.add_argument(
+        "--sim", action="store_true",
+        help="Generate for simulation with the D-PHY model, named after the configuration"
+    )
+    args = parser.parse_args()
+
+    top = Top(video_format="1080p_3g", four_lanes=args.lanes == 4, sim=args.sim, gear=args.gear,
+              cont_clk=args.cont_clk, tinit_us=args.tinit_us, perf_counters=args.perf_counters,
+              perf_baudrate=args.perf_baudrate, overflow_drop=args.overflow_drop,
+              buffer_depth=args.buffer_depth, fast_relock=args.fast_relock,
+              auto_format=args.auto_format)
+    name = "top"
+    if args.sim:
+        name = "top_dphy_model{}{}{}{}_{}lanes".format(
+            "_gear16" if args.gear == 16 else "", "_cont_clk" if args.cont_clk else "",
+            "_perf_counters" if args.perf_counters else "",
+            "_drop_" + args.overflow_drop if args.overflow_drop else "", args.lanes)
+    print(convert(top, top.ios, name=name))
@@ -0,0 +1,172 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from migen import *
+from migen.fhdl.module import Module
+from migen.genlib.cdc import MultiReg
+
+__all__ = ["UARTBridge", "CMD_CLEAR", "REG_BYTES"]
+
+# Command byte with the MSB set clears all registers, otherwise it holds an address
+CMD_CLEAR = 0x80
+# Number of bytes sent in response to a read, least significant byte first
+REG_BYTES = 4
+
+
+class UARTBridge(Module):
+    """Serial bridge reading registers over 8N1 UART.
+
+    Host sends a single command byte. Address in the lower 7 bits selects a register,
+    which is sent back in REG_BYTES bytes, least significant byte first. Command
+    with the MSB set pulses clear_o and doesn't send any response. Register value
+    is sampled one bit period after the command, so it can be synchronized from
+    another clock domain in the meantime.
+
+    Parameters
+    ----------
+    clk_freq : int
+        Clock frequency in Hz.
+    baudrate : int
+        UART baud rate.
+
+    Attributes
+    ----------
+    rx_i : Signal(1)
+        UART receive line, synchronized internally.
+    tx_o : Signal(1)
+        UART transmit line.
+    adr_o : Signal(7)
+        Address of the register to be read.
+    dat_i : Signal(8 * REG_BYTES)
+        Value of the addressed register.
+    clear_o : Signal(1)
+        Pulsed on clear command.
+    """
+    def __init__(self, clk_freq, baudrate=115200):
+        DIVISOR = clk_freq // baudrate
+        assert DIVISOR >= 4
+
+        self.rx_i = Signal(reset=1)
+        self.tx_o = Signal(reset=1)
+        self.adr_o = Signal(7)
+        self.dat_i = Signal(8 * REG_BYTES)
+        self.clear_o = Signal()
+
+        self.ios = {
+            self.rx_i,
+            self.tx_o,
+            self.adr_o,
+            self.dat_i,
+            self.clear_o,
+        }
+
+        # Receiver, bits are sampled in the middle of the bit period
+        rx = Signal(reset=1)
+        self.specials += MultiReg(self.rx_i, rx, reset=1)
+
+        rx_busy = Signal()
+        rx_cnt = Signal(max=DIVISOR)
+        rx_bit = Signal(max=10)
+        rx_data = Signal(8)
+        rx_done = Signal()
+        self.sync += [
+            rx_done.eq(0),
+            If(~rx_busy,
+                If(~rx,
+                    rx_busy.eq(1),
+                    rx_cnt.eq(DIVISOR // 2),
+                    rx_bit.eq(0),
+                ),
+            ).Elif(rx_cnt != 0,
+                rx_cnt.eq(rx_cnt - 1),
+            ).Else(
+                rx_cnt.eq(DIVISOR - 1),
+                rx_bit.eq(rx_bit + 1),
+                If(rx_bit == 0,
+                    # Glitch on the line, not a start bit
+                    If(rx,
+                        rx_busy.eq(0),
+                    ),
+                ).Elif(rx_bit == 9,
+                    rx_busy.eq(0),
+                    rx_done.eq(rx),
+                ).Else(
+                    rx_data.eq(Cat(rx_data[1:], rx)),
+                ),
+            ),
+        ]
+
+        # Transmitter, start bit, data and stop bit are shifted out LSB first
+        tx_start = Signal()
+        tx_data = Signal(8)
+        tx_reg = Signal(10, reset=2**10 - 1)
+        tx_cnt = Signal(max=DIVISOR)
+        tx_bits = Signal(max=11)
+        tx_busy = Signal()
+        self.comb += [
+            self.tx_o.eq(tx_reg[0]),
+            tx_busy.eq(tx_bits != 0),
+        ]
+        self.sync += [
+            If(tx_start,
+                tx_reg.eq(Cat(0, tx_data, 1)),
+                tx_cnt.eq(DIVISOR - 1),
+                tx_bits.eq(10),
+            ).Elif(tx_busy,
+                If(tx_cnt != 0,
+                    tx_cnt.eq(tx_cnt - 1),
+                ).Else(
+                    tx_reg.eq(Cat(tx_reg[1:], 1)),
+                    tx_cnt.eq(DIVISOR - 1),
+                    tx_bits.eq(tx_bits - 1),
+                ),
+            ),
+        ]
+
+        # Command handling
+        wait_cnt = Signal(max=DIVISOR)
+        value = Signal(8 * REG_BYTES)
+        byte_cnt = Signal(max=REG_BYTES)
+
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            If(rx_done,
+                If(rx_data[7],
+                    self.clear_o.eq(1),
+                ).Else(
+                    NextValue(self.adr_o, rx_data[:7]),
+                    NextValue(wait_cnt, DIVISOR - 1),
+                    NextState("WAIT"),
+                ),
+            ),
+        )
+        fsm.act("WAIT",
+            NextValue(wait_cnt, wait_cnt - 1),
+            If(wait_cnt == 0,
+                NextValue(value, self.dat_i),
+                NextValue(byte_cnt, 0),
+                NextState("SEND"),
+            ),
+        )
+        fsm.act("SEND",
+            If(~tx_busy,
+                tx_start.eq(1),
+                tx_data.eq(value[:8]),
+                NextValue(value, value[8:]),
+                NextValue(byte_cnt, byte_cnt + 1),
+                If(byte_cnt == (REG_BYTES - 1),
+                    NextState("IDLE"),
+                ),
+            ),
+        )
@@ -15,6 +15,7 @@
 import os
 import sys
 from cocotb.triggers import RisingEdge, ClockCycles
+from csi2_model import ecc
 
 tests_dir = os.path.dirname(os.path.realpath(__file__))
 src_path = os.path.realpath(os.path.join(tests_dir, "..", "src"))
@@ -211,14 +212,7 @@ async def reset_module(resets, clk):
 
 
 def int2list(val, width=24):
-    print(val)
-    bin_str = ('{0:b}'.format(val))
-    val = [int(x) for x in bin_str]
-
-    for _ in range(width - len(val)):
-        val.insert(0, 0)
-
-    return val
+    return [(val >> i) & 1 for i in reversed(range(width))]
 
 
 def list2int(list_val):
@@ -230,21 +224,4 @@ def list2int(list_val):
 
 
 def gen_ecc(value):
-    ECC_MASK = [
-        [1, 1, 1, 1, 0, 0, 0, 1, 0, 0, 1, 0, 1, 1, 0, 0, 1, 0, 1, 1, 0, 1, 1, 1],
-        [1, 1, 1, 1, 0, 0, 1, 0, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 1, 0, 1, 1],
-        [0, 1, 1, 1, 0, 1, 0, 0, 1, 0, 0, 1, 1, 0, 1, 0, 0, 1, 1, 0, 1, 1, 0, 1],
-        [1, 0, 1, 1, 1, 0, 0, 0, 1, 1, 1, 0, 0, 0, 1, 1, 1, 0, 0, 0, 1, 1, 1, 0],
-        [1, 1, 0, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0],
-        [1, 1, 1, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    ]
-    val = int2list(value)
-    ecc = []
-    for i, mask in enumerate(ECC_MASK):
-        for j, x in enumerate(mask):
-            if len(ecc) == i and x:
-                ecc.append(val[j])
-            elif x:
-                ecc[i] = ecc[i] ^ val[j]
-    ecc = ecc[0] | (ecc[1] << 1) | (ecc[2] << 2) | (ecc[3] << 3) | (ecc[4] << 4) | (ecc[5] << 5)
-    return ecc
+    return int(ecc(value))
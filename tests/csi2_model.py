@@ -0,0 +1,108 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Vectorized golden model of the MIPI CSI-2 packet stream.
+
+Checksums, headers and packets are computed with NumPy for whole frames at once,
+so that scoreboards compare arrays instead of looping over bits.
+Leading axes of the inputs are kept, e.g. a frame given as an array of lines
+results in an array of packets, one per line.
+"""
+
+import numpy as np
+
+HS_INIT_SEQ = 0xb8
+DT_FRAME_START = 0x00
+DT_FRAME_END = 0x01
+DT_NULL = 0x10
+DT_YUV422_8BIT = 0x1e
+
+CRC16_POLY = 0x8408
+CRC16_INIT = 0xffff
+
+# Packet header bits (data identifier and word count) covered by each ECC bit
+ECC_MASKS = [0xf12cb7, 0xf2555b, 0x749a6d, 0xb8e38e, 0xdf03f0, 0xeffc00]
+
+
+def _crc16_table(poly=CRC16_POLY):
+    crc = np.arange(256, dtype=np.uint16)
+    for _ in range(8):
+        crc = np.where(crc & 1, (crc >> 1) ^ poly, crc >> 1).astype(np.uint16)
+    return crc
+
+
+def _ecc_tables():
+    # ECC is linear in the header bits, so it is a XOR of one lookup per header byte
+    value = np.arange(256, dtype=np.uint32)
+    tables = []
+    for shift in (0, 8, 16):
+        ecc = np.zeros(256, dtype=np.uint8)
+        for i, mask in enumerate(ECC_MASKS):
+            bits = (value << shift) & mask
+            parity = np.zeros(256, dtype=np.uint8)
+            for b in range(24):
+                parity ^= ((bits >> b) & 1).astype(np.uint8)
+            ecc |= parity << i
+        tables.append(ecc)
+    return tables
+
+
+CRC16_TABLE = _crc16_table()
+ECC_TABLES = _ecc_tables()
+
+
+def crc16(data, crc=CRC16_INIT):
+    """Return CSI-2 checksums of byte arrays, computed along the last axis."""
+    data = np.asarray(data, dtype=np.uint8)
+    crc = np.full(data.shape[:-1], crc, dtype=np.uint16)
+    for i in range(data.shape[-1]):
+        crc = CRC16_TABLE[(crc ^ data[..., i]) & 0xff] ^ (crc >> 8)
+    return crc
+
+
+def ecc(header):
+    """Return ECC of 24-bit packet headers (data identifier and word count)."""
+    header = np.asarray(header, dtype=np.uint32)
+    return (ECC_TABLES[0][header & 0xff] ^ ECC_TABLES[1][(header >> 8) & 0xff] ^
+            ECC_TABLES[2][header >> 16])
+
+
+def packet_header(dt, wc, vc=0):
+    """Return 4 bytes of packet headers, wc is the word count of long packets or the
+    data field of short packets."""
+    dt, wc, vc = np.broadcast_arrays(*[np.asarray(x, dtype=np.uint32) for x in (dt, wc, vc)])
+    header = (wc << 8) | (vc << 6) | dt
+    return np.stack([header & 0xff, (header >> 8) & 0xff, header >> 16, ecc(header)],
+                    axis=-1).astype(np.uint8)
+
+
+def short_packet(dt, data=0, vc=0):
+    """Return bytes of short packets."""
+    return packet_header(dt, data, vc)
+
+
+def long_packet(payload, dt=DT_YUV422_8BIT, vc=0):
+    """Return bytes of long packets carrying payload given along the last axis."""
+    payload = np.asarray(payload, dtype=np.uint8)
+    crc = crc16(payload)
+    header = packet_header(np.full(payload.shape[:-1], dt), payload.shape[-1], vc)
+    footer = np.stack([crc & 0xff, crc >> 8], axis=-1).astype(np.uint8)
+    return np.concatenate([header, payload, footer], axis=-1)
+
+
+def line_bytes(pixels):
+    """Return payload bytes of lines of 16-bit pixels, UV in the lower byte as
+    received from the deserializer."""
+    pixels = np.asarray(pixels, dtype=np.uint16)
+    return pixels.astype("<u2").view(np.uint8).reshape(pixels.shape[:-1] + (-1,))
@@ -0,0 +1,300 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import cocotb
+from cocotb.triggers import Edge, ReadOnly, RisingEdge
+from cocotb.utils import get_sim_time
+from csi2_model import DT_FRAME_END, DT_FRAME_START, DT_YUV422_8BIT, HS_INIT_SEQ, crc16, ecc
+
+# Byte clock cycles from the falling edge of HS data enable until TX D-PHY
+# disables HS_TX of the data lanes
+HS_EXIT_WORDS = 2
+
+
+class DPHYMonitor:
+    """Monitor of the HS data passed to the D-PHY, decoding CSI-2 packets and
+    reassembling frames.
+
+    Data bus words are sampled in the byte clock domain while `hs_data_en_o` is
+    high, a run of them is a single HS transmission, which has to be sent with
+    data lanes in HS mode (`hs_tx_en_o` high, `lp_tx_data_en_o` low). Lane bytes
+    are taken from the words, HS Zero and HS Init are stripped, lanes are
+    de-interleaved and packets are parsed until only HS Trail is left on all
+    lanes. ECC of each header and CRC of each long packet are verified. Frames
+    are lines of 16-bit pixels between Frame Start and Frame End, as NumPy arrays.
+
+    Latency of a line is the time from the rising edge of `lv_i` to the first
+    byte of its long packet, lines are matched with packets in order.
+
+    Parameters
+    ----------
+    dut : cocotb handle
+        CMOS2DPHY generated in simulation mode.
+    lanes : int
+        Number of D-PHY data lanes.
+    gear : int
+        Number of bits sent on each lane in a single byte clock cycle.
+    dt : int
+        Data type of long packets carrying lines.
+
+    Attributes
+    ----------
+    frames : list of numpy.ndarray
+        Received frames with shape (lines, pixels).
+    packets : list of (float, int, int)
+        Start time in ns, data type and word count of each packet.
+    transmissions : list of list of int
+        Data types of the packets of each HS transmission.
+    errors : list of str
+        Protocol violations, expected to stay empty.
+    """
+    def __init__(self, dut, lanes=2, gear=8, dt=DT_YUV422_8BIT):
+        self.dut = dut
+        self.lanes = lanes
+        self.gear = gear
+        self.dt = dt
+
+        self.frames = []
+        self.packets = []
+        self.transmissions = []
+        self.errors = []
+        self.latencies = []
+        self.cycles = 0
+        self.hs_cycles = 0
+
+        self._frame = None
+        self._line_starts = []
+
+    def start(self):
+        cocotb.start_soon(self._sample())
+        cocotb.start_soon(self._line_start(self.dut.lv_i))
+
+    def stats(self):
+        """Return number of frames and packets, share of byte clock cycles spent
+        sending HS data and line latencies in ns."""
+        return {
+            "frames": len(self.frames),
+            "packets": len(self.packets),
+            "utilization": self.hs_cycles / self.cycles if self.cycles else 0,
+            "latency_mean_ns": float(np.mean(self.latencies)) if self.latencies else None,
+            "latency_max_ns": max(self.latencies) if self.latencies else None,
+        }
+
+    async def _line_start(self, lv):
+        while True:
+            await RisingEdge(lv)
+            self._line_starts.append(get_sim_time("ns"))
+
+    async def _sample(self):
+        words = []
+        times = []
+        while True:
+            await RisingEdge(self.dut.byte_clk)
+            await ReadOnly()
+            self.cycles += 1
+            en = self.dut.hs_data_en_o.value
+            if en.is_resolvable and en:
+                self.hs_cycles += 1
+                if not self.dut.hs_tx_en_o.value or self.dut.lp_tx_data_en_o.value:
+                    self.errors.append("HS data sent with data lanes in LP mode at {} ns".format(
+                        get_sim_time("ns")))
+                words.append(self.dut.hs_data_o.value.integer)
+                times.append(get_sim_time("ns"))
+            elif words:
+                self._transmission(words, times)
+                words = []
+                times = []
+
+    def _lane_bytes(self, words):
+        # Returns (lanes, bytes) array in transmission order of each lane
+        nb = self.lanes * self.gear // 8
+        data = np.array([[(w >> (8 * i)) & 0xff for i in range(nb)] for w in words], dtype=np.uint8)
+        if self.gear == 16:
+            # (words, 2, lanes) -> (lanes, words, 2)
+            data = data.reshape(-1, 2, self.lanes).transpose(2, 0, 1)
+            return data.reshape(self.lanes, -1)
+        return data.T
+
+    def _transmission(self, words, times):
+        self._parse(self._lane_bytes(words), times, self.gear // 8)
+
+    def _parse(self, lane_bytes, times, word_bytes):
+        # Times are given for each word_bytes bytes of a lane
+        # Strip HS Zero and check HS Init on each lane
+        lanes = []
+        offset = None
+        for lane, data in enumerate(lane_bytes):
+            start = np.flatnonzero(data != 0)
+            if not len(start) or data[start[0]] != HS_INIT_SEQ:
+                self.errors.append("Missing HS Init on lane {} at {} ns".format(lane, times[0]))
+                return
+            if offset is not None and start[0] != offset:
+                self.errors.append("HS Init not aligned across lanes at {} ns".format(times[0]))
+                return
+            offset = start[0]
+            lanes.append(data[offset + 1:])
+        lanes = np.stack(lanes)
+        stream = lanes.T.reshape(-1)
+        self.transmissions.append([])
+
+        def trail_only(pos):
+            # All lanes keep repeating inverted MSB of their last packet byte
+            for lane in range(self.lanes):
+                first = pos + (lane - pos) % self.lanes
+                last = stream[first - self.lanes] if first >= self.lanes else HS_INIT_SEQ
+                if np.any(stream[first::self.lanes] != (0x00 if last & 0x80 else 0xff)):
+                    return False
+            return True
+
+        pos = 0
+        while pos < len(stream) and not trail_only(pos):
+            if pos + 4 > len(stream):
+                self.errors.append("Truncated packet header at {} ns".format(times[0]))
+                return
+            header = stream[pos:pos + 4].astype(np.uint32)
+            value = int(header[0] | (header[1] << 8) | (header[2] << 16))
+            if int(ecc(value)) != header[3]:
+                self.errors.append("Wrong ECC of header {:06x} at {} ns".format(value, times[0]))
+                return
+            dt = value & 0x3f
+            wc = value >> 8
+            time = times[min(len(times) - 1, (offset + 1 + pos // self.lanes) // word_bytes)]
+            self.packets.append((time, dt, wc))
+            self.transmissions[-1].append(dt)
+            pos += 4
+            if dt < 0x10:
+                self._short_packet(dt, time)
+                continue
+
+            if pos + wc + 2 > len(stream):
+                self.errors.append("Truncated long packet at {} ns".format(time))
+                return
+            payload = stream[pos:pos + wc]
+            crc = int(stream[pos + wc]) | (int(stream[pos + wc + 1]) << 8)
+            pos += wc + 2
+            if int(crc16(payload)) != crc:
+                self.errors.append("Wrong CRC of long packet at {} ns".format(time))
+            if dt == self.dt:
+                self._line(payload, time)
+
+    def _short_packet(self, dt, time):
+        if dt == DT_FRAME_START:
+            if self._frame is not None:
+                self.errors.append("Frame Start before Frame End at {} ns".format(time))
+            self._frame = []
+        elif dt == DT_FRAME_END:
+            if self._frame is None:
+                self.errors.append("Frame End without Frame Start at {} ns".format(time))
+            else:
+                self.frames.append(np.array(self._frame, dtype=np.uint16) if self._frame else
+                                   np.zeros((0, 0), dtype=np.uint16))
+            self._frame = None
+
+    def _line(self, payload, time):
+        if self._frame is None:
+            self.errors.append("Line outside of a frame at {} ns".format(time))
+            return
+        self._frame.append(payload.view("<u2").copy())
+        if self._line_starts:
+            self.latencies.append(time - self._line_starts.pop(0))
+
+
+class DPHYLaneMonitor(DPHYMonitor):
+    """Monitor of the D-PHY lane pins, decoding CSI-2 packets like DPHYMonitor.
+
+    Data lanes are sampled on both edges of the clock lane. A lane enters HS mode
+    after LP-00 and leaves it at LP-11, bits received in between are searched
+    for HS Init, LSB first, and packed into bytes. Once all lanes are back in LP
+    mode, the transmission is parsed. The clock lane toggles only in HS mode, so
+    no bits are sampled while it is in LP mode. D-PHY leaves HS mode
+    HS_EXIT_WORDS byte clock cycles after the end of HS data, the idle data bus
+    serialized in the meantime follows HS Trail and is stripped.
+
+    Parameters
+    ----------
+    clk_p : cocotb handle
+        Positive pin of the clock lane.
+    data_p, data_n : list of cocotb handles
+        Positive and negative pins of the data lanes.
+    lv : cocotb handle
+        Line valid of the pixel input, line latencies aren't measured if None.
+    dt : int
+        Data type of long packets carrying lines.
+    gear : int
+        Number of bits sent on each lane in a single byte clock cycle.
+    """
+    def __init__(self, clk_p, data_p, data_n, lv=None, dt=DT_YUV422_8BIT, gear=8):
+        super().__init__(None, len(data_p), gear, dt)
+        self.clk_p = clk_p
+        self.data_p = data_p
+        self.data_n = data_n
+        self.lv = lv
+
+    def start(self):
+        cocotb.start_soon(self._sample())
+        if self.lv is not None:
+            cocotb.start_soon(self._line_start(self.lv))
+
+    async def _sample(self):
+        states = ["lp"] * self.lanes
+        bits = [[] for _ in range(self.lanes)]
+        times = [[] for _ in range(self.lanes)]
+        while True:
+            await Edge(self.clk_p)
+            await ReadOnly()
+            self.cycles += 1
+            for lane in range(self.lanes):
+                p = self.data_p[lane].value
+                n = self.data_n[lane].value
+                if not p.is_resolvable or not n.is_resolvable:
+                    continue
+                p, n = int(p), int(n)
+                if states[lane] == "lp":
+                    if not p and not n:
+                        states[lane] = "hs"
+                elif p and n:
+                    states[lane] = "lp"
+                elif p != n:
+                    bits[lane].append(p)
+                    times[lane].append(get_sim_time("ns"))
+            if "hs" in states:
+                self.hs_cycles += 1
+            elif any(bits):
+                self._burst(bits, times)
+                bits = [[] for _ in range(self.lanes)]
+                times = [[] for _ in range(self.lanes)]
+
+    def _burst(self, bits, times):
+        sync = [(HS_INIT_SEQ >> i) & 1 for i in range(8)]
+        time = next(t[0] for t in times if t)
+        lane_bytes = []
+        for lane, data in enumerate(bits):
+            ones = data.index(1) if 1 in data else len(data)
+            # HS Zero precedes the first set bit of HS Init
+            start = ones - sync.index(1)
+            if start < 0 or data[start:start + 8] != sync:
+                self.errors.append("Missing HS Init on lane {} at {} ns".format(lane, time))
+                return
+            data = np.array(data[start:start + (len(data) - start) // 8 * 8], dtype=np.uint8)
+            lane_bytes.append(np.packbits(data.reshape(-1, 8), axis=-1, bitorder="little")[:, 0])
+            if lane == 0:
+                byte_times = times[lane][start::8]
+        length = min(len(data) for data in lane_bytes)
+        tail = HS_EXIT_WORDS * self.gear // 8
+        if length < tail or any(np.any(data[length - tail:length]) for data in lane_bytes):
+            self.errors.append("Missing idle data after HS Trail at {} ns".format(time))
+            return
+        length -= tail
+        self._parse(np.stack([data[:length] for data in lane_bytes]), byte_times, 1)
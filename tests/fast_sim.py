@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runner of unit tests on the Migen simulator, without Verilog generation and
+Verilator builds.
+
+Test modules written for cocotb are imported unchanged, with the part of the
+cocotb API they use provided on top of the Migen evaluator: signal handles named
+as in the generated Verilog, clocks, Timer, Edge, RisingEdge, FallingEdge,
+ClockCycles and ReadOnly triggers, start_soon and TestFactory. Each generated
+test runs on a freshly built design. As in an event-driven simulator, coroutines
+woken by a clock edge read values from before the edge and their writes are
+sampled by the next one; all writes are applied before the ReadOnly phase of the
+same time step.
+
+The cocotb and Verilator flow stays the reference for integration tests, this one
+is meant for quick feedback on edits of the unit tests and the modules they cover.
+"""
+
+import argparse
+import fnmatch
+import heapq
+import importlib
+import logging
+import os
+import sys
+import time
+import traceback
+import types
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(TESTS_DIR), "src")
+
+from migen import ClockDomain
+from migen.fhdl.tools import list_clock_domains, list_signals
+from migen.fhdl.verilog import convert
+from migen.sim.core import Simulator
+
+# Time units of the simulator precision, steps are picoseconds as with the
+# cocotb defaults
+UNITS = {"step": 1, "ps": 1, "ns": 1000, "us": 1000000, "ms": 1000000000, "sec": 1000000000000}
+
+
+class SimFailure(Exception):
+    pass
+
+
+class BinaryValue(int):
+    """Integer value of a signal, with the BinaryValue attributes used in tests."""
+    @property
+    def integer(self):
+        return int(self)
+
+    @property
+    def is_resolvable(self):
+        return True
+
+
+class SignalHandle:
+    def __init__(self, sim, signal, name):
+        self._sim = sim
+        self._signal = signal
+        self._name = name
+
+    def __len__(self):
+        return len(self._signal)
+
+    @property
+    def value(self):
+        return BinaryValue(self._sim.evaluator.eval(self._signal))
+
+    @value.setter
+    def value(self, value):
+        self._sim.write(self._signal, int(value))
+
+
+class DUT:
+    """Toplevel handle, signals are attributes named as in the generated Verilog."""
+    def __init__(self, sim, name, signals):
+        self._sim = sim
+        self._name = name
+        self._log = logging.getLogger("cocotb." + name)
+        self._handles = {n: SignalHandle(sim, s, n) for n, s in signals.items()}
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["_handles"][name]
+        except KeyError:
+            raise AttributeError("{} has no signal {}".format(self.__dict__["_name"], name))
+
+
+# Triggers --------------------------------------------------------------------
+
+class Trigger:
+    def __await__(self):
+        yield self
+        return self
+
+
+class Timer(Trigger):
+    def __init__(self, time, units="step"):
+        self.time = round(time * UNITS[units])
+
+
+class Edge(Trigger):
+    def __init__(self, signal):
+        self.signal = signal
+
+
+class RisingEdge(Edge):
+    pass
+
+
+class FallingEdge(Edge):
+    pass
+
+
+class ReadOnly(Trigger):
+    pass
+
+
+class ClockCycles(Trigger):
+    def __init__(self, signal, num_cycles, rising=True):
+        self.signal = signal
+        self.num_cycles = num_cycles
+        self.rising = rising
+
+    def __await__(self):
+        edge = RisingEdge if self.rising else FallingEdge
+        for _ in range(self.num_cycles):
+            yield edge(self.signal)
+        return self
+
+
+class Task(Trigger):
+    def __init__(self, coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+
+    def __await__(self):
+        if not self.done:
+            yield self
+        return self.result
+
+
+class Clock:
+    def __init__(self, signal, period, units="step"):
+        self.signal = signal
+        self.half_period = round(period * UNITS[units]) // 2
+
+    async def start(self, start_high=True):
+        value = int(start_high)
+        while True:
+            self.signal.value = value
+            await Timer(self.half_period)
+            value = not value
+
+
+# Scheduler -------------------------------------------------------------------
+
+class Scheduler:
+    """Event loop running coroutines of a test against the Migen evaluator.
+
+    A time step applies writes and clock edges in delta cycles, executing
+    synchronous statements of the domains whose clock rose, until no coroutine
+    woken by an edge writes anything. Coroutines waiting for ReadOnly are resumed
+    after that.
+    """
+    def __init__(self, fragment):
+        self.sim = Simulator(fragment, {}, clocks={})
+        self.evaluator = self.sim.evaluator
+        self.domains = self.sim.fragment.clock_domains
+        self.time = 0
+        self.timers = []
+        self.timer_id = 0
+        self.edges = {}
+        self.read_only = []
+        self.ready = []
+        self.joins = {}
+
+    def write(self, signal, value):
+        self.evaluator.assign(signal, value)
+
+    def start_soon(self, coro):
+        task = Task(coro)
+        self.ready.append((task, None))
+        return task
+
+    def _wait(self, task, trigger):
+        if isinstance(trigger, Timer):
+            heapq.heappush(self.timers, (self.time + trigger.time, self.timer_id, task))
+            self.timer_id += 1
+        elif isinstance(trigger, Edge):
+            self.edges.setdefault(trigger.signal._signal, []).append((task, trigger))
+        elif isinstance(trigger, ReadOnly):
+            self.read_only.append(task)
+        elif isinstance(trigger, Task):
+            self.joins.setdefault(trigger, []).append(task)
+        else:
+            raise SimFailure("Unsupported trigger {}".format(trigger))
+
+    def _run(self, task, trigger=None):
+        try:
+            self._wait(task, task.coro.send(trigger))
+        except StopIteration as e:
+            task.done = True
+            task.result = e.value
+            self.ready.extend((waiter, task) for waiter in self.joins.pop(task, []))
+
+    def _propagate(self):
+        # Commits writes and propagates comb logic, returns changed signals with
+        # their previous values
+        modified = {}
+        while True:
+            old = {signal: self.evaluator.eval(signal) for signal in self.evaluator.modifications}
+            changed = self.evaluator.commit()
+            if not changed:
+                return modified
+            for signal in changed:
+                modified.setdefault(signal, old[signal])
+            self.evaluator.execute(self.sim.fragment.comb)
+
+    def _wake_edges(self, modified):
+        for signal, old in modified.items():
+            waiters = self.edges.pop(signal, None)
+            if not waiters:
+                continue
+            new = self.evaluator.eval(signal)
+            keep = []
+            for task, trigger in waiters:
+                if new == old or (type(trigger) is RisingEdge and not (new and not old)) or \
+                        (type(trigger) is FallingEdge and not (old and not new)):
+                    keep.append((task, trigger))
+                else:
+                    self.ready.append((task, trigger))
+            if keep:
+                self.edges[signal] = keep
+
+    def _run_ready(self):
+        ready, self.ready = self.ready, []
+        for task, trigger in ready:
+            self._run(task, trigger)
+
+    def _step(self):
+        while self.ready or self.evaluator.modifications:
+            self._run_ready()
+            modified = self._propagate()
+            rising = [cd for cd in self.domains if cd.clk in modified and
+                      self.evaluator.eval(cd.clk) and not modified[cd.clk]]
+            # Coroutines woken by a clock edge see values from before the edge,
+            # sync logic samples them before their writes are applied
+            self._wake_edges(modified)
+            self._run_ready()
+            for cd in rising:
+                if cd.name in self.sim.fragment.sync:
+                    self.evaluator.execute(self.sim.fragment.sync[cd.name])
+        while self.read_only:
+            read_only, self.read_only = self.read_only, []
+            for task in read_only:
+                self._run(task, ReadOnly())
+            if self.evaluator.modifications:
+                raise SimFailure("Write in the ReadOnly phase at {} ps".format(self.time))
+
+    def run(self, test, timeout=None):
+        main = self.start_soon(test)
+        self.evaluator.execute(self.sim.fragment.comb)
+        self._propagate()
+        while True:
+            self._step()
+            if main.done:
+                return main.result
+            if not self.timers:
+                raise SimFailure("Simulation stalled at {} ps".format(self.time))
+            self.time = self.timers[0][0]
+            if timeout is not None and self.time > timeout:
+                raise SimFailure("Timeout at {} ps".format(self.time))
+            while self.timers and self.timers[0][0] == self.time:
+                _, _, task = heapq.heappop(self.timers)
+                self.ready.append((task, Timer(0)))
+
+
+# cocotb API ------------------------------------------------------------------
+
+_scheduler = None
+_tests = []
+
+
+def start_soon(coro):
+    return _scheduler.start_soon(coro)
+
+
+def get_sim_time(units="step"):
+    return _scheduler.time / UNITS[units]
+
+
+class TestFactory:
+    def __init__(self, test_function):
+        self.test_function = test_function
+        self.options = []
+
+    def add_option(self, name, optionlist):
+        self.options.append((name, optionlist))
+
+    def generate_tests(self):
+        combinations = [{}]
+        for name, optionlist in self.options:
+            combinations = [dict(c, **{name: option}) for c in combinations for option in optionlist]
+        for i, kwargs in enumerate(combinations):
+            name = "{}_{:03d}".format(self.test_function.__name__, i + 1)
+            _tests.append((name, self.test_function, kwargs))
+
+
+def install():
+    """Provide the cocotb modules used by tests, before the test modules are imported."""
+    modules = {
+        "cocotb": dict(start_soon=start_soon),
+        "cocotb.clock": dict(Clock=Clock),
+        "cocotb.triggers": dict(Timer=Timer, Edge=Edge, RisingEdge=RisingEdge,
+                                FallingEdge=FallingEdge, ReadOnly=ReadOnly,
+                                ClockCycles=ClockCycles),
+        "cocotb.regression": dict(TestFactory=TestFactory),
+        "cocotb.utils": dict(get_sim_time=get_sim_time),
+    }
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        sys.modules[name] = module
+        if "." in name:
+            setattr(sys.modules["cocotb"], name.split(".")[1], module)
+
+
+# Designs ---------------------------------------------------------------------
+
+def load_tops():
+    """Return test modules and design builders of each TOP of tests/Makefile,
+    designs are built as by the scripts in src.
+
+    Design modules are imported first, since src/common.py is shadowed by
+    tests/common.py once test modules are imported.
+    """
+    sys.path.insert(0, SRC_DIR)
+    from common import dphy_timings, get_timings
+    from crc16 import CRC16
+    from mipi_dphy import TXDPHY
+    from packet_formatter import PacketFormatter
+    from pattern_gen import PatternGenerator
+    del sys.modules["common"]
+    sys.path.insert(0, TESTS_DIR)
+
+    def packet_formatter(four_lanes=False, gear=8, burst=False, pack_sync=False):
+        return PacketFormatter(get_timings("1080p_3g", False, gear), four_lanes, gear, burst,
+                               pack_sync)
+
+    def mipi_dphy(cont_clk=False):
+        return TXDPHY(dphy_timings["sdi_3g-2lanes"], four_lanes=False, sim=True, cont_clk=cont_clk)
+
+    return {
+        "crc16": ("test_crc16", lambda: CRC16()),
+        "crc16_32bit": ("test_crc16_wide", lambda: CRC16(32)),
+        "crc16_64bit": ("test_crc16_wide", lambda: CRC16(64)),
+        "packet_formatter_2lanes": ("test_packet_formatter_2lanes", lambda: packet_formatter()),
+        "packet_formatter_4lanes": ("test_packet_formatter_4lanes",
+                                    lambda: packet_formatter(True)),
+        "packet_formatter_gear16_2lanes": ("test_packet_formatter_gear16",
+                                           lambda: packet_formatter(gear=16)),
+        "packet_formatter_gear16_4lanes": ("test_packet_formatter_gear16",
+                                           lambda: packet_formatter(True, gear=16)),
+        "packet_formatter_burst_2lanes": ("test_packet_formatter_burst",
+                                          lambda: packet_formatter(burst=True)),
+        "packet_formatter_burst_4lanes": ("test_packet_formatter_burst",
+                                          lambda: packet_formatter(True, burst=True)),
+        "packet_formatter_pack_sync_2lanes": ("test_packet_formatter_pack_sync",
+                                              lambda: packet_formatter(pack_sync=True)),
+        "packet_formatter_pack_sync_4lanes": ("test_packet_formatter_pack_sync",
+                                              lambda: packet_formatter(True, pack_sync=True)),
+        "mipi_dphy": ("test_mipi_dphy", lambda: mipi_dphy()),
+        "mipi_dphy_cont_clk": ("test_mipi_dphy", lambda: mipi_dphy(True)),
+        "pattern_gen": ("test_pattern_gen", lambda: PatternGenerator()),
+    }
+
+
+def build(top, builder):
+    """Return the fragment of a design and its signals by their Verilog names."""
+    module = builder()
+    fragment = module.get_fragment()
+    ios = set(module.ios)
+    # Clock domains used but not defined become ports, as in convert
+    for name in sorted(list_clock_domains(fragment)):
+        if name not in [cd.name for cd in fragment.clock_domains]:
+            cd = ClockDomain(name)
+            fragment.clock_domains.append(cd)
+            ios |= {cd.clk, cd.rst}
+    ns = convert(fragment, ios, name=top).ns
+    signals = list_signals(fragment) | ios
+    for cd in fragment.clock_domains:
+        signals |= {cd.clk} | ({cd.rst} if cd.rst is not None else set())
+    return fragment, {ns.get_name(s): s for s in signals}
+
+
+def run_test(top, builder, function, kwargs, timeout_ms):
+    global _scheduler
+    fragment, signals = build(top, builder)
+    _scheduler = Scheduler(fragment)
+    dut = DUT(_scheduler, top, signals)
+    timeout = timeout_ms * UNITS["ms"] if timeout_ms else None
+    _scheduler.run(function(dut, **kwargs), timeout)
+    return _scheduler.time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run unit tests on the Migen simulator")
+    parser.add_argument("tops", nargs="*",
+                        help="Designs to test, named as TOP of tests/Makefile (default: all)")
+    parser.add_argument("-k", "--testcase", default="*",
+                        help="Run only tests with names matching the pattern")
+    parser.add_argument("--timeout-ms", type=float, default=100,
+                        help="Simulated time limit of each test in ms")
+    args = parser.parse_args()
+
+    tops = load_tops()
+    for top in args.tops:
+        if top not in tops:
+            sys.exit("Unsupported TOP {}, use one of {}".format(top, ", ".join(tops)))
+    install()
+    logging.basicConfig(level=logging.INFO, format="%(name)s %(message)s")
+
+    failed = []
+    total = 0
+    for top in args.tops or tops:
+        module_name, builder = tops[top]
+        del _tests[:]
+        sys.modules.pop(module_name, None)
+        importlib.import_module(module_name)
+        for name, function, kwargs in list(_tests):
+            if not fnmatch.fnmatch(name, args.testcase):
+                continue
+            total += 1
+            start = time.time()
+            try:
+                sim_time = run_test(top, builder, function, kwargs, args.timeout_ms)
+                result = "PASS {:10.1f} us".format(sim_time / UNITS["us"])
+            except Exception:
+                # Any error fails only the test, as in cocotb's regression manager
+                failed.append("{}.{}".format(top, name))
+                result = "FAIL"
+                traceback.print_exc()
+            print("{:36} {:36} {} in {:.2f} s".format(top, name, result, time.time() - start))
+
+    print("{} tests, {} failed{}".format(total, len(failed),
+                                         ": " + ", ".join(failed) if failed else ""))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
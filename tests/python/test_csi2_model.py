@@ -0,0 +1,57 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+from csi2_model import crc16, ecc, long_packet, packet_header
+
+# Packet data and checksums of the CSI-2 specification examples
+CRC_VECTORS = [
+    ("ff000002b9dcf372bbd4b85ac875c27c81f805dfff000001", 0x00f0),
+    ("ff0000001ef01ec74f8278c582e08c70d23c78e9ff000001", 0xe569),
+]
+
+# ECC of each single header bit, from the parity bit table of the specification
+ECC_COLUMNS = [
+    0x07, 0x0b, 0x0d, 0x0e, 0x13, 0x15, 0x16, 0x19, 0x1a, 0x1c, 0x23, 0x25,
+    0x26, 0x29, 0x2a, 0x2c, 0x31, 0x32, 0x34, 0x38, 0x1f, 0x2f, 0x37, 0x3b,
+]
+
+
+def vector_bytes(data):
+    return np.frombuffer(bytes.fromhex(data), dtype=np.uint8)
+
+
+def test_crc16():
+    for data, crc in CRC_VECTORS:
+        assert crc16(vector_bytes(data)) == crc
+    # Checksums are computed along the last axis
+    frame = np.stack([vector_bytes(data) for data, _ in CRC_VECTORS])
+    assert list(crc16(frame)) == [crc for _, crc in CRC_VECTORS]
+
+
+def test_ecc():
+    assert [int(ecc(1 << bit)) for bit in range(24)] == ECC_COLUMNS
+    # Data identifier 0x37 and word count 0x01f0 of the specification example
+    assert ecc(0x01f037) == 0x3f
+    assert list(packet_header(0x37, 0x01f0)) == [0x37, 0xf0, 0x01, 0x3f]
+
+
+def test_long_packet():
+    data, crc = CRC_VECTORS[0]
+    payload = vector_bytes(data)
+    packet = long_packet(payload, dt=0x2a)
+    assert list(packet[:4]) == list(packet_header(0x2a, len(payload)))
+    assert list(packet[4:-2]) == list(payload)
+    assert list(packet[-2:]) == [crc & 0xff, crc >> 8]
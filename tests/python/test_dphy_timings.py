@@ -0,0 +1,84 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from common import (PLL_CN, PLL_PFD_FREQ, PLL_VCO_FREQ, get_timings, supported_formats,
+                    supported_formats_3g)
+
+# Dividers of the hand-written tables the solver replaced, as (N, M, O) for 2 and
+# 4 lanes, they didn't change with the gear
+TABLE_PLL = {
+    ("hd", 2): (3, 96, 4),
+    ("hd", 4): (3, 96, 8),
+    ("3g", 2): (5, 80, 2),
+    ("3g", 4): (5, 80, 4),
+}
+
+
+def pll_settings(timings):
+    n = {encoding: n for n, encoding in PLL_CN.items()}[timings["CN"]]
+    m = int(timings["CM"], 2) - 64
+    o = 2**int(timings["CO"], 2)
+    return n, m, o
+
+
+def spec_limits(ui):
+    """Return (minimum, maximum) in ns of D-PHY timings, as sums of the counters
+    of TX Global Operations phases that make them up."""
+    return {
+        ("TINIT_VALUE",): (100000, None),
+        ("T_LPX",): (50, None),
+        ("T_DATPREP",): (40 + 4 * ui, 85 + 6 * ui),
+        ("T_DATPREP", "T_DAT_HSZERO"): (145 + 10 * ui, None),
+        # T_EOT limits HS Trail from above
+        ("T_DATTRAIL",): (max(8 * ui, 60 + 4 * ui), 105 + 12 * ui),
+        ("T_CLKPREP",): (38, 95),
+        ("T_CLKPREP", "T_CLK_HSZERO"): (300, None),
+        ("T_CLKPOST",): (60 + 52 * ui, None),
+        ("T_CLKTRAIL",): (60, 105 + 12 * ui),
+        ("T_HSEXIT",): (100, None),
+    }
+
+
+@pytest.mark.parametrize("margin", [0, 0.25, 1])
+@pytest.mark.parametrize("gear", [8, 16])
+@pytest.mark.parametrize("four_lanes", [False, True])
+@pytest.mark.parametrize("video_format", supported_formats)
+def test_spec_compliance(video_format, four_lanes, gear, margin):
+    timings = get_timings(video_format, four_lanes, gear, margin)
+    n, m, o = pll_settings(timings)
+    ref_freq = 148500000 if video_format in supported_formats_3g else 74250000
+    lanes = 4 if four_lanes else 2
+
+    assert PLL_PFD_FREQ[0] <= ref_freq / n <= PLL_PFD_FREQ[1], "PFD out of range"
+    assert PLL_VCO_FREQ[0] <= ref_freq * m / n <= PLL_VCO_FREQ[1], "VCO out of range"
+    line_rate = ref_freq * m / (n * o)
+    assert line_rate >= ref_freq * 16 / lanes, "Line rate below the pixel rate"
+
+    ui = 1e9 / line_rate
+    period = gear * ui
+    for keys, (min_ns, max_ns) in spec_limits(ui).items():
+        length = sum(timings[key] for key in keys) * period
+        assert length >= min_ns, "{} shorter than {} ns".format("+".join(keys), min_ns)
+        if max_ns is not None:
+            assert length <= max_ns, "{} longer than {} ns".format("+".join(keys), max_ns)
+
+
+@pytest.mark.parametrize("gear", [8, 16])
+@pytest.mark.parametrize("lanes", [2, 4])
+@pytest.mark.parametrize("rate", ["hd", "3g"])
+def test_table_dividers(rate, lanes, gear):
+    timings = get_timings("1080p_" + rate, lanes == 4, gear)
+    assert pll_settings(timings) == TABLE_PLL[(rate, lanes)]
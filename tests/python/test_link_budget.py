@@ -0,0 +1,53 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from common import get_timings
+from line_buffer import line_buffer_depth
+from link_budget import link_budget, served_formats
+
+
+def test_sustainable():
+    timings = get_timings("1080p60", False)
+    depth = line_buffer_depth(timings, False, 8, False, 3840)
+    budget = link_budget("1080p60", timings, buffer_depth=depth)
+    assert budget["sustainable"]
+    assert budget["payload_words"] == 1920
+    assert budget["line_words"] == 2200
+    assert budget["line_slack_words"] > 0
+    assert budget["fifo_occupancy_words"] <= depth
+    assert 0 < budget["link_utilization"] < 1
+
+
+def test_line_slack_exceeded():
+    # 4 lanes in gear 16 leave a quarter of the blanking words of 2 lanes in gear 8,
+    # which doesn't fit the doubled D-PHY timings
+    timings = get_timings("1080p60", True, 16, margin=1.0)
+    budget = link_budget("1080p60", timings, four_lanes=True, gear=16)
+    assert budget["line_slack_words"] < 0
+    assert not budget["sustainable"]
+
+
+def test_buffer_exceeded():
+    timings = get_timings("1080p60", False)
+    budget = link_budget("1080p60", timings, hs_watermark=64, buffer_depth=64)
+    assert budget["fifo_occupancy_words"] > 64
+    assert not budget["sustainable"]
+
+
+def test_served_formats():
+    assert served_formats("1080p60") == ["1080p60"]
+    assert sorted(served_formats("1080p_3g")) == ["1080p50", "1080p60"]
+    assert sorted(served_formats("1080p_hd")) == ["1080p25", "1080p30"]
+    assert sorted(served_formats("auto_hd", auto_format=True)) == \
+        ["1080p25", "1080p30", "720p25", "720p30", "720p50", "720p60"]
@@ -0,0 +1,41 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from run_tests import expand_jobs
+
+
+def test_default_jobs():
+    jobs = expand_jobs(["crc16", "packet_formatter_4lanes", "mipi_dphy"], ["1080p_3g"])
+    assert jobs == [
+        ("crc16", "crc16", ""),
+        ("packet_formatter_4lanes-1080p_3g", "packet_formatter_4lanes",
+         "--lanes 4 --gear 8 --video-format 1080p_3g --timing-margin 0"),
+        ("mipi_dphy-1080p_3g", "mipi_dphy", "--video-format 1080p_3g --timing-margin 0"),
+    ]
+
+
+def test_job_axes():
+    jobs = expand_jobs(["packet_formatter_2lanes", "packet_formatter_4lanes",
+                        "packet_formatter_burst_2lanes", "top_dphy_model_perf_counters_2lanes"],
+                       ["1080p_hd"], lanes=[2, 4], gears=[8, 16], timing_margins=[0, 20])
+    names = [name for name, _, _ in jobs]
+    # Both designs listed with their lanes expand to the same jobs
+    assert len(names) == len(set(names)) == 8 + 4 + 1
+    assert "packet_formatter_gear16_4lanes-1080p_hd-margin20" in names
+    # Burst test is written for gear 8, the perf counters one for 2 lanes
+    assert not any("burst" in name and "gear16" in name for name in names)
+    assert "top_dphy_model_perf_counters_2lanes" in names
+    top, parameters = dict((name, job) for name, *job in jobs)[
+        "packet_formatter_gear16_4lanes-1080p_hd-margin20"]
+    assert top == "packet_formatter_gear16_4lanes"
+    assert parameters == "--lanes 4 --gear 16 --video-format 1080p_hd --timing-margin 20"
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parallel runner of the cocotb tests.
+
+Designs named as TOP of tests/Makefile are expanded into jobs along the axes of
+their generator parameters: the video format and the timing margin of the D-PHY
+timings, the number of lanes and the gear. Every job runs `make test` in its own
+build directory, so jobs don't share generated sources, simulator builds or
+results, and builds are kept between runs. Results of all jobs are merged into a single JUnit report with a
+test suite per job, timed with the wall time of the job.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from multiprocessing import Pool
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "src"))
+
+from common import supported_formats
+
+# Designs generated with the D-PHY timings of the --video-format and
+# --timing-margin options, formats of the same data rate and lanes share the timings
+FORMAT_TOPS = ("packet_formatter", "mipi_dphy", "cmos2dphy")
+# Designs tested with both numbers of lanes, and the ones of them tested with both
+# gears. Generated modules are named after their lanes and gear, so both are part
+# of the TOP names as well.
+LANE_TOPS = ("packet_formatter", "packet_formatter_burst", "packet_formatter_pack_sync",
+             "top_dphy_model", "top_dphy_model_cont_clk")
+GEAR_TOPS = ("packet_formatter", "top_dphy_model")
+
+
+def split_top(top):
+    """Return the base name, lanes and gear of a TOP, lanes are None if not named."""
+    match = re.fullmatch(r"(.*?)(_gear16)?_([24])lanes", top)
+    if not match:
+        return top, None, 8
+    return match.group(1), int(match.group(3)), 16 if match.group(2) else 8
+
+
+def expand_jobs(tops, video_formats, lanes=None, gears=None, timing_margins=(0,)):
+    """Return (name, TOP, generator parameters) of every job.
+
+    Lanes and gears default to the ones in the TOP names, other values of the
+    axes apply to the designs generated with them.
+    """
+    jobs = []
+    for top in tops:
+        base, top_lanes, top_gear = split_top(top)
+        variants = [(top, "")]
+        if base in LANE_TOPS:
+            gear_axis = gears if gears and base in GEAR_TOPS else [top_gear]
+            variants = [
+                ("{}{}_{}lanes".format(base, "_gear16" if gear == 16 else "", n),
+                 "--lanes {} --gear {}".format(n, gear))
+                for n in (lanes or [top_lanes]) for gear in gear_axis
+            ]
+        for variant, parameters in variants:
+            if not variant.startswith(FORMAT_TOPS):
+                jobs.append((variant, variant, parameters))
+                continue
+            for video_format in video_formats:
+                for margin in timing_margins:
+                    name = "{}-{}{}".format(
+                        variant, video_format, "-margin{}".format(margin) if margin else "")
+                    jobs.append((name, variant, " ".join(filter(None, [
+                        parameters, "--video-format {}".format(video_format),
+                        "--timing-margin {}".format(margin)]))))
+    # Designs listed with each of their lanes are expanded to the same jobs
+    return list(dict((job[0], job) for job in jobs).values())
+
+
+def _run_job(args):
+    name, top, parameters, build_root, trace = args
+    build_dir = os.path.join(build_root, name)
+    os.makedirs(build_dir, exist_ok=True)
+    results = os.path.join(build_dir, "results.xml")
+    if os.path.exists(results):
+        os.remove(results)
+
+    env = dict(os.environ, COCOTB_RESULTS_FILE=results)
+    command = ["make", "-C", TESTS_DIR, "test", "TOP=" + top, "BUILD_DIR=" + build_dir,
+               "TEST_PARAMETERS=" + parameters, "TRACE={}".format(int(trace))]
+    start = time.time()
+    with open(os.path.join(build_dir, "test.log"), "w") as log:
+        returncode = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT, env=env)
+    return name, returncode, time.time() - start, results
+
+
+def previous_times(report):
+    """Return wall times of jobs in a previous report, used to start long jobs first."""
+    if not os.path.exists(report):
+        return {}
+    try:
+        root = ET.parse(report).getroot()
+    except ET.ParseError:
+        return {}
+    return {suite.get("name"): float(suite.get("time", 0)) for suite in root.iter("testsuite")}
+
+
+def merge_results(jobs, report):
+    """Write a report with a test suite per job, returns names of failed jobs."""
+    root = ET.Element("testsuites", name="all")
+    failed = []
+    for name, returncode, wall_time, results in jobs:
+        suite = ET.SubElement(root, "testsuite", name=name, time="{:.3f}".format(wall_time))
+        cases = []
+        if os.path.exists(results):
+            try:
+                cases = list(ET.parse(results).getroot().iter("testcase"))
+            except ET.ParseError:
+                pass
+        if not cases:
+            # Generation or simulator build failed before any test was run
+            case = ET.Element("testcase", name="build", classname=name, time="0")
+            ET.SubElement(case, "error", message="make exited with {}".format(returncode))
+            cases = [case]
+        failures = sum(1 for case in cases
+                       if case.find("failure") is not None or case.find("error") is not None)
+        suite.extend(cases)
+        suite.set("tests", str(len(cases)))
+        suite.set("failures", str(failures))
+        if failures or returncode:
+            failed.append(name)
+
+    os.makedirs(os.path.dirname(os.path.abspath(report)), exist_ok=True)
+    ET.ElementTree(root).write(report, encoding="UTF-8", xml_declaration=True)
+    return failed
+
+
+def run(jobs, build_root, report, processes=None, trace=False):
+    times = previous_times(report)
+    # Longest jobs are started first, so that the last one to finish is short
+    jobs = sorted(jobs, key=lambda job: -times.get(job[0], float("inf")))
+    done = []
+    with Pool(processes) as pool:
+        args = [job + (build_root, trace) for job in jobs]
+        for name, returncode, wall_time, results in pool.imap_unordered(_run_job, args):
+            print("{:48} {} in {:.1f} s".format(name, "FAIL" if returncode else "PASS", wall_time),
+                  flush=True)
+            done.append((name, returncode, wall_time, results))
+
+    order = [job[0] for job in jobs]
+    return merge_results(sorted(done, key=lambda job: order.index(job[0])), report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run cocotb tests in parallel")
+    parser.add_argument("tops", nargs="+", help="Designs to test, named as TOP of tests/Makefile")
+    parser.add_argument(
+        "--video-formats", nargs="+", choices=supported_formats, default=["1080p_hd", "1080p_3g"],
+        help="Video formats of the D-PHY timings of {} designs".format(", ".join(FORMAT_TOPS))
+    )
+    parser.add_argument(
+        "--lanes", nargs="+", type=int, choices=[2, 4],
+        help="Numbers of lanes of {} designs, by default the ones in the names".format(
+            ", ".join(LANE_TOPS))
+    )
+    parser.add_argument(
+        "--gears", nargs="+", type=int, choices=[8, 16],
+        help="D-PHY gears of {} designs, by default the ones in the names".format(
+            ", ".join(GEAR_TOPS))
+    )
+    parser.add_argument(
+        "--timing-margins", nargs="+", type=int, default=[0],
+        help="D-PHY timing margins in percent of {} designs".format(", ".join(FORMAT_TOPS))
+    )
+    parser.add_argument("--processes", type=int, help="Number of jobs run at once")
+    parser.add_argument("--build-dir", default=os.path.join(TESTS_DIR, "build", "jobs"),
+                        help="Directory with build directories of the jobs")
+    parser.add_argument("--report", default=os.path.join(TESTS_DIR, "build", "results.xml"),
+                        help="Merged JUnit report")
+    parser.add_argument("--trace", action="store_true", help="Dump waveforms")
+    args = parser.parse_args()
+
+    jobs = expand_jobs(args.tops, args.video_formats, args.lanes, args.gears,
+                       args.timing_margins)
+    start = time.time()
+    failed = run(jobs, args.build_dir, args.report, args.processes, args.trace)
+    print("{} jobs in {:.1f} s, {} failed{}".format(
+        len(jobs), time.time() - start, len(failed), ": " + ", ".join(failed) if failed else ""))
+    print("Report written to {}".format(args.report))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
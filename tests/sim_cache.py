@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed cache of Verilator simulator builds.
+
+Builds are stored under a key hashed from the simulated sources, the simulator
+arguments and the versions of Verilator and cocotb, whose Verilator main is
+compiled into the model. `restore` runs before the build: a simulator build
+directory with another key is replaced with the cached build of the current
+one, or removed on a miss so that it's compiled from scratch. `store` copies a
+finished build to the cache and evicts least recently used entries above the
+size limit.
+
+Restored files get the same modification time, newer than the sources, so make
+considers them up to date.
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+KEY_FILE = ".sim_cache_key"
+
+
+def tool_version(command):
+    try:
+        return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              universal_newlines=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def build_key(sources, args, toplevel):
+    digest = hashlib.sha256()
+    for text in [toplevel, " ".join(args.split()), tool_version(["verilator", "--version"]),
+                 tool_version(["cocotb-config", "--version"])]:
+        digest.update(text.encode() + b"\0")
+    for path in sources:
+        with open(path, "rb") as fd:
+            digest.update(hashlib.sha256(fd.read()).digest())
+    return digest.hexdigest()
+
+
+def read_key(directory):
+    try:
+        with open(os.path.join(directory, KEY_FILE)) as fd:
+            return fd.read().strip()
+    except OSError:
+        return None
+
+
+def directory_size(directory):
+    size = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def touch_tree(directory, timestamp):
+    for root, _, files in os.walk(directory):
+        for name in files:
+            os.utime(os.path.join(root, name), (timestamp, timestamp))
+
+
+def restore(build, cache, key):
+    """Prepare the build directory for the key, returns True on a cache hit."""
+    if read_key(build) == key:
+        return True
+    entry = os.path.join(cache, key)
+    shutil.rmtree(build, ignore_errors=True)
+    if not os.path.isdir(entry):
+        return False
+    try:
+        shutil.copytree(entry, build, copy_function=shutil.copy)
+    except (OSError, shutil.Error):
+        # Entry evicted by another job while it was copied
+        shutil.rmtree(build, ignore_errors=True)
+        return False
+    touch_tree(build, time.time())
+    os.utime(entry)
+    return True
+
+
+def store(build, cache, key, size_limit):
+    if not os.path.isdir(build):
+        return
+    with open(os.path.join(build, KEY_FILE), "w") as fd:
+        fd.write(key + "\n")
+    entry = os.path.join(cache, key)
+    if os.path.isdir(entry):
+        os.utime(entry)
+    else:
+        # Entries appear atomically, jobs building the same design may race
+        os.makedirs(cache, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=cache, prefix=".tmp-")
+        shutil.copytree(build, os.path.join(tmp, key), symlinks=True)
+        try:
+            os.rename(os.path.join(tmp, key), entry)
+        except OSError:
+            pass
+        shutil.rmtree(tmp, ignore_errors=True)
+    evict(cache, size_limit, keep=key)
+
+
+def evict(cache, size_limit, keep=None):
+    """Remove least recently used entries until the cache fits in size_limit bytes."""
+    entries = []
+    for name in os.listdir(cache):
+        path = os.path.join(cache, name)
+        if name.startswith(".") or not os.path.isdir(path):
+            continue
+        try:
+            entries.append((os.stat(path).st_mtime, directory_size(path), name, path))
+        except OSError:
+            pass
+    total = sum(entry[1] for entry in entries)
+    for _, size, name, path in sorted(entries):
+        if total <= size_limit:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache of Verilator simulator builds")
+    parser.add_argument("action", choices=["restore", "store"])
+    parser.add_argument("sources", nargs="+", help="Simulated Verilog sources")
+    parser.add_argument("--build", required=True, help="Simulator build directory (SIM_BUILD)")
+    parser.add_argument("--cache", required=True, help="Cache directory")
+    parser.add_argument("--toplevel", default="", help="Simulated toplevel module")
+    parser.add_argument("--args", default="", help="Verilator arguments")
+    parser.add_argument("--size-mb", type=int, default=4096, help="Cache size limit in MiB")
+    args = parser.parse_args()
+
+    key = build_key(args.sources, args.args, args.toplevel)
+    if args.action == "restore":
+        hit = restore(args.build, args.cache, key)
+        print("Simulator build {} {}".format(key[:16], "restored" if hit else "not cached"))
+    else:
+        store(args.build, args.cache, key, args.size_mb * 1024 * 1024)
+
+
+if __name__ == "__main__":
+    main()
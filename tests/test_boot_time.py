@@ -0,0 +1,83 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import Edge, ReadOnly, RisingEdge, Timer, with_timeout
+from cocotb.regression import TestFactory
+from cocotb.utils import get_sim_time
+from common import *
+from reset_sequencer import BOOT_PHASES
+
+HFC_CLK_225MHZ = 4444
+
+# Deserializer PLL isn't simulated, its lock time after the reset release is assumed
+PLL_LOCK_US = 100
+
+
+async def deserializer_pll(dut, pll_lock_us):
+    await RisingEdge(dut.des_reset_n_o)
+    await Timer(pll_lock_us, "us")
+    dut.pll_lock_i.value = 1
+
+
+async def monitor_phases(dut, phases):
+    while True:
+        await Edge(dut.phase_o)
+        await ReadOnly()
+        phases.append((get_sim_time("us"), BOOT_PHASES[dut.phase_o.value.integer]))
+
+
+async def frame_start(dut):
+    while True:
+        await RisingEdge(dut.sp_en_o)
+        await ReadOnly()
+        if dut.dt_o.value == DT_FRAME_START:
+            return get_sim_time("us")
+
+
+async def test_boot_time(dut, pll_lock_us):
+    video_format = dut._name[len("boot_time_"):]
+    if video_format in ["1080p50", "1080p60"]:
+        pix_clk, byte_clk = PIX_CLK_148_5MHZ, BYTE_CLK_148_5MHZ
+    else:
+        pix_clk, byte_clk = PIX_CLK_74_25MHZ, BYTE_CLK_74_25MHZ
+
+    cocotb.start_soon(Clock(dut.hfc_clk, HFC_CLK_225MHZ, "ps").start())
+    cocotb.start_soon(Clock(dut.sys_clk, pix_clk, "ps").start())
+    cocotb.start_soon(Clock(dut.byte_clk, byte_clk, "ps").start())
+    dut.pll_lock_i.value = 0
+
+    phases = [(0, BOOT_PHASES[0])]
+    cocotb.start_soon(deserializer_pll(dut, pll_lock_us))
+    cocotb.start_soon(monitor_phases(dut, phases))
+    first_frame = await with_timeout(frame_start(dut), 2, "sec")
+    # Streaming phase is reported through a synchronizer
+    await Timer(1, "us")
+
+    dut._log.info("Boot phases of {} (PLL lock assumed {} us after deserializer reset):".format(
+        video_format, pll_lock_us))
+    ends = [start for start, _ in phases[1:]] + [max(first_frame, phases[-1][0])]
+    for (start, phase), end in zip(phases, ends):
+        dut._log.info("  {:12} {:12.1f} us {:12.1f} us".format(phase, start, end - start))
+    dut._log.info("Configuration to first Frame Start: {:.1f} us".format(first_frame))
+
+    names = [phase for _, phase in phases]
+    assert names == sorted(names, key=BOOT_PHASES.index), "Boot phases out of order"
+    assert names[-1] == "STREAMING", "First frame sent before streaming phase"
+
+
+tf = TestFactory(test_function=test_boot_time)
+tf.add_option(name="pll_lock_us", optionlist=[PLL_LOCK_US])
+tf.generate_tests()
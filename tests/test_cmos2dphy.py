@@ -12,12 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import tempfile
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import ReadOnly, RisingEdge, ClockCycles
 from cocotb.regression import TestFactory
 from common import *
 from common import reset_module
+from dphy_monitor import DPHYMonitor
+from pattern_gen import hv_timings
+from video_source import VideoSource, read_video, write_raw
+import numpy as np
 
 VC=0
 DT=0x1e
@@ -110,6 +116,10 @@ async def test_cmos2dphy(dut, clock_period, lines):
     set_initial_values(dut)
     await reset_module([pix_rst, byte_rst], pix_clk)
 
+    # Decode packets sent to the D-PHY
+    monitor = DPHYMonitor(dut, lanes=2)
+    monitor.start()
+
     # Wait for D-PHY to be ready
     await RisingEdge(dut.tinit_done_o)
 
@@ -135,6 +145,70 @@ async def test_cmos2dphy(dut, clock_period, lines):
     # Add a delay at the end
     await ClockCycles(pix_clk, 50)
 
+    # Frame is received as sent
+    assert not monitor.errors, "CSI-2 protocol errors: {}".format(monitor.errors)
+    assert len(monitor.frames) == 1, "Wrong number of received frames"
+    expected = np.full((lines, WC // 2), 0xbeef, dtype=np.uint16)
+    assert np.array_equal(monitor.frames[0], expected), "Received frame differs from the sent one"
+    dut._log.info("Link statistics: {}".format(monitor.stats()))
+
+
+def bbb_clip(frames, lines):
+    # Lines of the reference line shifted differently in each line and frame
+    for frame in range(frames):
+        yield np.stack([np.roll(bbb_line, 7 * line + 131 * frame) for line in range(lines)])
+
+
+async def test_cmos2dphy_video(dut, clock_period):
+    """Send frames of VIDEO_FILE, raw ones need VIDEO_WIDTH and VIDEO_HEIGHT and may set
+    VIDEO_PIX_FMT, VIDEO_FRAMES limits their number and VIDEO_FORMAT selects blanking.
+    A short clip made of the reference line is sent by default."""
+    pix_clk = dut.sys_clk
+    pix_rst = dut.sys_rst
+    byte_clk = dut.byte_clk
+    byte_rst = dut.byte_rst
+    cocotb.start_soon(Clock(pix_clk, clock_period[0], "ps").start())
+    cocotb.start_soon(Clock(byte_clk, clock_period[1], "ps").start())
+
+    path = os.environ.get("VIDEO_FILE")
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "bbb.uyvy")
+        write_raw(path, bbb_clip(frames=3, lines=8))
+        width, height = len(bbb_line), 8
+    else:
+        width, height = os.environ.get("VIDEO_WIDTH"), os.environ.get("VIDEO_HEIGHT")
+        width, height = (int(width) if width else None), (int(height) if height else None)
+
+    def frames():
+        return read_video(path, width, height, os.environ.get("VIDEO_PIX_FMT", "uyvy422"),
+                          count=int(os.environ.get("VIDEO_FRAMES", 2)))
+
+    set_initial_values(dut)
+    dut.wc_i.value = next(frames()).shape[1] * 2
+    await reset_module([pix_rst, byte_rst], pix_clk)
+
+    monitor = DPHYMonitor(dut, lanes=2)
+    monitor.start()
+    source = VideoSource(dut, hv_timings[os.environ.get("VIDEO_FORMAT", "1080p30")])
+
+    await RisingEdge(dut.tinit_done_o)
+
+    # Omit first few frames due to deserializer timing characteristics
+    for _ in range(6):
+        dut.fv_i.value = 1
+        await ClockCycles(pix_clk, 5)
+        dut.fv_i.value = 0
+        await ClockCycles(pix_clk, 5)
+
+    await source.send(frames())
+    await ClockCycles(pix_clk, 50)
+
+    assert not monitor.errors, "CSI-2 protocol errors: {}".format(monitor.errors)
+    assert len(monitor.frames) == source.frames_sent, "Wrong number of received frames"
+    for i, (sent, received) in enumerate(zip(frames(), monitor.frames)):
+        assert np.array_equal(received, sent), "Received frame {} differs from the sent one".format(i)
+    dut._log.info("Link statistics: {}".format(monitor.stats()))
+
 
 tf = TestFactory(test_function=test_cmos2dphy)
 tf.add_option(name="clock_period", optionlist=[
@@ -143,3 +217,10 @@ tf.add_option(name="clock_period", optionlist=[
 ])
 tf.add_option(name="lines", optionlist=[1, 1080])
 tf.generate_tests()
+
+tf_video = TestFactory(test_function=test_cmos2dphy_video)
+tf_video.add_option(name="clock_period", optionlist=[
+    (PIX_CLK_74_25MHZ, BYTE_CLK_74_25MHZ),
+    (PIX_CLK_148_5MHZ, BYTE_CLK_148_5MHZ),
+])
+tf_video.generate_tests()
@@ -0,0 +1,115 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, ReadOnly, RisingEdge
+from cocotb.regression import TestFactory
+from common import *
+from common import reset_module
+
+VC=0
+DT=0x1e
+WC=3840
+LINES=4
+HBLANK=280
+# Line in the middle of which the PLL lock is lost
+LOST_LINE=2
+
+
+def set_initial_values(dut):
+    dut.fv_i.value = 0
+    dut.lv_i.value = 0
+    dut.pix_data0_i.value = 0
+    dut.pix_data1_i.value = 0
+    dut.vc_i.value = VC
+    dut.dt_i.value = DT
+    dut.wc_i.value = WC
+    dut.pll_lock_i.value = 1
+
+
+async def packet_monitor(dut, packets):
+    while True:
+        await RisingEdge(dut.byte_clk)
+        await ReadOnly()
+        if dut.sp_en_o.value == 1:
+            packets.append("FS" if dut.dt_o.value == DT_FRAME_START else "FE")
+        if dut.lp_en_o.value == 1:
+            packets.append("L")
+
+
+async def xfr_frame(dut, lock_events={}):
+    pix_clk = dut.sys_clk
+    dut.fv_i.value = 1
+    await ClockCycles(pix_clk, HBLANK)
+    for line in range(LINES):
+        dut.lv_i.value = 1
+        dut.pix_data0_i.value = 0xef
+        dut.pix_data1_i.value = 0xbe
+        await ClockCycles(pix_clk, WC // 4)
+        if line in lock_events:
+            dut.pll_lock_i.value = lock_events[line]
+        await ClockCycles(pix_clk, WC // 4)
+        dut.lv_i.value = 0
+        await ClockCycles(pix_clk, HBLANK)
+    dut.fv_i.value = 0
+    await ClockCycles(pix_clk, 4 * HBLANK)
+
+
+async def test_cmos2dphy_fast_relock(dut, clock_period):
+    pix_clk = dut.sys_clk
+    pix_rst = dut.sys_rst
+    byte_clk = dut.byte_clk
+    byte_rst = dut.byte_rst
+    cocotb.start_soon(Clock(pix_clk, clock_period[0], "ps").start())
+    cocotb.start_soon(Clock(byte_clk, clock_period[1], "ps").start())
+
+    set_initial_values(dut)
+    await reset_module([pix_rst, byte_rst], pix_clk)
+
+    # Wait for D-PHY to be ready
+    await RisingEdge(dut.tinit_done_o)
+
+    # Omit first few frames due to deserializer timing characteristics
+    for _ in range(6):
+        dut.fv_i.value = 1
+        await ClockCycles(pix_clk, 5)
+        dut.fv_i.value = 0
+        await ClockCycles(pix_clk, 5)
+
+    packets = []
+    cocotb.start_soon(packet_monitor(dut, packets))
+
+    # Line interrupted by the lock loss is padded, the rest of the frame is dropped
+    await xfr_frame(dut, {LOST_LINE: 0})
+    expected = ["FS"] + ["L"] * (LOST_LINE + 1) + ["FE"]
+    assert packets == expected, "Packets of the interrupted frame: {}".format(packets)
+
+    # Nothing is sent until a frame starts with the lock restored
+    packets.clear()
+    await xfr_frame(dut)
+    await xfr_frame(dut, {1: 1})
+    assert packets == [], "Packets sent without the lock: {}".format(packets)
+
+    # D-PHY stays initialized and the first frames aren't rejected again
+    await xfr_frame(dut)
+    assert packets == ["FS"] + ["L"] * LINES + ["FE"], "Packets of the next frame: {}".format(packets)
+    assert dut.tinit_done_o.value == 1, "D-PHY initialized again after the lock loss"
+
+
+tf = TestFactory(test_function=test_cmos2dphy_fast_relock)
+tf.add_option(name="clock_period", optionlist=[
+    (PIX_CLK_74_25MHZ, BYTE_CLK_74_25MHZ),
+])
+tf.generate_tests()
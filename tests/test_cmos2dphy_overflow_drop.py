@@ -0,0 +1,172 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, ReadOnly, RisingEdge
+from cocotb.regression import TestFactory
+from common import *
+from common import reset_module
+from csi2_model import DT_NULL
+from dphy_monitor import DPHYMonitor
+from video_source import VideoSource
+import numpy as np
+
+VC=0
+DT=0x1e
+WC=3840
+LINES=4
+HBLANK=280
+# Line whose start is followed by a byte clock stall, which overflows the line buffer
+STALLED_LINE=2
+# Line buffer is generated with 128 words
+STALL=200
+# Pixel clock of the 1/1.001 frame rates, slower than the byte clock, so the line
+# buffer runs low by the end of each line
+SLOW_PIX_CLK_148_5MHZ = 2 * round(PIX_CLK_148_5MHZ * 1.001 / 2)
+
+
+def set_initial_values(dut):
+    dut.fv_i.value = 0
+    dut.lv_i.value = 0
+    dut.pix_data0_i.value = 0
+    dut.pix_data1_i.value = 0
+    dut.vc_i.value = VC
+    dut.dt_i.value = DT
+    dut.wc_i.value = WC
+
+
+async def packet_monitor(dut, packets):
+    while True:
+        await RisingEdge(dut.byte_clk)
+        await ReadOnly()
+        if dut.sp_en_o.value == 1:
+            packets.append("FS" if dut.dt_o.value == DT_FRAME_START else "FE")
+        if dut.lp_en_o.value == 1:
+            packets.append("N" if dut.dt_o.value == DT_NULL else "L")
+
+
+async def xfr_frame(dut, byte_clk_period, byte_clk_task):
+    pix_clk = dut.sys_clk
+    dut.fv_i.value = 1
+    await ClockCycles(pix_clk, HBLANK)
+    for line in range(LINES):
+        dut.lv_i.value = 1
+        dut.pix_data0_i.value = 0xef
+        dut.pix_data1_i.value = 0xbe
+        if byte_clk_task and line == STALLED_LINE:
+            # Byte clock domain notices the line start, then stops while pixels
+            # keep coming
+            await ClockCycles(dut.byte_clk, 2)
+            byte_clk_task.kill()
+            await ClockCycles(pix_clk, STALL)
+            cocotb.start_soon(Clock(dut.byte_clk, byte_clk_period, "ps").start())
+            await ClockCycles(pix_clk, WC // 2 - STALL)
+        else:
+            await ClockCycles(pix_clk, WC // 2)
+        dut.lv_i.value = 0
+        await ClockCycles(pix_clk, HBLANK)
+    dut.fv_i.value = 0
+    await ClockCycles(pix_clk, 4 * HBLANK)
+
+
+async def test_cmos2dphy_overflow_drop(dut, clock_period):
+    pix_clk = dut.sys_clk
+    pix_rst = dut.sys_rst
+    byte_clk = dut.byte_clk
+    byte_rst = dut.byte_rst
+    cocotb.start_soon(Clock(pix_clk, clock_period[0], "ps").start())
+    byte_clk_task = cocotb.start_soon(Clock(byte_clk, clock_period[1], "ps").start())
+
+    set_initial_values(dut)
+    await reset_module([pix_rst, byte_rst], pix_clk)
+
+    # Wait for D-PHY to be ready
+    await RisingEdge(dut.tinit_done_o)
+
+    # Omit first few frames due to deserializer timing characteristics
+    for _ in range(6):
+        dut.fv_i.value = 1
+        await ClockCycles(pix_clk, 5)
+        dut.fv_i.value = 0
+        await ClockCycles(pix_clk, 5)
+
+    packets = []
+    cocotb.start_soon(packet_monitor(dut, packets))
+
+    # Overflowing line is dropped along with the rest of the frame, if configured.
+    # HS mode is already entered for it, so it's replaced with a Null packet.
+    await xfr_frame(dut, clock_period[1], byte_clk_task)
+    if dut._name.endswith("drop_frame"):
+        expected = ["FS"] + ["L"] * STALLED_LINE + ["N", "FE"]
+    else:
+        expected = ["FS"] + ["L"] * STALLED_LINE + ["N"] + ["L"] * (LINES - STALLED_LINE - 1) + ["FE"]
+    assert packets == expected, "Packets of the overflowing frame: {}".format(packets)
+
+    # Following frame is sent entirely
+    packets.clear()
+    await xfr_frame(dut, clock_period[1], None)
+    assert packets == ["FS"] + ["L"] * LINES + ["FE"], "Packets of the next frame: {}".format(packets)
+
+
+def clip(frames):
+    for frame in range(frames):
+        yield np.stack([np.roll(bbb_line, 7 * line + 131 * frame) for line in range(LINES)])
+
+
+async def test_cmos2dphy_slow_pix_clk(dut):
+    pix_clk = dut.sys_clk
+    cocotb.start_soon(Clock(pix_clk, SLOW_PIX_CLK_148_5MHZ, "ps").start())
+    cocotb.start_soon(Clock(dut.byte_clk, BYTE_CLK_148_5MHZ, "ps").start())
+
+    set_initial_values(dut)
+    dut.wc_i.value = len(bbb_line) * 2
+    await reset_module([dut.sys_rst, dut.byte_rst], pix_clk)
+
+    monitor = DPHYMonitor(dut, lanes=2)
+    monitor.start()
+    timings = dict(H_SYNC=0, H_BACK_PORCH=HBLANK - 8, H_FRONT_PORCH=8,
+                   V_SYNC=1, V_BACK_PORCH=1, V_FRONT_PORCH=1)
+    source = VideoSource(dut, timings)
+
+    # Wait for D-PHY to be ready
+    await RisingEdge(dut.tinit_done_o)
+
+    # Omit first few frames due to deserializer timing characteristics
+    for _ in range(6):
+        dut.fv_i.value = 1
+        await ClockCycles(pix_clk, 5)
+        dut.fv_i.value = 0
+        await ClockCycles(pix_clk, 5)
+
+    # Line buffer doesn't overflow, so words are sent as they are buffered, without
+    # zeros of a dropped line
+    frames = list(clip(2))
+    await source.send(frames)
+    await ClockCycles(pix_clk, 500)
+
+    assert not monitor.errors, "CSI-2 protocol errors: {}".format(monitor.errors)
+    assert len(monitor.frames) == source.frames_sent, "Wrong number of received frames"
+    for i, (sent, received) in enumerate(zip(frames, monitor.frames)):
+        assert np.array_equal(received, sent), "Received frame {} differs from the sent one".format(i)
+
+
+tf = TestFactory(test_function=test_cmos2dphy_overflow_drop)
+tf.add_option(name="clock_period", optionlist=[
+    (PIX_CLK_74_25MHZ, BYTE_CLK_74_25MHZ),
+])
+tf.generate_tests()
+
+tf_slow = TestFactory(test_function=test_cmos2dphy_slow_pix_clk)
+tf_slow.generate_tests()
@@ -0,0 +1,98 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, RisingEdge
+from cocotb.regression import TestFactory
+from common import *
+from common import reset_module
+from dphy_monitor import DPHYMonitor
+from video_source import VideoSource
+import numpy as np
+
+VC=0
+DT=0x1e
+# Short lines keep the simulation time reasonable
+WC=256
+LINES=6
+
+
+def set_initial_values(dut):
+    dut.fv_i.value = 0
+    dut.lv_i.value = 0
+    dut.pix_data0_i.value = 0
+    dut.pix_data1_i.value = 0
+    dut.vc_i.value = VC
+    dut.dt_i.value = DT
+    dut.wc_i.value = WC
+
+
+def clip(frames):
+    for frame in range(frames):
+        yield np.stack([np.roll(bbb_line[:WC // 2], 7 * line + 131 * frame)
+                        for line in range(LINES)])
+
+
+async def test_cmos2dphy_pack_sync(dut, line_offset):
+    pix_clk = dut.sys_clk
+    pix_rst = dut.sys_rst
+    byte_clk = dut.byte_clk
+    byte_rst = dut.byte_rst
+    cocotb.start_soon(Clock(pix_clk, PIX_CLK_148_5MHZ, "ps").start())
+    cocotb.start_soon(Clock(byte_clk, BYTE_CLK_148_5MHZ, "ps").start())
+
+    set_initial_values(dut)
+    await reset_module([pix_rst, byte_rst], pix_clk)
+
+    monitor = DPHYMonitor(dut, lanes=2)
+    monitor.start()
+    # Without vertical front porch the first line starts line_offset cycles after
+    # the frame, in the same cycle if it is zero
+    timings = dict(H_SYNC=0, H_BACK_PORCH=line_offset, H_FRONT_PORCH=280 - line_offset,
+                   V_SYNC=1, V_BACK_PORCH=1, V_FRONT_PORCH=0)
+    source = VideoSource(dut, timings)
+
+    # Wait for D-PHY to be ready
+    await RisingEdge(dut.tinit_done_o)
+
+    # Omit first few frames due to deserializer timing characteristics
+    for _ in range(6):
+        dut.fv_i.value = 1
+        await ClockCycles(pix_clk, 5)
+        dut.fv_i.value = 0
+        await ClockCycles(pix_clk, 5)
+
+    frames = list(clip(2))
+    await source.send(frames)
+    await ClockCycles(pix_clk, 500)
+
+    assert not monitor.errors, "CSI-2 protocol errors: {}".format(monitor.errors)
+    assert len(monitor.frames) == source.frames_sent, "Wrong number of received frames"
+    for i, (sent, received) in enumerate(zip(frames, monitor.frames)):
+        assert np.array_equal(received, sent), "Received frame {} differs from the sent one".format(i)
+
+    # Frame Start is sent right before the first line, in the same HS transmission
+    starts = [transmission for transmission in monitor.transmissions
+              if DT_FRAME_START in transmission]
+    assert len(starts) == len(frames), "Wrong number of Frame Start packets"
+    for transmission in starts:
+        assert transmission[:2] == [DT_FRAME_START, DT], \
+            "Frame Start not packed with the first line: {}".format(transmission)
+    dut._log.info("Link statistics: {}".format(monitor.stats()))
+
+
+tf = TestFactory(test_function=test_cmos2dphy_pack_sync)
+tf.add_option(name="line_offset", optionlist=[0, 1, 40])
+tf.generate_tests()
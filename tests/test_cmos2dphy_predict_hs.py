@@ -0,0 +1,110 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, RisingEdge
+from cocotb.regression import TestFactory
+from common import *
+from common import reset_module
+
+VC=0
+DT=0x1e
+# Short lines keep the simulation time reasonable
+WC=256
+HBLANK=280
+LINES=6
+
+
+def set_initial_values(dut):
+    dut.fv_i.value = 0
+    dut.lv_i.value = 0
+    dut.pix_data0_i.value = 0
+    dut.pix_data1_i.value = 0
+    dut.vc_i.value = VC
+    dut.dt_i.value = DT
+    dut.wc_i.value = WC
+
+
+async def line_start_latency(dut, latency):
+    # Count byte clock cycles from the line start to the long packet request
+    while True:
+        await RisingEdge(dut.lv_i)
+        cycles = 0
+        while dut.lp_en_o.value == 0:
+            await RisingEdge(dut.byte_clk)
+            cycles += 1
+        latency.append(cycles)
+
+
+async def xfr_frame(dut, pix_clk):
+    dut.fv_i.value = 1
+    await ClockCycles(pix_clk, HBLANK)
+    for _ in range(LINES):
+        dut.lv_i.value = 1
+        dut.pix_data0_i.value = 0xef
+        dut.pix_data1_i.value = 0xbe
+        await ClockCycles(pix_clk, WC // 2)
+        dut.lv_i.value = 0
+        await ClockCycles(pix_clk, HBLANK)
+    dut.fv_i.value = 0
+    await ClockCycles(pix_clk, 4 * HBLANK)
+
+
+async def test_cmos2dphy_predict_hs(dut, clock_period):
+    pix_clk = dut.sys_clk
+    pix_rst = dut.sys_rst
+    byte_clk = dut.byte_clk
+    byte_rst = dut.byte_rst
+    dut_pix_clk = Clock(pix_clk, clock_period[0], "ps")
+    dut_byte_clk = Clock(byte_clk, clock_period[1], "ps")
+    cocotb.start_soon(dut_pix_clk.start())
+    cocotb.start_soon(dut_byte_clk.start())
+
+    set_initial_values(dut)
+    await reset_module([pix_rst, byte_rst], pix_clk)
+
+    # Wait for D-PHY to be ready
+    await RisingEdge(dut.tinit_done_o)
+
+    # Omit first few frames due to deserializer timing characteristics
+    for _ in range(6):
+        dut.fv_i.value = 1
+        await ClockCycles(pix_clk, 5)
+        dut.fv_i.value = 0
+        await ClockCycles(pix_clk, 5)
+
+    latency = []
+    cocotb.start_soon(line_start_latency(dut, latency))
+
+    # Line period and number of lines are learned during the first frame
+    await xfr_frame(dut, pix_clk)
+    learning = latency[:]
+    assert len(learning) == LINES, "Lines of the first frame not transmitted"
+
+    # HS mode is already entered when the following lines start
+    latency.clear()
+    await xfr_frame(dut, pix_clk)
+    assert len(latency) == LINES, "Lines of the second frame not transmitted"
+    assert latency[0] > max(latency[1:]), "HS mode predicted for the first line of a frame"
+    assert max(latency[1:]) < min(learning), "First byte latency not improved: {} vs {}".format(
+        latency[1:], learning)
+
+
+tf = TestFactory(test_function=test_cmos2dphy_predict_hs)
+tf.add_option(name="clock_period", optionlist=[
+    (PIX_CLK_74_25MHZ, BYTE_CLK_74_25MHZ),
+    (PIX_CLK_148_5MHZ, BYTE_CLK_148_5MHZ),
+])
+tf.generate_tests()
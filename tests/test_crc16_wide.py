@@ -0,0 +1,57 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+from common import bbb_line, bbb_line_crc
+from crc16 import crc16_reference
+from cocotb.triggers import Timer
+from cocotb.regression import TestFactory
+
+
+def line_to_bytes(line):
+    data = []
+    for word in line:
+        data += [word & 0xff, (word >> 8) & 0xff]
+    return data
+
+
+async def test_crc16_wide(dut, crc_test_case):
+    width = len(dut.data_i) // 8
+
+    if crc_test_case == "bbb_1":
+        data = line_to_bytes(bbb_line)
+        golden = bbb_line_crc
+    else:
+        # Random payload which does not fill the last word
+        random.seed(crc_test_case)
+        data = [random.randrange(256) for _ in range(random.randrange(1, 64) * width - 1)]
+        golden = crc16_reference(data)
+
+    crc = 0xffff
+    for i in range(0, len(data), width):
+        word = data[i:i + width]
+        dut.crc_i.value = crc
+        dut.data_i.value = sum(byte << (8 * j) for j, byte in enumerate(word))
+        dut.be_i.value = (1 << len(word)) - 1
+        await Timer(10)
+        crc = dut.crc_o.value.integer
+
+    # Add delay to separate tests on waveform
+    await Timer(100)
+    assert crc == golden, "Incorrect CRC: {crc_o}, should be: {golden}".format(
+            crc_o=hex(crc), golden=hex(golden))
+
+tf = TestFactory(test_function=test_crc16_wide)
+tf.add_option(name="crc_test_case", optionlist=["bbb_1", 1, 2, 3])
+tf.generate_tests()
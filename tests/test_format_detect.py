@@ -0,0 +1,125 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, RisingEdge
+from cocotb.regression import TestFactory
+from common import *
+from common import reset_module
+
+HBLANK = 20
+VBLANK = 30
+
+
+async def xfr_frame(dut, width, height, glitch=False):
+    clk = dut.sys_clk
+    dut.fv_i.value = 1
+    await ClockCycles(clk, VBLANK)
+    for line in range(height):
+        # A longer line keeps the line period
+        extra = 3 if glitch and line == height // 2 else 0
+        dut.lv_i.value = 1
+        await ClockCycles(clk, width + extra)
+        dut.lv_i.value = 0
+        await ClockCycles(clk, HBLANK - extra)
+    dut.fv_i.value = 0
+    await ClockCycles(clk, VBLANK)
+
+
+async def monitor_output(dut, frames):
+    """Collect passed frames as lists of [length, padded pixels] of their lines."""
+    fv_d = lv_d = 0
+    while True:
+        await RisingEdge(dut.sys_clk)
+        fv, lv, pad = dut.fv_o.value, dut.lv_o.value, dut.pad_o.value
+        if fv and not fv_d:
+            frames.append([])
+        if lv:
+            if not lv_d:
+                frames[-1].append([0, 0])
+            frames[-1][-1][0] += 1
+            frames[-1][-1][1] += int(pad)
+        fv_d, lv_d = fv, lv
+
+
+def check_format(dut, width, height, valid):
+    assert dut.valid_o.value == valid, "Wrong format validity"
+    assert dut.width_o.value == width, "Wrong active width"
+    assert dut.height_o.value == height, "Wrong active height"
+    assert dut.line_period_o.value == width + HBLANK, "Wrong line period"
+    assert dut.frame_period_o.value == 2 * VBLANK + height * (width + HBLANK), \
+        "Wrong frame period"
+
+
+async def test_format_detect(dut, clock_period):
+    cocotb.start_soon(Clock(dut.sys_clk, clock_period, "ps").start())
+    dut.fv_i.value = 0
+    dut.lv_i.value = 0
+    await reset_module([dut.sys_rst], dut.sys_clk)
+
+    # Format is valid once a frame matches the previous one, frame period is
+    # measured at the next frame start
+    await xfr_frame(dut, 64, 10)
+    assert dut.valid_o.value == 0, "Format valid after a single frame"
+    for _ in range(2):
+        await xfr_frame(dut, 64, 10)
+        check_format(dut, 64, 10, 1)
+
+    # Format change invalidates the measurement for a frame
+    await xfr_frame(dut, 40, 12)
+    assert dut.valid_o.value == 0, "Format valid after a change"
+    await xfr_frame(dut, 40, 12)
+    check_format(dut, 40, 12, 1)
+
+    # A single line of different width invalidates the frame
+    await xfr_frame(dut, 40, 12, glitch=True)
+    assert dut.valid_o.value == 0, "Format valid despite a line width glitch"
+    await xfr_frame(dut, 40, 12)
+    check_format(dut, 40, 12, 1)
+
+
+async def test_format_switch(dut, clock_period):
+    cocotb.start_soon(Clock(dut.sys_clk, clock_period, "ps").start())
+    dut.fv_i.value = 0
+    dut.lv_i.value = 0
+    await reset_module([dut.sys_rst], dut.sys_clk)
+    frames = []
+    cocotb.start_soon(monitor_output(dut, frames))
+
+    # Frames are passed once the format is valid
+    for _ in range(3):
+        await xfr_frame(dut, 64, 10)
+    assert frames == [[[64, 0]] * 10], "Wrong lines passed before the format change"
+
+    # First line of a narrower format is padded beyond the line blanking, the
+    # rest of the frame and the next one are dropped until the format is valid
+    for _ in range(3):
+        await xfr_frame(dut, 32, 12)
+    assert frames[1:] == [[[64, 32]], [[32, 0]] * 12], \
+        "Wrong lines passed after a switch to a narrower format: {}".format(frames[1:])
+
+    # First line of a wider format is cut
+    await xfr_frame(dut, 64, 10)
+    assert frames[3:] == [[[32, 0]]], \
+        "Wrong lines passed after a switch to a wider format: {}".format(frames[3:])
+
+
+tf = TestFactory(test_function=test_format_detect)
+tf.add_option(name="clock_period", optionlist=[PIX_CLK_74_25MHZ])
+tf.generate_tests()
+
+tf = TestFactory(test_function=test_format_switch)
+tf.add_option(name="clock_period", optionlist=[PIX_CLK_74_25MHZ])
+tf.generate_tests()
@@ -0,0 +1,74 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles
+from cocotb.regression import TestFactory
+from common import *
+from common import reset_module
+
+# Detector is generated with 2 frames and 4 lines
+LOCK_FRAMES = 2
+LINE_PERIOD = 50
+LINE_ACTIVE = 30
+VBLANK = 100
+
+
+async def xfr_frame(dut, lines, glitch=0):
+    clk = dut.sys_clk
+    dut.fv_i.value = 1
+    await ClockCycles(clk, VBLANK)
+    for line in range(lines):
+        dut.lv_i.value = 1
+        await ClockCycles(clk, LINE_ACTIVE)
+        dut.lv_i.value = 0
+        await ClockCycles(clk, LINE_PERIOD - LINE_ACTIVE + (glitch if line == 3 else 0))
+    dut.fv_i.value = 0
+    await ClockCycles(clk, VBLANK)
+    return dut.locked_o.value
+
+
+async def test_input_lock(dut, clock_period):
+    cocotb.start_soon(Clock(dut.sys_clk, clock_period, "ps").start())
+    dut.fv_i.value = 0
+    dut.lv_i.value = 0
+    await reset_module([dut.sys_rst], dut.sys_clk)
+
+    # Frames without lines never lock
+    for _ in range(6):
+        dut.fv_i.value = 1
+        await ClockCycles(dut.sys_clk, 5)
+        dut.fv_i.value = 0
+        await ClockCycles(dut.sys_clk, 5)
+    assert dut.locked_o.value == 0, "Locked to frames without lines"
+
+    # First frame is only a reference for the following ones
+    for frame in range(LOCK_FRAMES + 1):
+        locked = await xfr_frame(dut, 10)
+        assert locked == (frame == LOCK_FRAMES), "Wrong lock state after frame {}".format(frame)
+
+    # Change of the number of lines loses the lock until it is stable again
+    for frame in range(LOCK_FRAMES + 1):
+        locked = await xfr_frame(dut, 11)
+        assert locked == (frame == LOCK_FRAMES), "Wrong lock state after frame {}".format(frame)
+
+    # Line period jitter is tolerated, but a single longer line isn't
+    assert await xfr_frame(dut, 11, glitch=1) == 1, "Lock lost due to jitter"
+    assert await xfr_frame(dut, 11, glitch=10) == 0, "Lock kept despite a line period glitch"
+
+
+tf = TestFactory(test_function=test_input_lock)
+tf.add_option(name="clock_period", optionlist=[PIX_CLK_74_25MHZ])
+tf.generate_tests()
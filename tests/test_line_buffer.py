@@ -0,0 +1,82 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, ReadOnly, RisingEdge
+from cocotb.regression import TestFactory
+from common import *
+from common import bbb_line, reset_module
+
+# Line buffer is generated with 16 words and watermarks at 4 and 12 words
+DEPTH = 16
+ALMOST_EMPTY = 4
+ALMOST_FULL = 12
+
+
+async def write_words(dut, words):
+    for word in words:
+        dut.din.value = word
+        dut.we.value = 1
+        await RisingEdge(dut.sys_clk)
+    dut.we.value = 0
+
+
+async def test_line_buffer(dut, pix_clock_period, byte_clock_period):
+    cocotb.start_soon(Clock(dut.sys_clk, pix_clock_period, "ps").start())
+    cocotb.start_soon(Clock(dut.byte_clk, byte_clock_period, "ps").start())
+    dut.we.value = 0
+    dut.re.value = 0
+    await reset_module([dut.sys_rst, dut.byte_rst], dut.sys_clk)
+    await ClockCycles(dut.byte_clk, 2)
+
+    # Empty buffer is below the almost empty watermark
+    assert dut.readable.value == 0, "Empty buffer is readable"
+    assert dut.almost_empty.value == 1, "Empty buffer is not almost empty"
+    assert dut.level.value == 0, "Empty buffer level error"
+
+    # Fill the buffer up, the last word doesn't fit
+    mask = (1 << len(dut.din)) - 1
+    data = [pixel & mask for pixel in bbb_line[:DEPTH + 1]]
+    await write_words(dut, data)
+    await ReadOnly()
+    assert dut.writable.value == 0, "Full buffer is writable"
+    await ClockCycles(dut.byte_clk, 5)
+    await ReadOnly()
+    assert dut.level.value == DEPTH, "Full buffer level error"
+    assert dut.almost_empty.value == 0, "Full buffer is almost empty"
+    assert dut.almost_full.value == 1, "Full buffer is not almost full"
+
+    # Words are read in order, watermarks follow the level
+    received = []
+    while True:
+        await ReadOnly()
+        if dut.readable.value == 0:
+            break
+        level = dut.level.value.integer
+        assert dut.almost_full.value == (level >= ALMOST_FULL), "Almost full watermark error"
+        assert dut.almost_empty.value == (level < ALMOST_EMPTY), "Almost empty watermark error"
+        received.append(dut.dout.value.integer)
+        await RisingEdge(dut.byte_clk)
+        dut.re.value = 1
+        await RisingEdge(dut.byte_clk)
+        dut.re.value = 0
+    assert received == data[:DEPTH], "Line buffer data error"
+    assert dut.level.value == 0, "Emptied buffer level error"
+
+
+tf = TestFactory(test_function=test_line_buffer)
+tf.add_option(name="pix_clock_period", optionlist=[PIX_CLK_74_25MHZ, PIX_CLK_148_5MHZ])
+tf.add_option(name="byte_clock_period", optionlist=[BYTE_CLK_74_25MHZ])
+tf.generate_tests()
@@ -25,14 +25,23 @@ def set_initial_values(dut):
     dut.byte_or_pkt_data_en_i.value = 0
     dut.byte_or_pkt_data_i.value = 0
 
+def is_cont_clk(dut):
+    # Continuous clock variant is generated with a dedicated toplevel name
+    return "cont_clk" in dut._name
+
+
 def assert_stop_state(dut):
     assert dut.dphy_ready_o.value == 1
     assert dut.d_hs_rdy_o.value == 0
     assert dut.lp_tx_data_en_o.value == 1
     assert dut.lp_tx_data_p_o.value == 0b11
     assert dut.lp_tx_data_n_o.value == 0b11
-    assert dut.lp_tx_clk_p_o.value == 1
-    assert dut.lp_tx_clk_n_o.value == 1
+    if is_cont_clk(dut):
+        # Clock lane is kept in HS mode
+        assert dut.hs_clk_en_o.value == 1
+    else:
+        assert dut.lp_tx_clk_p_o.value == 1
+        assert dut.lp_tx_clk_n_o.value == 1
 
 
 async def request_hs_mode(dut):
@@ -84,8 +93,11 @@ async def tx_hs_to_lp(dut):
     await RisingEdge(dut.dphy_ready_o)
     assert dut.lp_tx_data_p_o.value == 0b11
     assert dut.lp_tx_data_n_o.value == 0b11
-    assert dut.lp_tx_clk_p_o.value == 1
-    assert dut.lp_tx_clk_n_o.value == 1
+    if is_cont_clk(dut):
+        assert dut.hs_clk_en_o.value == 1
+    else:
+        assert dut.lp_tx_clk_p_o.value == 1
+        assert dut.lp_tx_clk_n_o.value == 1
 
 
 async def test_mipi_dphy(dut, clock_period):
@@ -101,28 +113,37 @@ async def test_mipi_dphy(dut, clock_period):
 
     # Wait for initialization
     await RisingEdge(dut.tinit_done_o)
+
+    if is_cont_clk(dut):
+        # Clock lane switches to HS mode on its own after initialization
+        await clock_lp_to_hs(dut)
+        await RisingEdge(dut.dphy_ready_o)
+
     await RisingEdge(clk)
 
     # Ensure D-PHY starts in Stop State
     assert_stop_state(dut)
 
-    # Request HS mode and check if D-PHY received the request
-    await request_hs_mode(dut)
+    # Transfer two lines to check that D-PHY returns to a reusable Stop State
+    for _ in range(2):
+        # Request HS mode and check if D-PHY received the request
+        await request_hs_mode(dut)
 
-    # Wait for clock to switch to HS mode and check its lanes states
-    await clock_lp_to_hs(dut)
+        # Wait for clock to switch to HS mode and check its lanes states
+        if not is_cont_clk(dut):
+            await clock_lp_to_hs(dut)
 
-    # Wait for data lanes to initiate HS mode
-    await data_lp_to_hs(dut)
+        # Wait for data lanes to initiate HS mode
+        await data_lp_to_hs(dut)
 
-    # Do a full line transfer
-    await do_xfr_data(dut)
+        # Do a full line transfer
+        await do_xfr_data(dut)
 
-    # Initiate HS mode disable
-    await tx_hs_to_lp(dut)
+        # Initiate HS mode disable
+        await tx_hs_to_lp(dut)
 
-    # Ensure D-PHY is back in Stop State
-    assert_stop_state(dut)
+        # Ensure D-PHY is back in Stop State
+        assert_stop_state(dut)
 
 
 tf = TestFactory(test_function=test_mipi_dphy)
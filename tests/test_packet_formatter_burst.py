@@ -0,0 +1,107 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from common import *
+from common import bbb_line, bbb_line_crc
+from common import reset_module, gen_ecc
+from packet_formatter import null_packet
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from cocotb.regression import TestFactory
+
+
+# Helper simulation functions -------------------------------------------------
+def bytes2int(data):
+    return sum(byte << (8 * i) for i, byte in enumerate(data))
+
+
+def int2bytes(value, length):
+    return [(value >> (8 * i)) & 0xff for i in range(length)]
+
+
+def trail(byte):
+    return 0x00 if byte & 0x80 else 0xff
+
+
+async def collect_words(dut, words):
+    clk = dut.sys_clk
+    lanes = len(dut.data_o) // 8
+    data = []
+    for _ in range(words):
+        await RisingEdge(clk)
+        dut.lp_en_i.value = 0
+        data += int2bytes(dut.data_o.value.integer, lanes)
+    return data
+
+
+async def send_payload(dut, data):
+    clk = dut.sys_clk
+    lanes = len(dut.data_o) // 8
+    for i in range(0, len(data), lanes):
+        dut.byte_data_i.value = bytes2int(data[i:i + lanes])
+        await RisingEdge(clk)
+
+
+# Tests -----------------------------------------------------------------------
+async def test_line_burst(dut, dt, clock_period, line_test_case):
+    clk = dut.sys_clk
+    dut_clk = Clock(clk, clock_period, "ps")
+    cocotb.start_soon(dut_clk.start())
+    await reset_module([dut.sys_rst], clk)
+    lanes = len(dut.data_o) // 8
+    wc = 3840
+
+    if line_test_case == "bbb_1":
+        test_case = (bbb_line, bbb_line_crc)
+    data = []
+    for pixel in test_case[0]:
+        data += int2bytes(pixel, 2)
+    crc = int2bytes(test_case[1], 2)
+    header = [dt, wc & 0xff, wc >> 8, gen_ecc((wc << 8) | dt)]
+    line_end = crc + null_packet(4) + null_packet(2)
+
+    dut.vc_i.value = 0
+    dut.wc_i.value = wc
+    dut.dt_i.value = dt
+    dut.burst_i.value = 1
+
+    # The first line starts with HS Init sequence
+    dut.lp_en_i.value = 1
+    assert await collect_words(dut, 1) == [0xb8] * lanes, "Initialization sequence error"
+    assert await collect_words(dut, 4 // lanes) == header, "Packet header error"
+    await send_payload(dut, data)
+
+    # Line is followed by Null packets, next header is sent without HS Init sequence
+    dut.crc_i.value = test_case[1]
+    dut.lp_en_i.value = 1
+    burst = await collect_words(dut, (len(line_end) + 4) // lanes)
+    assert burst == line_end + header, "Null packets or chained header error"
+    assert dut.ld_pyld_o.value == 1, "Payload load not requested"
+    assert dut.burst_o.value == 1, "Burst not reported"
+    await send_payload(dut, data)
+
+    # Burst ends after the current Null packet
+    dut.crc_i.value = test_case[1]
+    dut.burst_i.value = 0
+    burst = await collect_words(dut, len(line_end) // lanes + 1)
+    lane_trail = [trail(byte) for byte in line_end[-lanes:]]
+    assert burst == line_end + lane_trail, "Wrong HS-Trail value"
+
+
+tf_lb = TestFactory(test_function=test_line_burst)
+tf_lb.add_option(name="clock_period", optionlist=[BYTE_CLK_74_25MHZ])
+tf_lb.add_option(name="dt", optionlist=[0x1e])
+tf_lb.add_option(name="line_test_case", optionlist=["bbb_1"])
+tf_lb.generate_tests()
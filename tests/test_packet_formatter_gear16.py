@@ -0,0 +1,141 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from common import *
+from common import bbb_line, bbb_line_crc
+from common import reset_module, gen_ecc
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from cocotb.regression import TestFactory
+
+
+# Helper simulation functions -------------------------------------------------
+def bytes2int(data):
+    return sum(byte << (8 * i) for i, byte in enumerate(data))
+
+
+def int2bytes(value, length):
+    return [(value >> (8 * i)) & 0xff for i in range(length)]
+
+
+def trail(byte):
+    return 0x00 if byte & 0x80 else 0xff
+
+
+async def check_packet_header(dut, dt, wc, vc=0):
+    clk = dut.sys_clk
+    lanes = len(dut.data_o) // 16
+
+    # Test virtual channel 0 only
+    dut.vc_i.value = vc
+    # Short packets are always 0 words
+    dut.wc_i.value = wc
+    # Data type should be set for a whole time
+    dut.dt_i.value = dt
+
+    # HS Zero is extended and followed by init sequence (2 lanes) or header (4 lanes)
+    await RisingEdge(clk)
+    dut.sp_en_i.value = 0
+    dut.lp_en_i.value = 0
+    if lanes == 2:
+        assert dut.data_o.value == HS_INIT_SEQ << 16, "Initialization sequence error"
+    else:
+        assert dut.data_o.value == 0, "Initialization sequence error"
+
+    await RisingEdge(clk)
+    ecc = gen_ecc((wc << 8) | dt)
+    header = [dt & 0xff, wc & 0xff, (wc >> 8) & 0xff, ecc]
+    if lanes == 4:
+        header = [HS_INIT_SEQ & 0xff] * 4 + header
+    assert dut.data_o.value == bytes2int(header), "Packet header error"
+
+    return header
+
+
+async def check_eot(dut, last_word):
+    clk = dut.sys_clk
+    lanes = len(dut.data_o) // 16
+    await RisingEdge(clk)
+
+    # Last byte of every lane is sent in the second half of the word
+    lane_trail = [trail(byte) for byte in last_word[lanes:]]
+    assert dut.data_o.value == bytes2int(lane_trail * 2), "Wrong HS-Trail value"
+
+
+# Tests -----------------------------------------------------------------------
+async def test_short_packet(dut, dt, clock_period):
+    clk = dut.sys_clk
+    dut_clk = Clock(clk, clock_period, "ps")
+    cocotb.start_soon(dut_clk.start())
+    await reset_module([dut.sys_rst], clk)
+
+    # Request short packet transfer
+    dut.sp_en_i.value = 1
+
+    header = await check_packet_header(dut, dt, 0)
+    await check_eot(dut, header)
+
+    # Inititate init sequence
+    await RisingEdge(clk)
+
+
+async def test_long_packet(dut, dt, clock_period, line_test_case):
+    clk = dut.sys_clk
+    dut_clk = Clock(clk, clock_period, "ps")
+    cocotb.start_soon(dut_clk.start())
+    await reset_module([dut.sys_rst], clk)
+    lanes = len(dut.data_o) // 16
+    wc = 3840
+
+    if line_test_case == "bbb_1":
+        test_case = (bbb_line, bbb_line_crc)
+    data = []
+    for pixel in test_case[0]:
+        data += int2bytes(pixel, 2)
+    crc = test_case[1]
+
+    # Request long packet transfer
+    dut.lp_en_i.value = 1
+
+    await check_packet_header(dut, dt, wc)
+    for i in range(0, wc, lanes * 2):
+        dut.byte_data_i.value = bytes2int(data[i:i + lanes * 2])
+        await RisingEdge(clk)
+
+    # CRC is sent on lanes 0 and 1, other lanes start HS Trail right away
+    lane_trail = [trail(byte) for byte in data[-lanes:]]
+    crc_word = int2bytes(crc, 2)
+    lane_trail[:2] = [trail(byte) for byte in crc_word]
+    crc_word += [lane_trail[i % lanes] for i in range(2, lanes * 2)]
+
+    dut.crc_i.value = crc
+    await RisingEdge(clk)
+    assert dut.data_o.value == bytes2int(crc_word), "Packet footer error (CRC)"
+
+    # Second half of the CRC word already holds HS Trail of every lane
+    await RisingEdge(clk)
+    assert dut.data_o.value == bytes2int(crc_word[lanes:] * 2), "Wrong HS-Trail value"
+
+
+tf_sp = TestFactory(test_function=test_short_packet)
+tf_sp.add_option(name="clock_period", optionlist=[BYTE_CLK_37_125MHZ])
+tf_sp.add_option(name="dt", optionlist=[0, 1])
+tf_sp.generate_tests()
+
+tf_lp = TestFactory(test_function=test_long_packet)
+tf_lp.add_option(name="clock_period", optionlist=[BYTE_CLK_37_125MHZ])
+tf_lp.add_option(name="dt", optionlist=[0x1e])
+tf_lp.add_option(name="line_test_case", optionlist=["bbb_1"])
+tf_lp.generate_tests()
@@ -0,0 +1,101 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from common import *
+from common import bbb_line, bbb_line_crc
+from common import reset_module, gen_ecc
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from cocotb.regression import TestFactory
+
+
+# Helper simulation functions -------------------------------------------------
+def bytes2int(data):
+    return sum(byte << (8 * i) for i, byte in enumerate(data))
+
+
+def int2bytes(value, length):
+    return [(value >> (8 * i)) & 0xff for i in range(length)]
+
+
+def trail(byte):
+    return 0x00 if byte & 0x80 else 0xff
+
+
+async def collect_words(dut, words):
+    clk = dut.sys_clk
+    lanes = len(dut.data_o) // 8
+    data = []
+    for _ in range(words):
+        await RisingEdge(clk)
+        dut.lp_en_i.value = 0
+        data += int2bytes(dut.data_o.value.integer, lanes)
+    return data
+
+
+async def send_payload(dut, data):
+    clk = dut.sys_clk
+    lanes = len(dut.data_o) // 8
+    for i in range(0, len(data), lanes):
+        dut.byte_data_i.value = bytes2int(data[i:i + lanes])
+        await RisingEdge(clk)
+
+
+# Tests -----------------------------------------------------------------------
+async def test_frame_sync_packing(dut, dt, clock_period, line_test_case):
+    clk = dut.sys_clk
+    dut_clk = Clock(clk, clock_period, "ps")
+    cocotb.start_soon(dut_clk.start())
+    await reset_module([dut.sys_rst], clk)
+    lanes = len(dut.data_o) // 8
+    wc = 3840
+
+    if line_test_case == "bbb_1":
+        test_case = (bbb_line, bbb_line_crc)
+    data = []
+    for pixel in test_case[0]:
+        data += int2bytes(pixel, 2)
+    header = [dt, wc & 0xff, wc >> 8, gen_ecc((wc << 8) | dt)]
+    frame_start = [DT_FRAME_START, 0, 0, gen_ecc(DT_FRAME_START)]
+    frame_end = [DT_FRAME_END, 0, 0, gen_ecc(DT_FRAME_END)]
+
+    dut.vc_i.value = 0
+    dut.wc_i.value = wc
+    dut.dt_i.value = dt
+
+    # Frame Start is sent between HS Init sequence and the long packet header
+    dut.frame_start_i.value = 1
+    dut.lp_en_i.value = 1
+    assert await collect_words(dut, 1) == [0xb8] * lanes, "Initialization sequence error"
+    dut.frame_start_i.value = 0
+    assert await collect_words(dut, 8 // lanes) == frame_start + header, "Frame Start or header error"
+
+    # Frame End follows CRC, then each lane inverts its last byte for HS Trail
+    dut.frame_end_i.value = 1
+    await send_payload(dut, data)
+    dut.crc_i.value = test_case[1]
+    footer = int2bytes(test_case[1], 2) + frame_end
+    words = -(-len(footer) // lanes) + 1
+    burst = await collect_words(dut, words)
+    lane_trail = [trail(footer[max(j for j in range(len(footer)) if j % lanes == k % lanes)])
+                  for k in range(len(footer), words * lanes)]
+    assert burst == footer + lane_trail, "Frame End or HS-Trail error"
+
+
+tf_fsp = TestFactory(test_function=test_frame_sync_packing)
+tf_fsp.add_option(name="clock_period", optionlist=[BYTE_CLK_74_25MHZ])
+tf_fsp.add_option(name="dt", optionlist=[0x1e])
+tf_fsp.add_option(name="line_test_case", optionlist=["bbb_1"])
+tf_fsp.generate_tests()
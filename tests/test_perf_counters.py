@@ -0,0 +1,111 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, FallingEdge
+from cocotb.regression import TestFactory
+from common import *
+from common import reset_module
+from perf_counters import PERF_COUNTERS
+from uart_bridge import CMD_CLEAR, REG_BYTES
+
+# Bridge is generated with 16 clock cycles per bit
+BIT_CYCLES = 16
+
+
+async def uart_send(dut, byte):
+    for bit in [0] + [(byte >> i) & 1 for i in range(8)] + [1]:
+        dut.rx_i.value = bit
+        await ClockCycles(dut.sys_clk, BIT_CYCLES)
+
+
+async def uart_receive(dut):
+    await FallingEdge(dut.tx_o)
+    await ClockCycles(dut.sys_clk, BIT_CYCLES // 2)
+    assert dut.tx_o.value == 0, "Start bit error"
+    byte = 0
+    for i in range(8):
+        await ClockCycles(dut.sys_clk, BIT_CYCLES)
+        byte |= dut.tx_o.value.integer << i
+    await ClockCycles(dut.sys_clk, BIT_CYCLES)
+    assert dut.tx_o.value == 1, "Stop bit error"
+    return byte
+
+
+async def uart_receive_value(dut):
+    value = 0
+    for i in range(REG_BYTES):
+        value |= await uart_receive(dut) << (8 * i)
+    return value
+
+
+async def read_counter(dut, name):
+    adr = [counter for counter, _ in PERF_COUNTERS].index(name)
+    response = cocotb.start_soon(uart_receive_value(dut))
+    await uart_send(dut, adr)
+    return await response
+
+
+async def pulse(dut, signal, count):
+    for _ in range(count):
+        signal.value = 1
+        await ClockCycles(dut.sys_clk, 1)
+        signal.value = 0
+        await ClockCycles(dut.sys_clk, 1)
+
+
+async def test_perf_counters(dut, clock_period):
+    cocotb.start_soon(Clock(dut.sys_clk, clock_period, "ps").start())
+    dut.rx_i.value = 1
+    for name, _ in PERF_COUNTERS:
+        getattr(dut, name + "_i").value = 0
+    await reset_module([dut.sys_rst], dut.sys_clk)
+
+    # Events are counted on every cycle they are high
+    await pulse(dut, dut.frames_sent_i, 3)
+    await pulse(dut, dut.lines_sent_i, 1080)
+    dut.tx_data_enable_cycles_i.value = 1
+    await ClockCycles(dut.sys_clk, 100)
+    dut.tx_data_enable_cycles_i.value = 0
+
+    # High water mark keeps the highest value
+    for level in [3, 9, 5]:
+        dut.fifo_high_water_i.value = level
+        await ClockCycles(dut.sys_clk, 1)
+    dut.fifo_high_water_i.value = 0
+
+    # Values follow their event
+    for phase in [1, 5, 3]:
+        dut.boot_phase_i.value = phase
+        await ClockCycles(dut.sys_clk, 1)
+
+    assert await read_counter(dut, "frames_sent") == 3, "Frames sent counter error"
+    assert await read_counter(dut, "lines_sent") == 1080, "Lines sent counter error"
+    assert await read_counter(dut, "tx_data_enable_cycles") == 100, "State cycles counter error"
+    assert await read_counter(dut, "fifo_high_water") == 9, "High water mark error"
+    assert await read_counter(dut, "hs_bursts") == 0, "Idle counter error"
+    assert await read_counter(dut, "boot_phase") == 3, "Value register error"
+    dut.boot_phase_i.value = 0
+
+    # Clear command sets all counters to 0
+    await uart_send(dut, CMD_CLEAR)
+    await ClockCycles(dut.sys_clk, 2)
+    for name, _ in PERF_COUNTERS:
+        assert await read_counter(dut, name) == 0, "Counter {} not cleared".format(name)
+
+
+tf = TestFactory(test_function=test_perf_counters)
+tf.add_option(name="clock_period", optionlist=[PIX_CLK_74_25MHZ])
+tf.generate_tests()
@@ -0,0 +1,82 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles
+from cocotb.regression import TestFactory
+from common import *
+from reset_sequencer import BOOT_PHASES
+
+# Sequencer is generated for 10 MHz hfc clock and 10 us reset delay
+HFC_CLK_10MHZ = 100000
+DES_RESET_CYCLES = 10
+RESET_DELAY_CYCLES = 100
+PLL_LOCK_EXT_CYCLES = 31
+# Synchronizers between the clock domains
+SYNC_CYCLES = 4
+
+
+def phase(dut):
+    return BOOT_PHASES[dut.phase_o.value.integer]
+
+
+async def test_reset_sequencer(dut, clock_period):
+    cocotb.start_soon(Clock(dut.hfc_clk, HFC_CLK_10MHZ, "ps").start())
+    cocotb.start_soon(Clock(dut.sys_clk, clock_period, "ps").start())
+    dut.pll_lock_i.value = 0
+    dut.tinit_done_i.value = 0
+    dut.streaming_i.value = 0
+
+    await ClockCycles(dut.hfc_clk, DES_RESET_CYCLES // 2)
+    assert phase(dut) == "DES_RESET", "Deserializer released from reset too early"
+    await ClockCycles(dut.hfc_clk, DES_RESET_CYCLES)
+    assert dut.des_reset_n_o.value == 1, "Deserializer not released from reset"
+    assert phase(dut) == "PLL_LOCK", "Wrong phase while waiting for PLL lock"
+
+    # Reset is held until the PLL has been locked for the whole delay
+    await ClockCycles(dut.hfc_clk, 2 * RESET_DELAY_CYCLES)
+    assert dut.sys_rst_o.value == 1, "Reset released without PLL lock"
+    dut.pll_lock_i.value = 1
+    await ClockCycles(dut.hfc_clk, SYNC_CYCLES)
+    assert phase(dut) == "RESET_DELAY", "Wrong phase after PLL lock"
+    await ClockCycles(dut.hfc_clk, RESET_DELAY_CYCLES - 2 * SYNC_CYCLES)
+    assert dut.sys_rst_o.value == 1, "Reset released before the delay"
+    await ClockCycles(dut.hfc_clk, 2 * SYNC_CYCLES)
+    await ClockCycles(dut.sys_clk, SYNC_CYCLES)
+    assert dut.sys_rst_o.value == 0, "Reset not released after the delay"
+    assert phase(dut) == "TINIT", "Wrong phase after reset release"
+
+    # Later phases are reported by the D-PHY and the frame logic
+    dut.tinit_done_i.value = 1
+    await ClockCycles(dut.hfc_clk, SYNC_CYCLES)
+    assert phase(dut) == "FRAME_WAIT", "Wrong phase after D-PHY initialization"
+    dut.streaming_i.value = 1
+    await ClockCycles(dut.hfc_clk, SYNC_CYCLES)
+    assert phase(dut) == "STREAMING", "Wrong phase after first frame"
+
+    # Reset is extended after the PLL lock is restored
+    dut.pll_lock_i.value = 0
+    await ClockCycles(dut.hfc_clk, SYNC_CYCLES)
+    assert phase(dut) == "PLL_LOCK", "Wrong phase after PLL lock loss"
+    dut.pll_lock_i.value = 1
+    await ClockCycles(dut.hfc_clk, SYNC_CYCLES)
+    assert dut.sys_rst_o.value == 1, "Reset not extended after PLL lock loss"
+    await ClockCycles(dut.hfc_clk, PLL_LOCK_EXT_CYCLES + SYNC_CYCLES)
+    assert dut.sys_rst_o.value == 0, "Reset not released after PLL lock loss"
+
+
+tf = TestFactory(test_function=test_reset_sequencer)
+tf.add_option(name="clock_period", optionlist=[PIX_CLK_74_25MHZ])
+tf.generate_tests()
@@ -0,0 +1,99 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from types import SimpleNamespace
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, RisingEdge
+from cocotb.regression import TestFactory
+from common import *
+from dphy_monitor import DPHYLaneMonitor
+from pattern_gen import hv_timings
+from video_source import VideoSource
+import numpy as np
+
+# Frames are sent with short vertical blanking to keep the simulation short
+TIMINGS = dict(hv_timings["1080p60"], V_SYNC=1, V_BACK_PORCH=1, V_FRONT_PORCH=1)
+
+
+class Inverted:
+    """Handle driving the inverted value, frame and line valid are passed to Top
+    as deserializer blanking."""
+    def __init__(self, handle):
+        self.handle = handle
+
+    @property
+    def value(self):
+        return int(not self.handle.value)
+
+    @value.setter
+    def value(self, value):
+        self.handle.value = int(not value)
+
+
+def clip(frames, lines):
+    for frame in range(frames):
+        yield np.stack([np.roll(bbb_line, 7 * line + 131 * frame) for line in range(lines)])
+
+
+async def test_top_dphy_model(dut, lines):
+    lanes = 4 if "4lanes" in dut._name else 2
+    gear = 16 if "gear16" in dut._name else 8
+    pix_clk = dut.deserializer_pix_clk_o
+    cocotb.start_soon(Clock(pix_clk, PIX_CLK_148_5MHZ, "ps").start())
+    dut.deserializer_pll_lock_o.value = 1
+
+    cmos = SimpleNamespace(
+        fv_i=Inverted(dut.deserializer_vblank_o),
+        lv_i=Inverted(dut.deserializer_hblank_o),
+        pix_data0_i=dut.deserializer_data_2to9_o,
+        pix_data1_i=dut.deserializer_data_12to19_o,
+    )
+    source = VideoSource(cmos, TIMINGS, pix_clk)
+    source.idle()
+
+    monitor = DPHYLaneMonitor(
+        dut.mipi_dphy_clk_p_o,
+        [getattr(dut, "mipi_dphy_d{}_p_o".format(i)) for i in range(lanes)],
+        [getattr(dut, "mipi_dphy_d{}_n_o".format(i)) for i in range(lanes)],
+        gear=gear,
+    )
+    monitor.start()
+
+    # D-PHY initialization is reported on the user LED, it's done once per simulation
+    if not dut.user_led_o.value:
+        await RisingEdge(dut.user_led_o)
+
+    # Omit first few frames due to deserializer timing characteristics
+    for _ in range(6):
+        cmos.fv_i.value = 1
+        await ClockCycles(pix_clk, 5)
+        cmos.fv_i.value = 0
+        await ClockCycles(pix_clk, 5)
+
+    frames = list(clip(2, lines))
+    await source.send(frames)
+    await ClockCycles(pix_clk, 500)
+
+    assert not monitor.errors, "CSI-2 protocol errors: {}".format(monitor.errors)
+    assert dut.DPHY.errors.value == 0, "D-PHY model reported protocol violations"
+    assert len(monitor.frames) == source.frames_sent, "Wrong number of received frames"
+    for i, (sent, received) in enumerate(zip(frames, monitor.frames)):
+        assert np.array_equal(received, sent), "Received frame {} differs from the sent one".format(i)
+    dut._log.info("Link statistics: {}".format(monitor.stats()))
+
+
+tf = TestFactory(test_function=test_top_dphy_model)
+tf.add_option(name="lines", optionlist=[1, 4])
+tf.generate_tests()
@@ -0,0 +1,260 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+
+# Throughput model is imported before tests/common.py, which shadows src/common.py
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+from common import get_timings
+from throughput_model import ThroughputModel, pll_ppm
+del sys.modules["common"]
+sys.path.remove(SRC_DIR)
+
+from types import SimpleNamespace
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, FallingEdge, RisingEdge, Timer
+from cocotb.regression import TestFactory
+from cocotb.utils import get_sim_time
+from common import *
+from csi2_model import DT_YUV422_8BIT
+from dphy_monitor import DPHYLaneMonitor
+from perf_counters import PERF_COUNTERS
+from pattern_gen import hv_timings
+from reset_sequencer import BOOT_PHASES
+from test_top_dphy_model import Inverted
+from uart_bridge import CMD_CLEAR, REG_BYTES
+from video_source import VideoSource
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import perf_reader
+
+# Top is generated with --perf-baudrate 7500000 and --buffer-depth 128
+BIT_TIME = round(1e12 / 7500000)
+BUFFER_DEPTH = 128
+# Narrow frames keep the simulation short, the format is measured by Top
+WIDTH = 256
+LINES = 4
+TIMINGS = dict(hv_timings["1080p60"], V_SYNC=1, V_BACK_PORCH=1, V_FRONT_PORCH=1)
+# Horizontal blanking shorter than the HS round trip makes the line buffer overflow
+SHORT_HBLANK_TIMINGS = dict(TIMINGS, H_SYNC=0, H_BACK_PORCH=4, H_FRONT_PORCH=4)
+# Frames gated by the format measurement, then rejected by CMOS2DPHY
+MEASURED_FRAMES = 2
+REJECTED_FRAMES = 6
+# Throughput model matches the RTL up to a few cycles of clock domain crossing
+MODEL_TOLERANCE_WORDS = 2
+
+
+class RecordedPort:
+    """Serial port replaying responses recorded in simulation, so that they are
+    decoded by perf_reader like the ones of the board."""
+    def __init__(self, responses):
+        self.responses = responses
+        self.adr = None
+
+    def write(self, data):
+        self.adr = data[0]
+
+    def read(self, size):
+        return self.responses[self.adr][:size]
+
+
+async def uart_send(dut, byte):
+    for bit in [0] + [(byte >> i) & 1 for i in range(8)] + [1]:
+        dut.perf_uart_rx_i.value = bit
+        await Timer(BIT_TIME, "ps")
+
+
+async def uart_receive(dut, count):
+    data = []
+    for _ in range(count):
+        await FallingEdge(dut.perf_uart_tx_o)
+        await Timer(BIT_TIME // 2, "ps")
+        assert dut.perf_uart_tx_o.value == 0, "Start bit error"
+        byte = 0
+        for i in range(8):
+            await Timer(BIT_TIME, "ps")
+            byte |= dut.perf_uart_tx_o.value.integer << i
+        await Timer(BIT_TIME, "ps")
+        assert dut.perf_uart_tx_o.value == 1, "Stop bit error"
+        data.append(byte)
+    return bytes(data)
+
+
+async def read_counters(dut):
+    responses = {}
+    for adr in range(len(PERF_COUNTERS)):
+        response = cocotb.start_soon(uart_receive(dut, REG_BYTES))
+        await uart_send(dut, adr)
+        responses[adr] = await response
+    return perf_reader.read_counters(RecordedPort(responses))
+
+
+async def line_starts(dut, times):
+    while True:
+        await FallingEdge(dut.deserializer_hblank_o)
+        times.append(get_sim_time("ns"))
+
+
+def clip(frames, first=0, width=WIDTH):
+    for frame in range(first, first + frames):
+        yield np.stack([np.roll(bbb_line, 7 * line + 131 * frame)[:width] for line in range(LINES)])
+
+
+async def start(dut):
+    """Start the pixel clock and the lane monitor, then wait for D-PHY initialization."""
+    pix_clk = dut.deserializer_pix_clk_o
+    cocotb.start_soon(Clock(pix_clk, PIX_CLK_148_5MHZ, "ps").start())
+    dut.deserializer_pll_lock_o.value = 1
+    dut.perf_uart_rx_i.value = 1
+
+    cmos = SimpleNamespace(
+        fv_i=Inverted(dut.deserializer_vblank_o),
+        lv_i=Inverted(dut.deserializer_hblank_o),
+        pix_data0_i=dut.deserializer_data_2to9_o,
+        pix_data1_i=dut.deserializer_data_12to19_o,
+    )
+    VideoSource(cmos, TIMINGS, pix_clk).idle()
+
+    monitor = DPHYLaneMonitor(
+        dut.mipi_dphy_clk_p_o,
+        [getattr(dut, "mipi_dphy_d{}_p_o".format(i)) for i in range(2)],
+        [getattr(dut, "mipi_dphy_d{}_n_o".format(i)) for i in range(2)],
+    )
+    monitor.start()
+
+    if not dut.user_led_o.value:
+        await RisingEdge(dut.user_led_o)
+    return pix_clk, cmos, monitor
+
+
+async def test_top_perf_counters(dut):
+    fast_relock = "drop_frame" in dut._name
+    pix_clk, cmos, monitor = await start(dut)
+    source = VideoSource(cmos, TIMINGS, pix_clk)
+    overflow_source = VideoSource(cmos, SHORT_HBLANK_TIMINGS, pix_clk)
+
+    counters = await read_counters(dut)
+    perf_reader.print_counters(counters)
+    assert BOOT_PHASES[counters["boot_phase"]] == "FRAME_WAIT", "Wrong boot phase before frames"
+    assert counters["frames_sent"] == 0, "Frames counted before any input"
+
+    # Format is measured on the first frames, the following ones are rejected
+    # due to deserializer timing characteristics
+    await source.send(clip(MEASURED_FRAMES + REJECTED_FRAMES))
+    assert not monitor.frames, "Frames sent before the format is measured"
+
+    # Good frames around the overflowing ones. The first frame of another line
+    # period invalidates the measured format, so the following one is dropped.
+    sources = [source] * 2 + [overflow_source] * 3 + [source] * 3
+    previous = [source] * 2 + sources
+    frames = []
+    for i, frame in enumerate(clip(len(sources), MEASURED_FRAMES + REJECTED_FRAMES)):
+        await sources[i].send_frame(frame)
+        if previous[i] is previous[i + 1]:
+            frames.append(frame)
+
+    # PLL lock loss in vertical blanking, the boot phase follows it
+    lock_losses = 0
+    if fast_relock:
+        dut.deserializer_pll_lock_o.value = 0
+        counters = await read_counters(dut)
+        assert BOOT_PHASES[counters["boot_phase"]] == "PLL_LOCK", "Lock loss not reported"
+        dut.deserializer_pll_lock_o.value = 1
+        lock_losses = 1
+        frames += list(clip(1, MEASURED_FRAMES + REJECTED_FRAMES + len(sources)))
+        await source.send(frames[-1:])
+    await ClockCycles(pix_clk, 500)
+
+    counters = await read_counters(dut)
+    perf_reader.print_counters(counters)
+    assert not monitor.errors, "CSI-2 protocol errors: {}".format(monitor.errors)
+    assert dut.DPHY.errors.value == 0, "D-PHY model reported protocol violations"
+
+    sent_lines = [line for frame in frames for line in frame]
+    received_lines = [line for frame in monitor.frames for line in frame]
+    torn_lines = sum(not any(np.array_equal(line, sent) for sent in sent_lines)
+                     for line in received_lines)
+    assert counters["boot_phase"] == BOOT_PHASES.index("STREAMING"), "Wrong boot phase"
+    assert counters["frames_rejected"] == REJECTED_FRAMES, "Wrong number of rejected frames"
+    assert counters["frames_sent"] == len(monitor.frames), "Wrong number of sent frames"
+    assert counters["lines_sent"] == len(received_lines), "Wrong number of sent lines"
+    assert counters["hs_bursts"] == len(monitor.transmissions), "Wrong number of HS bursts"
+    assert counters["fifo_high_water"] == BUFFER_DEPTH, "Line buffer not reported full"
+    assert counters["pll_lock_losses"] == lock_losses, "Wrong number of PLL lock losses"
+    assert counters["active_width"] == WIDTH, "Wrong measured width"
+    assert counters["active_height"] == LINES, "Wrong measured height"
+    assert counters["fifo_overflows"] > 0, "Line buffer didn't overflow"
+    if fast_relock:
+        # Overflowing frames are cut, so is the lock loss, even between frames
+        cut_frames = sum(len(frame) < LINES for frame in monitor.frames)
+        assert counters["frames_dropped"] == counters["fifo_overflows"] + lock_losses, \
+            "Overflows and lock losses don't match dropped frames"
+        assert counters["frames_dropped"] == cut_frames + lock_losses, \
+            "Wrong number of dropped frames"
+        assert counters["lines_dropped"] == 0, "Lines dropped with the frame policy"
+        assert np.array_equal(monitor.frames[-1], frames[-1]), "Frame after the relock differs"
+    else:
+        # Overflowing lines are dropped, or padded if their packet has already started
+        assert counters["lines_dropped"] + counters["lines_padded"] == counters["fifo_overflows"], \
+            "Overflows don't match dropped and padded lines"
+        assert counters["lines_dropped"] == len(sent_lines) - len(received_lines), \
+            "Wrong number of dropped lines"
+        assert counters["lines_padded"] == torn_lines, "Wrong number of padded lines"
+        assert counters["frames_dropped"] == 0, "Frames dropped with the line policy"
+    dut._log.info("Link statistics: {}".format(monitor.stats()))
+
+
+async def test_throughput_model(dut):
+    pix_clk, cmos, monitor = await start(dut)
+    source = VideoSource(cmos, TIMINGS, pix_clk)
+    width = TIMINGS["H_ACTIVE"]
+
+    # Format of full lines is measured, rejected frames are passed if it's the
+    # first test of the simulation
+    await source.send(clip(MEASURED_FRAMES + REJECTED_FRAMES, width=width))
+    await uart_send(dut, CMD_CLEAR)
+    first_packet = len(monitor.packets)
+    starts = []
+    cocotb.start_soon(line_starts(dut, starts))
+    await source.send(clip(3, width=width))
+    await ClockCycles(pix_clk, 500)
+    counters = await read_counters(dut)
+
+    lines = [time for time, dt, _ in monitor.packets[first_packet:] if dt == DT_YUV422_8BIT]
+    assert len(lines) == len(starts), "Wrong number of received lines"
+    latencies = [end - start for start, end in zip(starts, lines)]
+
+    # Model of the same configuration, 1080p60 differs from the sent frames only
+    # in vertical blanking, which is long enough not to delay any line
+    model = ThroughputModel("1080p60", get_timings("1080p_3g", False), ppm=pll_ppm("1080p60"),
+                            buffer_depth=BUFFER_DEPTH).run()
+    dut._log.info("Model: {}, line buffer high-water mark {} words, latencies {} ns".format(
+        model, counters["fifo_high_water"], latencies))
+    assert abs(counters["fifo_high_water"] - model["fifo_peak"]) <= MODEL_TOLERANCE_WORDS, \
+        "Line buffer high-water mark differs from the model"
+    tolerance_ns = MODEL_TOLERANCE_WORDS * BYTE_CLK_148_5MHZ / 1000
+    for latency in latencies:
+        assert abs(latency - model["latency_max_us"] * 1000) <= tolerance_ns, \
+            "Line latency differs from the model"
+
+
+tf = TestFactory(test_function=test_top_perf_counters)
+tf.generate_tests()
+
+tf_model = TestFactory(test_function=test_throughput_model)
+tf_model.generate_tests()
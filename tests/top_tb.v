@@ -26,9 +26,9 @@ module iver_tb;
 		// Wait for D-PHY tinit
 		#(CLK_PERIOD * 16000 * (13468 / CLK_PERIOD));
 
+		// The same image is sent in each frame, see tests/video_source.py for video clips
+		$readmemh("tests/bbb.txt", image);
 		for (i = 0; i < FRAMES; i = i + 1) begin
-			$readmemh("tests/bbb.txt", image);
-
 			fv = 1;
 			#(CLK_PERIOD * 280 * (13468 / CLK_PERIOD));
 			for (j = 0; j < V_ACTIVE; j = j + 1) begin
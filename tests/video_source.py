@@ -0,0 +1,201 @@
+# Copyright 2023 Antmicro <www.antmicro.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pixel source streaming frames of video files into the CMOS input of the design.
+
+Files are memory-mapped and frames are produced by generators one at a time, so
+clips of any length take the memory of a single frame. Frames are arrays of
+16-bit pixels with shape (lines, pixels), luma in the upper byte and chroma in
+the lower one, as received from the deserializer.
+"""
+
+import os
+import numpy as np
+from cocotb.triggers import ClockCycles, RisingEdge
+
+Y4M_MAGIC = b"YUV4MPEG2"
+Y4M_FRAME = b"FRAME"
+
+# Raw pixel formats, named after FFmpeg ones
+PIX_FMTS = ["uyvy422", "yuv422p"]
+
+
+def planar_to_pixels(y, u, v):
+    """Return 16-bit pixels of a 4:2:2 planar frame, U and V alternate in chroma."""
+    chroma = np.empty(y.shape, dtype=np.uint8)
+    chroma[:, 0::2] = u
+    chroma[:, 1::2] = v
+    return (y.astype(np.uint16) << 8) | chroma
+
+
+def read_raw(path, width, height, pix_fmt="uyvy422", start=0, count=None):
+    """Yield frames of a headerless YUV 4:2:2 file.
+
+    In uyvy422 files pixels are stored as they are sent, so frames are views of
+    the mapped file. yuv422p frames are converted from planes.
+    """
+    if pix_fmt not in PIX_FMTS:
+        raise ValueError("Unsupported pixel format {}, use one of {}".format(pix_fmt, PIX_FMTS))
+    frame_size = width * height * 2
+    frames = os.path.getsize(path) // frame_size
+    stop = frames if count is None else min(frames, start + count)
+    if start >= stop:
+        return
+
+    if pix_fmt == "uyvy422":
+        data = np.memmap(path, dtype="<u2", mode="r", shape=(frames, height, width))
+        for i in range(start, stop):
+            yield data[i]
+        return
+
+    data = np.memmap(path, dtype=np.uint8, mode="r", shape=(frames, frame_size))
+    luma = width * height
+    for i in range(start, stop):
+        y = data[i, :luma].reshape(height, width)
+        u, v = data[i, luma:].reshape(2, height, width // 2)
+        yield planar_to_pixels(y, u, v)
+
+
+def y4m_header(path):
+    """Return parameters of a YUV4MPEG2 stream header and its length in bytes."""
+    with open(path, "rb") as fd:
+        line = fd.readline()
+    fields = line.split()
+    if not fields or fields[0] != Y4M_MAGIC:
+        raise ValueError("{} is not a YUV4MPEG2 file".format(path))
+    params = {field[:1].decode(): field[1:].decode() for field in fields[1:]}
+    return params, len(line)
+
+
+def read_y4m(path, start=0, count=None):
+    """Yield frames of a YUV4MPEG2 file with 8-bit 4:2:2 planar pixels."""
+    params, offset = y4m_header(path)
+    if params.get("C", "420jpeg") != "422":
+        raise ValueError("Unsupported Y4M colorspace {}, only 422 is supported".format(
+            params.get("C", "420jpeg")))
+    width = int(params["W"])
+    height = int(params["H"])
+    luma = width * height
+
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    frame = 0
+    while offset < len(data) and (count is None or frame < start + count):
+        # Frame headers may carry parameters, so their length is found each time
+        if bytes(data[offset:offset + len(Y4M_FRAME)]) != Y4M_FRAME:
+            raise ValueError("Missing frame header at byte {} of {}".format(offset, path))
+        offset = int(np.flatnonzero(data[offset:offset + 256] == ord("\n"))[0]) + offset + 1
+        end = offset + 2 * luma
+        if end > len(data):
+            return
+        if frame >= start:
+            y = data[offset:offset + luma].reshape(height, width)
+            u, v = data[offset + luma:end].reshape(2, height, width // 2)
+            yield planar_to_pixels(y, u, v)
+        offset = end
+        frame += 1
+
+
+def read_video(path, width=None, height=None, pix_fmt="uyvy422", start=0, count=None):
+    """Yield frames of a .y4m file or a raw file of the given dimensions."""
+    if path.endswith(".y4m"):
+        return read_y4m(path, start, count)
+    if width is None or height is None:
+        raise ValueError("Dimensions of raw video {} have to be given".format(path))
+    return read_raw(path, width, height, pix_fmt, start, count)
+
+
+def write_raw(path, frames):
+    """Write frames to a uyvy422 file, returns the number of frames written."""
+    written = 0
+    with open(path, "wb") as fd:
+        for frame in frames:
+            fd.write(np.asarray(frame, dtype="<u2").tobytes())
+            written += 1
+    return written
+
+
+class VideoSource:
+    """Driver of the CMOS input of the design, sending frames with blanking.
+
+    Signals follow the pattern generator: `fv_i` is high during active lines,
+    each of which starts with horizontal sync and back porch, has `lv_i` high
+    while its pixels are sent on `pix_data1_i` (luma) and `pix_data0_i` (chroma)
+    and ends with horizontal front porch. Vertical sync and back porch lines
+    precede each frame, front porch lines follow it. Data is zero in blanking.
+
+    Active area is taken from the frames, so any format can be sent with the
+    blanking of a similar one, e.g. `hv_timings["1080p30"]` from pattern_gen.
+
+    Parameters
+    ----------
+    dut : cocotb handle
+        Design with the CMOS input.
+    timings : dict
+        H_SYNC, H_BACK_PORCH, H_FRONT_PORCH, V_SYNC, V_BACK_PORCH and
+        V_FRONT_PORCH in pixel clock cycles and lines.
+    clk : cocotb handle
+        Pixel clock, `sys_clk` of the design by default.
+
+    Attributes
+    ----------
+    frames_sent : int
+        Number of frames sent so far.
+    """
+    def __init__(self, dut, timings, clk=None):
+        self.dut = dut
+        self.clk = dut.sys_clk if clk is None else clk
+        self.h_offset = timings["H_SYNC"] + timings["H_BACK_PORCH"]
+        self.h_front = timings["H_FRONT_PORCH"]
+        self.v_offset = timings["V_SYNC"] + timings["V_BACK_PORCH"]
+        self.v_front = timings["V_FRONT_PORCH"]
+        self.frames_sent = 0
+
+    def idle(self):
+        self.dut.fv_i.value = 0
+        self.dut.lv_i.value = 0
+        self.dut.pix_data0_i.value = 0
+        self.dut.pix_data1_i.value = 0
+
+    async def blank(self, cycles):
+        self.dut.lv_i.value = 0
+        self.dut.pix_data0_i.value = 0
+        self.dut.pix_data1_i.value = 0
+        if cycles:
+            await ClockCycles(self.clk, cycles)
+
+    async def send_line(self, line):
+        await self.blank(self.h_offset)
+        self.dut.lv_i.value = 1
+        for pixel in line.tolist():
+            self.dut.pix_data0_i.value = pixel & 0xff
+            self.dut.pix_data1_i.value = pixel >> 8
+            await RisingEdge(self.clk)
+        await self.blank(self.h_front)
+
+    async def send_frame(self, frame):
+        frame = np.asarray(frame)
+        h_total = self.h_offset + frame.shape[1] + self.h_front
+        self.dut.fv_i.value = 0
+        await self.blank(self.v_offset * h_total)
+        self.dut.fv_i.value = 1
+        for line in frame:
+            await self.send_line(line)
+        self.dut.fv_i.value = 0
+        await self.blank(self.v_front * h_total)
+        self.frames_sent += 1
+
+    async def send(self, frames):
+        """Send frames from an iterable, e.g. a generator returned by read_video."""
+        for frame in frames:
+            await self.send_frame(frame)